@@ -1,16 +1,25 @@
 # app/__init__.py
+import logging
 import os
 from app.config import *
 from app import models
 from flask import Flask
 from dotenv import load_dotenv
 from .extensions import db, jwt, migrate, bcrypt, cors
+from .json_provider import make_json_provider
+from .compression import init_compression
 
 load_dotenv() 
 
+# Module loggers (logging.getLogger(__name__)) go to stderr, which Heroku collects
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(levelname)s %(name)s: %(message)s")
+
 def create_app():
     # Create app with instance folder support
     app = Flask(__name__, instance_relative_config=True)
+    # orjson-backed jsonify when available (see app/json_provider.py)
+    app.json = make_json_provider(app)
 
     # Read environment variable (default to "development")
     env = os.getenv("FLASK_ENV", "development")
@@ -40,6 +49,8 @@ def create_app():
 
         # File upload
         'UPLOAD_FOLDER': os.environ.get('UPLOAD_FOLDER')  or app.config.get('UPLOAD_FOLDER'),  # /tmp is safe on Heroku
+        # Request bodies past this are cut off while streaming (413)
+        'MAX_CONTENT_LENGTH': int(os.environ.get('MAX_CONTENT_LENGTH', 0)) or app.config.get('MAX_CONTENT_LENGTH'),
 
         # AWS / S3
         'AWS_ACCESS_KEY_ID': os.environ.get('AWS_ACCESS_KEY_ID')  or app.config.get('AWS_ACCESS_KEY_ID'),
@@ -84,6 +95,7 @@ def create_app():
     bcrypt.init_app(app)
     migrate.init_app(app, db)
     cors.init_app(app)
+    init_compression(app)
 
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -97,10 +109,15 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')    
     # app.register_blueprint(authreset_bp, url_prefix='/authreset') 
 
+    # CLI: flask check-query-plans
+    from .utils.query_plans import check_query_plans_command
+    app.cli.add_command(check_query_plans_command)
+
     # Home route
     @app.route('/health')
     def home():
-        return {"message": "The Recipe Ripper Database API", "status": "running"}
+        from .utils.resilience import circuit_states
+        return {"message": "The Recipe Ripper Database API", "status": "running", "circuits": circuit_states()}
 
     # Global error handlers
     @app.errorhandler(404)
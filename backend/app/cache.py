@@ -0,0 +1,223 @@
+# app/cache.py
+"""
+Small Redis-backed result cache with an in-process fallback.
+
+Each entry is a JSON blob stored at  cache:<namespace>:<key>  with a
+per-namespace TTL. The same Redis holds the RQ queue and job state, and
+Heroku Redis defaults to maxmemory-policy noeviction, so the caches can't
+lean on Redis to evict anything: each namespace also keeps a sorted-set
+index  cache:index:<namespace>  (key -> last use) and set() trims it to
+max_entries, deleting the least recently used entries. CACHE_REDIS_URL
+puts the caches on a separate Redis (or database) instead.
+
+If neither URL is set, or Redis can't be reached, entries go into a
+bounded in-process LRU instead so local development and a Redis outage
+both keep working (just without sharing between dynos).
+
+Usage:
+    parse_cache = Cache("parse", ttl=7 * 24 * 3600, max_entries=512)
+    value = parse_cache.get(key)        # None on a miss
+    parse_cache.set(key, value)         # value must be JSON-serialisable
+    parse_cache.stats()                 # hit/miss counters
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+# After a failed Redis call, wait this long (seconds) before trying again
+# so a Redis outage doesn't add a connect timeout to every request.
+REDIS_RETRY_AFTER = 30
+# Keep the caches away from the RQ queue: CACHE_REDIS_URL wins over REDIS_URL when set
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+_redis = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def _get_redis():
+    """Return a shared Redis client, or None if Redis isn't available right now."""
+    global _redis
+    url = CACHE_REDIS_URL or os.environ.get("REDIS_URL")
+    if not url or time.monotonic() < _redis_down_until:
+        return None
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                # Heroku's rediss:// certificates are self-signed; plain redis:// (local
+                # development) rejects TLS options outright
+                tls = {"ssl_cert_reqs": None} if url.startswith("rediss://") else {}
+                _redis = redis.from_url(
+                    url,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    socket_timeout=2,
+                    **tls,
+                )
+    return _redis
+
+
+def _mark_redis_down() -> None:
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+
+
+def trim_index(r, index: str, max_entries: int, key_for=lambda member: member) -> None:
+    """Pop the least recently used members of the sorted set `index` beyond max_entries and delete their keys"""
+    excess = r.zcard(index) - max_entries
+    if excess <= 0:
+        return
+    evicted = [member for member, _ in r.zpopmin(index, excess)]
+    if evicted:
+        r.delete(*(key_for(member) for member in evicted))
+
+
+class _LRU:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Cache:
+    """
+    A namespaced cache of JSON-serialisable values.
+
+    Hit/miss counters are kept per process and, when Redis is up, also in
+    the  cache:stats:<namespace>  hash so they can be read across dynos.
+    `max_entries` bounds both tiers.
+    """
+
+    def __init__(self, namespace: str, ttl: int, max_entries: int = 256):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = _LRU(max_entries)
+        self._hits = 0
+        self._misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    @property
+    def _index(self) -> str:
+        return f"cache:index:{self.namespace}"
+
+    def _trim(self, r) -> None:
+        trim_index(r, self._index, self.max_entries, self._key)
+
+    def _count(self, field: str) -> None:
+        if field == "hits":
+            self._hits += 1
+        else:
+            self._misses += 1
+        r = _get_redis()
+        if r is not None:
+            try:
+                r.hincrby(f"cache:stats:{self.namespace}", field, 1)
+            except redis.RedisError:
+                _mark_redis_down()
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss."""
+        value = None
+        r = _get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.get(self._key(key))
+                pipe.zadd(self._index, {key: time.time()}, xx=True)
+                raw, _ = pipe.execute()
+                value = json.loads(raw) if raw else None
+            except redis.RedisError:
+                _mark_redis_down()
+                value = self._local.get(key)
+        else:
+            value = self._local.get(key)
+
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        """Store `value` under `key` for `ttl` seconds (defaults to the namespace TTL)."""
+        ttl = ttl or self.ttl
+        r = _get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.setex(self._key(key), ttl, json.dumps(value))
+                pipe.zadd(self._index, {key: time.time()})
+                pipe.expire(self._index, max(ttl, self.ttl))
+                pipe.execute()
+                self._trim(r)
+                return
+            except redis.RedisError:
+                _mark_redis_down()
+        self._local.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        """Drop `key` from both tiers."""
+        self._local.delete(key)
+        r = _get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.delete(self._key(key))
+                pipe.zrem(self._index, key)
+                pipe.execute()
+            except redis.RedisError:
+                _mark_redis_down()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters for this namespace.
+        `process` covers this process only; `global` is summed across all
+        processes via Redis (None when Redis isn't available).
+        """
+        total = None
+        r = _get_redis()
+        if r is not None:
+            try:
+                raw = r.hgetall(f"cache:stats:{self.namespace}")
+                total = {"hits": int(raw.get("hits", 0)), "misses": int(raw.get("misses", 0))}
+            except redis.RedisError:
+                _mark_redis_down()
+        return {
+            "namespace": self.namespace,
+            "backend": "redis" if r is not None else "memory",
+            "process": {"hits": self._hits, "misses": self._misses, "local_entries": len(self._local)},
+            "global": total,
+        }
@@ -0,0 +1,112 @@
+# app/compression.py
+"""
+Response compression negotiated through Accept-Encoding.
+
+An after_request hook compresses JSON/text responses with Brotli (when the
+brotli package is installed and the client accepts "br") or gzip. Small
+bodies, responses that already have a Content-Encoding and Server-Sent
+Event streams are left alone.
+
+Streamed responses (e.g. GET /api/recipes?stream=1) are compressed chunk
+by chunk with a flush after each one, so the client still receives
+recipes as they are produced and nothing is buffered whole.
+
+Compressed responses get a weak ETag (the bytes differ per encoding) and
+Vary: Accept-Encoding.
+
+Usage:
+    init_compression(app)
+"""
+
+import gzip
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Bodies smaller than this (bytes) aren't worth compressing
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+# Brotli's higher qualities are far too slow for per-request use
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = {'application/json', 'text/plain', 'text/html', 'text/csv', 'application/javascript'}
+
+
+def choose_encoding(accept_encodings) -> str | None:
+    """'br', 'gzip' or None for the request's Accept-Encoding (a werkzeug MIMEAccept)"""
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress an iterable of chunks, flushing after each so the client isn't kept waiting"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def _compress_response(response):
+    if (
+        request.method == 'HEAD'
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or 'Content-Encoding' in response.headers
+        or response.direct_passthrough
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    app.after_request(_compress_response)
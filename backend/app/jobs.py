@@ -5,23 +5,35 @@ Lightweight Redis-backed job store.
 Each job is a JSON blob stored at  job:<uuid>  with a 1-hour TTL.
 Shape:
     pending  →  {"status": "pending"}
+             or {"status": "pending", "partial": {"title": …, "ingredients": […], "directions": […]}}
     done     →  {"status": "done", "recipe_id": <int>, "title": <str>}
     error    →  {"status": "error", "error": <str>}
 
 Usage:
-    job_id = create_job()                          # call before spawning thread
-    set_result(job_id, {"recipe_id": 42, ...})     # call inside thread on success
-    set_error(job_id, "something went wrong")      # call inside thread on failure
+    job_id = create_job()                          # call before enqueueing the task
+    set_progress(job_id, {"title": ..., ...})      # call inside the task as partial results arrive
+    set_result(job_id, {"recipe_id": 42, ...})     # call inside the task on success
+    set_error(job_id, "something went wrong")      # call inside the task on failure
     job = get_job(job_id)                          # call from the polling endpoint
+    job = wait_for_job(job_id, timeout=25)         # long-poll: block until done/error
+    for state in watch_job(job_id, timeout=120):   # stream every transition (SSE)
+        ...
+
+Every state change is also published on the Redis channel
+job-events:<uuid>, so waiting clients don't have to poll.
 """
 
 import json
 import os
+import time
 import uuid
 
 import redis
 
-_redis = redis.from_url(os.environ["REDIS_URL"], decode_responses=True, ssl_cert_reqs=None)
+_redis_url = os.environ["REDIS_URL"]
+# Heroku's rediss:// certificates are self-signed; plain redis:// rejects TLS options outright
+_tls = {"ssl_cert_reqs": None} if _redis_url.startswith("rediss://") else {}
+_redis = redis.from_url(_redis_url, decode_responses=True, **_tls)
 
 # How long (seconds) a completed or failed job result lives in Redis.
 # Pending jobs also use this TTL — if the dyno dies mid-job the record
@@ -29,31 +41,52 @@ _redis = redis.from_url(os.environ["REDIS_URL"], decode_responses=True, ssl_cert
 TTL = 3600  # 1 hour
 
 
+def _channel(job_id: str) -> str:
+    return f"job-events:{job_id}"
+
+
+def _store(job_id: str, record: dict) -> None:
+    """Save the job's new state and announce it to anyone waiting on it."""
+    payload = json.dumps(record)
+    pipe = _redis.pipeline()
+    pipe.setex(f"job:{job_id}", TTL, payload)
+    pipe.publish(_channel(job_id), payload)
+    pipe.execute()
+
+
 def create_job() -> str:
     """
     Register a new pending job and return its ID.
-    Call this in the request handler before spawning the background thread.
+    Call this in the request handler before enqueueing the background task.
     """
     job_id = str(uuid.uuid4())
     _redis.setex(f"job:{job_id}", TTL, json.dumps({"status": "pending"}))
     return job_id
 
 
+def set_progress(job_id: str, partial: dict) -> None:
+    """
+    Publish a partial result while the job is still running, so the polling
+    endpoint can show the recipe (title, ingredients, directions) as it streams in.
+    """
+    _store(job_id, {"status": "pending", "partial": partial})
+
+
 def set_result(job_id: str, data: dict) -> None:
     """
     Mark a job as successfully completed and store its result payload.
-    Call this at the end of the background thread when everything succeeded.
+    Call this at the end of the background task when everything succeeded.
     `data` should contain at minimum {"recipe_id": <int>, "title": <str>}.
     """
-    _redis.setex(f"job:{job_id}", TTL, json.dumps({"status": "done", **data}))
+    _store(job_id, {"status": "done", **data})
 
 
 def set_error(job_id: str, message: str) -> None:
     """
     Mark a job as failed and store the error message.
-    Call this in the except block of the background thread.
+    Call this in the except block of the background task.
     """
-    _redis.setex(f"job:{job_id}", TTL, json.dumps({"status": "error", "error": message}))
+    _store(job_id, {"status": "error", "error": message})
 
 
 def get_job(job_id: str) -> dict | None:
@@ -62,4 +95,46 @@ def get_job(job_id: str) -> dict | None:
     Returns None if the job_id is unknown or has expired.
     """
     raw = _redis.get(f"job:{job_id}")
-    return json.loads(raw) if raw else None
\ No newline at end of file
+    return json.loads(raw) if raw else None
+
+
+def watch_job(job_id: str, timeout: float, heartbeat: float = 15):
+    """
+    Yield the job's current state, then each new state as it is published,
+    until the job is done/errored or `timeout` seconds pass. Yields None every
+    `heartbeat` seconds of silence so streaming callers can send keep-alives.
+    Yields nothing if the job is unknown.
+    """
+    pubsub = _redis.pubsub(ignore_subscribe_messages=True)
+    # Subscribe before reading the current state so no transition slips in between
+    pubsub.subscribe(_channel(job_id))
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return
+        yield job
+        deadline = time.monotonic() + timeout
+        while job["status"] == "pending":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = pubsub.get_message(timeout=min(remaining, heartbeat))
+            if message is None:
+                yield None
+                continue
+            job = json.loads(message["data"])
+            yield job
+    finally:
+        pubsub.close()
+
+
+def wait_for_job(job_id: str, timeout: float) -> dict | None:
+    """
+    Block until the job is done/errored or `timeout` seconds pass, then return
+    its latest state (None if the job is unknown). Used for long-polling.
+    """
+    job = None
+    for state in watch_job(job_id, timeout):
+        if state is not None:
+            job = state
+    return job
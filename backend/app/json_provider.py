@@ -0,0 +1,82 @@
+# app/json_provider.py
+"""
+JSON providers for the Flask app (jsonify, request.get_json, current_app.json).
+
+OrjsonProvider encodes with orjson, which is several times faster than the
+stdlib json module on large recipe lists and encodes datetimes natively
+(ISO 8601, same as datetime.isoformat()). Keys are not sorted and output
+is UTF-8 rather than \\u-escaped; both are valid JSON and only change how
+the bytes look.
+
+IsoJSONProvider is Flask's default provider, except that datetimes come
+out as ISO 8601 too, so either provider produces the same values for the
+recipe serializers.
+
+create_app() picks the provider from JSON_PROVIDER ("orjson" or "default");
+orjson is used when it's installed unless told otherwise.
+
+Usage:
+    app.json = make_json_provider(app)
+"""
+
+import datetime
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to IsoJSONProvider
+    orjson = None
+
+
+def _iso_default(o):
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    return _default(o)
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib-json provider, with ISO 8601 datetimes instead of RFC 822"""
+
+    default = staticmethod(_iso_default)
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson-backed provider; handles datetime, date, UUID and dataclasses natively"""
+
+    options = orjson.OPT_NON_STR_KEYS if orjson else 0
+    compact: bool | None = None
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            # indent=, sort_keys=, ... are stdlib options (e.g. from the tojson template filter)
+            kwargs.setdefault("default", _iso_default)
+            return json.dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        options = self.options | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options |= orjson.OPT_INDENT_2
+        # Straight to bytes: no str round trip for multi-megabyte lists
+        return self._app.response_class(orjson.dumps(obj, default=_default, option=options),
+                                        mimetype=self.mimetype)
+
+
+def make_json_provider(app) -> JSONProvider:
+    """The provider selected by JSON_PROVIDER, falling back to IsoJSONProvider without orjson"""
+    choice = os.environ.get("JSON_PROVIDER", "orjson").lower()
+    if choice == "orjson" and orjson is not None:
+        return OrjsonProvider(app)
+    if choice == "orjson":
+        app.logger.warning("orjson is not installed; using the standard library JSON provider")
+    return IsoJSONProvider(app)
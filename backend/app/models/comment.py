@@ -4,6 +4,9 @@ from flask_jwt_extended import get_jwt_identity
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_recipe_id_id', 'recipe_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -4,6 +4,9 @@ from flask_jwt_extended import get_jwt_identity
 
 class Direction(db.Model):
     __tablename__ = 'directions'
+    __table_args__ = (
+        db.Index('ix_directions_recipe_id_step_number', 'recipe_id', 'step_number'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
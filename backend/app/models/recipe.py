@@ -4,10 +4,15 @@ from flask_jwt_extended import get_jwt_identity
 
 class Recipe(db.Model):
     __tablename__ = 'recipes'
+    __table_args__ = (
+        # Every listing filters on user_id and pages on (created_at, id)
+        db.Index('ix_recipes_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)    
+    # NOT NULL: listings page on (created_at, id)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     title = db.Column(db.String(255), nullable=False)
     course = db.Column(db.String(100))
     cuisine = db.Column(db.String(100))
@@ -23,6 +28,10 @@ class Recipe(db.Model):
 
 
     
-    ingredients = db.relationship("Ingredient", back_populates="recipe", cascade="all, delete-orphan")
-    directions = db.relationship("Direction", back_populates="recipe", cascade="all, delete-orphan")
-    comments = db.relationship("Comment", back_populates="recipe", cascade="all, delete-orphan")
\ No newline at end of file
+    # order_by matches the display order (and the ix_*_recipe_id_* indexes)
+    ingredients = db.relationship("Ingredient", back_populates="recipe", cascade="all, delete-orphan",
+                                  order_by="Ingredient.id")
+    directions = db.relationship("Direction", back_populates="recipe", cascade="all, delete-orphan",
+                                 order_by="[Direction.step_number, Direction.id]")
+    comments = db.relationship("Comment", back_populates="recipe", cascade="all, delete-orphan",
+                               order_by="Comment.id")
\ No newline at end of file
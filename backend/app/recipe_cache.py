@@ -0,0 +1,156 @@
+# app/recipe_cache.py
+"""
+Per-user cache of the JSON bodies served by GET /api/recipe/<id> and
+GET /api/recipes (whole lists and pages).
+
+Every user has a generation number in Redis (cache:recipes:gen:<user_id>).
+Cache keys and ETags include it, and save_recipe / update_recipe_by_id /
+delete_recipe bump it after they commit, which invalidates everything
+cached for that user and nothing for anyone else. Old entries are never
+read again and simply expire; the generation keys themselves expire after
+RECIPE_CACHE_GEN_TTL without a write (a recreated one starts from the clock).
+
+Bodies live in Redis (shared by every dyno) with a small in-process LRU
+in front, so a repeat read costs one Redis GET for the generation. Redis
+also holds the RQ queue and runs with noeviction, so the bodies are kept
+in check the same way as app/cache.py: a sorted-set index
+(cache:index:recipes) trimmed to RECIPE_CACHE_MAX_ENTRIES, and bodies over
+RECIPE_CACHE_MAX_BODY aren't cached at all. When
+a client sends If-None-Match with the current ETag the route answers 304
+without touching the body at all.
+
+Imports are saved by the RQ worker, a different process from the web
+dyno, so the generation has to live in Redis: if Redis is unreachable the
+cache is bypassed rather than risk serving stale data.
+
+Usage:
+    generation = recipe_cache.generation(user_id)     # None -> don't cache
+    etag = recipe_cache.etag(user_id, generation, key)
+    body = recipe_cache.get(user_id, generation, key) # JSON text, or None
+    recipe_cache.set(user_id, generation, key, body)
+    recipe_cache.invalidate(user_id)                  # after a write commits
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+import redis
+
+from .cache import _LRU, _get_redis, _mark_redis_down, trim_index
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached body is kept in Redis / the local LRU
+RECIPE_CACHE_TTL = int(os.getenv("RECIPE_CACHE_TTL", 3600))
+# Bodies larger than this (bytes) are only kept in Redis, not in every process
+L1_MAX_BODY = 256 * 1024
+# Bodies larger than this (bytes) aren't cached at all (a full list can run to megabytes)
+RECIPE_CACHE_MAX_BODY = int(os.getenv("RECIPE_CACHE_MAX_BODY", 2 * 1024 * 1024))
+# Bodies kept in Redis across all users; the least recently used are dropped
+RECIPE_CACHE_MAX_ENTRIES = int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", 2000))
+# Generation keys outlive every body cached under them
+RECIPE_CACHE_GEN_TTL = max(RECIPE_CACHE_TTL * 2, 24 * 3600)
+
+INDEX_KEY = "cache:index:recipes"
+
+
+class RecipeCache:
+    def __init__(self, ttl: int = RECIPE_CACHE_TTL, max_entries: int = 256,
+                 redis_max_entries: int = RECIPE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.redis_max_entries = redis_max_entries
+        self._local = _LRU(max_entries)
+        self._hits = 0
+        self._misses = 0
+
+    def _gen_key(self, user_id) -> str:
+        return f"cache:recipes:gen:{user_id}"
+
+    def _key(self, user_id, generation, key: str) -> str:
+        return f"cache:recipes:{user_id}:{generation}:{key}"
+
+    def generation(self, user_id):
+        """The user's current generation, or None if the cache can't be trusted right now."""
+        r = _get_redis()
+        if r is None:
+            return None
+        try:
+            generation = r.get(self._gen_key(user_id))
+            if generation is None:
+                # Start from the clock, not 0, so a flushed Redis can't hand out an ETag a client already has
+                r.set(self._gen_key(user_id), time.time_ns(), nx=True, ex=RECIPE_CACHE_GEN_TTL)
+                generation = r.get(self._gen_key(user_id))
+            return generation
+        except redis.RedisError:
+            _mark_redis_down()
+            return None
+
+    def invalidate(self, user_id) -> None:
+        """Drop everything cached for `user_id` (call after the write has committed)."""
+        r = _get_redis()
+        if r is None:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.incr(self._gen_key(user_id))
+            pipe.expire(self._gen_key(user_id), RECIPE_CACHE_GEN_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            _mark_redis_down()
+            logger.warning("Could not invalidate recipe cache for user %s", user_id)
+
+    def etag(self, user_id, generation, key: str) -> str:
+        """ETag (unquoted) for `key` at this generation; it changes whenever the user's recipes do."""
+        return hashlib.sha1(self._key(user_id, generation, key).encode()).hexdigest()[:20]
+
+    def get(self, user_id, generation, key: str):
+        """Cached JSON body, or None on a miss."""
+        full_key = self._key(user_id, generation, key)
+        body = self._local.get(full_key)
+        if body is None:
+            r = _get_redis()
+            if r is not None:
+                try:
+                    pipe = r.pipeline(transaction=False)
+                    pipe.get(full_key)
+                    pipe.zadd(INDEX_KEY, {full_key: time.time()}, xx=True)
+                    body, _ = pipe.execute()
+                except redis.RedisError:
+                    _mark_redis_down()
+            if body is not None and len(body) <= L1_MAX_BODY:
+                self._local.set(full_key, body, self.ttl)
+
+        if body is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return body
+
+    def set(self, user_id, generation, key: str, body: str) -> None:
+        if len(body) > RECIPE_CACHE_MAX_BODY:
+            return
+        full_key = self._key(user_id, generation, key)
+        if len(body) <= L1_MAX_BODY:
+            self._local.set(full_key, body, self.ttl)
+        r = _get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.setex(full_key, self.ttl, body)
+                pipe.zadd(INDEX_KEY, {full_key: time.time()})
+                pipe.expire(INDEX_KEY, self.ttl)
+                pipe.execute()
+                trim_index(r, INDEX_KEY, self.redis_max_entries)
+            except redis.RedisError:
+                _mark_redis_down()
+
+    def stats(self) -> dict:
+        return {
+            "namespace": "recipes",
+            "process": {"hits": self._hits, "misses": self._misses, "local_entries": len(self._local)},
+        }
+
+
+recipe_cache = RecipeCache()
@@ -1,44 +1,207 @@
 # app/routes/recipes.py
-import threading
-
 from requests import HTTPError
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestEntityTooLarge
+import json
 import os
-import uuid
-from ..extensions import db
-from ..jobs import create_job, set_result, set_error, get_job
-from ..models.recipe import Recipe
-from ..models.ingredient import Ingredient
-from ..models.direction import Direction
-from ..models.comment import Comment
-from ..utils.database import get_all_recipes, get_recipe_by_id, update_recipe_by_id, delete_recipe, save_recipe   
+import threading
+from ..jobs import create_job, get_job, wait_for_job, watch_job
+from ..tasks import QueueFull, RETRY_AFTER, enqueue_s3_upload, enqueue_upload, enqueue_url_import
+from ..recipe_cache import recipe_cache
+from ..utils.database import get_all_recipes, get_recipe_by_id, update_recipe_by_id
+from ..utils.database import delete_recipe as delete_recipe_by_id
+from ..utils.database import PROJECTIONS, FULL, InvalidCursor, get_recipes_page, iter_recipes
+from ..utils.search import FACET_FIELDS, search_recipes
+from ..utils.s3_uploads import (UploadNotFound, UploadTooLarge, check_upload, direct_uploads_enabled,
+                                owns_key, presign_upload)
 from ..utils.parser import *
 
 recipes_bp = Blueprint('recipes', __name__)
 
 ALLOWED_EXTENSIONS = {'.txt', '.pdf', '.jpg', '.jpeg', '.png'}
 
+# Page size for GET /api/recipes when ?cursor is given without ?limit, and the largest allowed
+RECIPES_PAGE_DEFAULT = 25
+RECIPES_PAGE_MAX = 100
+
+# Bytes of JSON gathered before a streamed list sends (and compresses) a chunk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# The web dyno runs gunicorn gthread workers (Procfile): a long-poll or an SSE
+# stream holds one of the process's WEB_THREADS threads for as long as it's open,
+# so waits are kept short and only JOB_WAITERS_MAX may block at once per process.
+# Longest a long-poll may block (seconds)
+JOB_WAIT_MAX = 15
+# Longest a single SSE connection stays open (seconds); EventSource then reconnects
+JOB_STREAM_MAX = 15
+# Long-polls + streams blocking at once per process; the rest of the threads stay free for the API
+JOB_WAITERS_MAX = int(os.environ.get('JOB_WAITERS_MAX', max(1, int(os.environ.get('WEB_THREADS', 8)) // 2)))
+_job_waiters = threading.BoundedSemaphore(JOB_WAITERS_MAX)
+
 def allowed_file(filename):
     return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
 
+def _queue_full_response():
+    """503 with Retry-After for when the import queue is saturated"""
+    response = jsonify({"error": "Too many imports in progress, please try again shortly."})
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response, 503
+
+def _busy_stream_response():
+    """503 with Retry-After when every job-watching slot is taken"""
+    response = jsonify({"error": "Too many open job streams, please try again shortly."})
+    response.headers['Retry-After'] = str(JOB_STREAM_MAX)
+    return response, 503
+
+def _too_large_response():
+    """413 naming the MAX_CONTENT_LENGTH limit"""
+    limit_mb = round(current_app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024), 1)
+    return jsonify({"error": f"File too large (max {limit_mb:g} MB)"}), 413
+
+def _cached_response(user_id, key, build):
+    """
+    JSON response for build()'s payload, served from the per-user recipe cache
+    with an ETag; a request whose If-None-Match matches gets a bodiless 304.
+    Returns None when build() does (nothing to send; not cached).
+    """
+    generation = recipe_cache.generation(user_id)
+    if generation is None:
+        payload = build()
+        return None if payload is None else jsonify(payload)
+
+    etag = recipe_cache.etag(user_id, generation, key)
+    # Weak match: compressed responses carry W/ ETags
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body = recipe_cache.get(user_id, generation, key)
+        if body is None:
+            payload = build()
+            if payload is None:
+                return None
+            body = current_app.json.dumps(payload)
+            recipe_cache.set(user_id, generation, key, body)
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Always revalidate: the ETag check is cheap and recipes can change from another device
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _json_array_stream(items):
+    """Encode an iterable as one JSON array, yielded in ~STREAM_CHUNK_SIZE pieces"""
+    dumps = current_app.json.dumps
+    buffer, size = ["["], 1
+    try:
+        for n, item in enumerate(items):
+            piece = ("," if n else "") + dumps(item)
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer, size = [], 0
+    except Exception as e:
+        # The 200 is already sent; cut the array short so the client's parser fails loudly
+        current_app.logger.error(f"Error streaming recipes: {e}")
+        yield "".join(buffer)
+        return
+    buffer.append("]\n")
+    yield "".join(buffer)
+
 @recipes_bp.route('/recipes', methods=['GET'])
 @jwt_required()
 def get_recipes():
     current_app.logger.info("Fetching all recipes")
-    """Get all recipes"""
+    """
+    Get all recipes.
+
+    Query params (all optional):
+        fields=full|summary  — summary returns only id, title, course, cuisine and times
+        limit=<n>            — page size (max 100); switches to paged responses
+        cursor=<token>       — next_cursor from the previous page
+        stream=1             — send the whole list as a streamed JSON array, read from a
+                               server-side cursor (flat memory for big libraries; not cached)
+
+    Without limit/cursor the response is the full list as before. With them:
+        200  {"recipes": [...], "next_cursor": "…" | null}
+    """
+    fields = request.args.get('fields', FULL)
+    if fields not in PROJECTIONS:
+        return jsonify({"error": f"fields must be one of: {', '.join(PROJECTIONS)}"}), 400
     try:
         user_id = get_jwt_identity()
         # current_app.logger.info(f"User ID: {user_id}")
-        recipes = get_all_recipes(user_id)
-        if not recipes or len(recipes) == 0:
+        if request.args.get('stream') in ('1', 'true'):
+            return Response(stream_with_context(_json_array_stream(iter_recipes(user_id, fields))),
+                            mimetype='application/json')
+
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = request.args.get('limit', RECIPES_PAGE_DEFAULT, type=int)
+            if limit is None or not 1 <= limit <= RECIPES_PAGE_MAX:
+                return jsonify({"error": f"limit must be between 1 and {RECIPES_PAGE_MAX}"}), 400
+            cursor = request.args.get('cursor')
+
+            def build_page():
+                recipes, next_cursor = get_recipes_page(user_id, limit, cursor, fields)
+                return {"recipes": recipes, "next_cursor": next_cursor}
+
+            return _cached_response(user_id, f"page:{fields}:{limit}:{cursor or ''}", build_page)
+
+        response = _cached_response(user_id, f"list:{fields}", lambda: get_all_recipes(user_id, fields) or None)
+        if response is None:
             return jsonify({"msg": "You currently do not have any recipes saved."}), 204         
-        return jsonify(recipes)
+        return response
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error fetching recipes: {e}")
         return jsonify({"error": "Failed to fetch recipes"}), 500
 
+@recipes_bp.route('/recipes/search', methods=['GET'])
+@jwt_required()
+def search():
+    """
+    Full-text search and faceted filtering over the user's recipes.
+
+    Query params (all optional):
+        q=<words>                              — every word must appear in the title, ingredients or directions
+        course=, cuisine=, primary_ingredient= — repeat or comma-separate to allow several values
+        min_time=, max_time=                   — total time bounds in minutes
+        fields=full|summary, limit=<n> (max 100), offset=<n>
+
+    Returns:
+        200  {"total": n, "recipes": [...], "facets": {"course": {"Dinner": 4, …}, …,
+              "total_time": {"under_15": 1, …}}, "next_offset": n | null}
+    """
+    fields = request.args.get('fields', FULL)
+    if fields not in PROJECTIONS:
+        return jsonify({"error": f"fields must be one of: {', '.join(PROJECTIONS)}"}), 400
+    limit = request.args.get('limit', RECIPES_PAGE_DEFAULT, type=int)
+    if limit is None or not 1 <= limit <= RECIPES_PAGE_MAX:
+        return jsonify({"error": f"limit must be between 1 and {RECIPES_PAGE_MAX}"}), 400
+    offset = max(request.args.get('offset', 0, type=int) or 0, 0)
+    filters = {
+        field: [v.strip() for raw in request.args.getlist(field) for v in raw.split(',') if v.strip()]
+        for field in FACET_FIELDS
+    }
+    try:
+        user_id = get_jwt_identity()
+        result = search_recipes(
+            user_id,
+            q=request.args.get('q', ''),
+            filters=filters,
+            min_time=request.args.get('min_time', type=int),
+            max_time=request.args.get('max_time', type=int),
+            limit=limit,
+            offset=offset,
+            fields=fields,
+        )
+        return jsonify(result)
+    except Exception as e:
+        current_app.logger.error(f"Error searching recipes: {e}")
+        return jsonify({"error": "Failed to search recipes"}), 500
+
 @recipes_bp.route('/recipe/<int:recipe_id>', methods=['GET'])
 @jwt_required()
 def get_recipe(recipe_id):
@@ -47,10 +210,10 @@ def get_recipe(recipe_id):
     try:
         user_id = get_jwt_identity()
         # current_app.logger.info(f"User ID: {user_id}")
-        recipe = get_recipe_by_id(recipe_id, user_id)
-        if not recipe:
+        response = _cached_response(user_id, f"recipe:{recipe_id}", lambda: get_recipe_by_id(recipe_id, user_id))
+        if response is None:
             return jsonify({"error": "Recipe not found"}), 404
-        return jsonify(recipe)
+        return response
     except Exception as e:
         current_app.logger.error(f"Error fetching recipe {recipe_id}: {e}")
         return jsonify({"error": "Failed to fetch recipe"}), 500
@@ -82,11 +245,8 @@ def delete_recipe(recipe_id):
     try:
         user_id = get_jwt_identity()
         # current_app.logger.info(f"User ID: {user_id}")
-        recipe = Recipe.query.filter_by(id=recipe_id, user_id=user_id).first()
-        if not recipe:
+        if not delete_recipe_by_id(recipe_id, user_id):
             return jsonify({"error": "Recipe not found"}), 404
-        db.session.delete(recipe)
-        db.session.commit()
         return jsonify({"message": "Recipe deleted successfully"})
     except Exception as e:
         current_app.logger.error(f"Error deleting recipe {recipe_id}: {e}")
@@ -99,13 +259,27 @@ def job_status(job_id):
     """
     Poll the status of a background recipe import job.
  
+    Pass ?wait=<seconds> (max 15) to block until the job finishes instead of
+    returning immediately; GET /api/jobs/<job_id>/events streams every update.
+    When JOB_WAITERS_MAX requests are already blocking, the current state is
+    returned straight away.
+
     Returns:
         202  {"status": "pending"}               — still processing
+        202  {"status": "pending", "partial": {…}} — still processing, recipe partly parsed
         200  {"status": "done", "recipe_id": …}  — finished, recipe is in DB
         500  {"status": "error", "error": "…"}   — something went wrong
         404  {"error": "Job not found"}           — bad/expired job_id
     """
-    job = get_job(job_id)
+    # ?wait=<seconds> turns this into a long-poll that returns as soon as the job finishes
+    wait = min(request.args.get('wait', 0, type=float), JOB_WAIT_MAX)
+    if wait > 0 and _job_waiters.acquire(blocking=False):
+        try:
+            job = wait_for_job(job_id, wait)
+        finally:
+            _job_waiters.release()
+    else:
+        job = get_job(job_id)
     if not job:
         return jsonify({"error": "Job not found"}), 404
  
@@ -117,6 +291,49 @@ def job_status(job_id):
     return jsonify(job), 500
 
 
+@recipes_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's state. Sends the current state, then
+    every update (including partial recipes), and closes once the job is done
+    or failed. Streams end after JOB_STREAM_MAX seconds; EventSource reconnects.
+    503 with Retry-After when JOB_WAITERS_MAX requests are already blocking.
+    """
+    if not get_job(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    if not _job_waiters.acquire(blocking=False):
+        return _busy_stream_response()
+
+    def stream():
+        yield "retry: 2000\n\n"
+        for job in watch_job(job_id, JOB_STREAM_MAX):
+            if job is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(_job_waiters.release)
+    return response
+
+
+@recipes_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    """Hit/miss counters for the import caches"""
+    return jsonify({
+        "parse": parse_cache.stats(),
+        "scrape": scrape_cache.stats(),
+        "extract": extract_cache.stats(),
+        "recipes": recipe_cache.stats(),
+    })
+
+
 @recipes_bp.route('/recipes/upload', methods=['POST'])
 @jwt_required()
 def upload_recipe():
@@ -135,59 +352,13 @@ def upload_recipe():
                 "error": f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             }), 400
 
-        # Save file
         filename = file.filename
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        data = file.read()
 
         job_id = create_job()
-        app = current_app._get_current_object()
-
-        def run():
-            try:
-                # current_app.logger.info("Extracting text from file")
-                # Extract text based on type
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in {'.jpg', '.jpeg', '.png'}:
-                    text = extract_text_from_image(file_path)
-                elif ext == '.pdf':
-                    text = extract_text_from_pdf(file_path, filename)
-                else:  # .txt
-                    text = parse_from_file(file_path, filename)
-
-                # current_app.logger.info(f"Extracted text: {text}")  # Log first 200 chars of extracted text for debugging
-                # Parse into structured recipe
-                # current_app.logger.info("Parsing recipe from image")
-                recipe_data = parse_recipe_text(text, recipe_source=filename, is_file=True)
-
-                with app.app_context():
-                    recipe_id = save_recipe(recipe_data, user_id=user_id)                
-
-                set_result(job_id, {
-                    "recipe_id": recipe_id,
-                    "title": recipe_data.get("title", "Untitled"),
-                })
-
-
-                # Save to DB
-                # recipe_id = save_recipe(recipe_data, user_id=user_id)
-
-                # update_job(job_id, status="done", recipe_id=recipe_id)
-
-            except Exception as e:
-                app.logger.error(f"Background upload failed for job {job_id}: {e}")
-                set_error(job_id, str(e))
-
-            finally:
-                # Always clean up uploaded file
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                except Exception as cleanup_error:
-                    app.logger.warning(f"Failed to delete temp file {file_path}: {cleanup_error}")
-        threading.Thread(target=run, daemon=True).start()
-    
-        return jsonify({"job_id": job_id}), 202                    
+        enqueue_upload(job_id, user_id, filename, data)
+
+        return jsonify({"job_id": job_id}), 202
     #     try:
     #         # Extract text based on type
     #         ext = os.path.splitext(filename)[1].lower()
@@ -216,16 +387,74 @@ def upload_recipe():
     #     except Exception as e:
     #         current_app.logger.error(f"Upload failed: {e}")
     #         return jsonify({"error": "Failed to extract text from file"}), 500
+    except RequestEntityTooLarge:
+        # Raised by werkzeug while reading the body, as soon as it passes MAX_CONTENT_LENGTH
+        return _too_large_response()
+    except QueueFull as e:
+        current_app.logger.warning(f"Upload rejected: {e}")
+        return _queue_full_response()
     except Exception as e:
             current_app.logger.error(f"Upload failed: {e}")
             return jsonify({"error": "Failed to process upload"}), 500        
-    finally:
-        # Always clean up uploaded file
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as cleanup_error:
-            current_app.logger.warning(f"Failed to delete temp file {file_path}: {cleanup_error}")    
+
+@recipes_bp.route('/recipes/upload-url', methods=['POST'])
+@jwt_required()
+def create_upload_url():
+    """Presigned S3 PUT for uploading a recipe file directly (see utils/s3_uploads.py)"""
+    if not direct_uploads_enabled():
+        return jsonify({"error": "Direct uploads are not configured"}), 503
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        if not allowed_file(filename):
+            return jsonify({
+                "error": f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+            }), 400
+        # Checked again on commit; the client may not know the size up front
+        size = data.get('size')
+        if isinstance(size, int) and size > current_app.config['MAX_CONTENT_LENGTH']:
+            return _too_large_response()
+
+        return jsonify(presign_upload(user_id, filename)), 201
+    except Exception as e:
+        current_app.logger.error(f"Creating upload URL failed: {e}")
+        return jsonify({"error": "Failed to create upload URL"}), 500
+
+
+@recipes_bp.route('/recipes/upload/commit', methods=['POST'])
+@jwt_required()
+def commit_upload():
+    """Import a file uploaded through /recipes/upload-url; the worker fetches it from S3"""
+    if not direct_uploads_enabled():
+        return jsonify({"error": "Direct uploads are not configured"}), 503
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        key = data.get('key') or ''
+        if not owns_key(user_id, key):
+            return jsonify({"error": "Unknown upload key"}), 404
+        # The key's extension was validated when the URL was issued; the filename is only a label
+        filename = data.get('filename') or os.path.basename(key)
+        if os.path.splitext(filename)[1].lower() != os.path.splitext(key)[1]:
+            filename = os.path.basename(key)
+
+        check_upload(key, current_app.config['MAX_CONTENT_LENGTH'])
+        job_id = create_job()
+        enqueue_s3_upload(job_id, user_id, filename, key)
+
+        return jsonify({"job_id": job_id}), 202
+    except UploadNotFound:
+        return jsonify({"error": "Upload not found; PUT the file before committing"}), 404
+    except UploadTooLarge:
+        return _too_large_response()
+    except QueueFull as e:
+        current_app.logger.warning(f"Upload commit rejected: {e}")
+        return _queue_full_response()
+    except Exception as e:
+        current_app.logger.error(f"Upload commit failed: {e}")
+        return jsonify({"error": "Failed to process upload"}), 500
+
 
 @recipes_bp.route('/recipes/from-url', methods=['POST'])
 @jwt_required()
@@ -242,35 +471,8 @@ def add_from_url():
             return jsonify({"error": "No URL provided"}), 400
         
         job_id = create_job()
-        app = current_app._get_current_object()
-
-        def run():
-            try:
-                scraped_text = scrape_url(url)
-                if not scraped_text.strip():
-                    raise Exception("Could not extract text from URL")
-                # current_app.logger.info("Parsing recipe from URL")
-                recipe_data = parse_recipe_text(scraped_text, recipe_source=url, is_file=False)
-
-                with app.app_context():
-                    recipe_id = save_recipe(recipe_data, user_id=user_id) 
-
-                set_result(job_id, {
-                    "recipe_id": recipe_id,
-                    "title": recipe_data.get("title", "Untitled"),
-                })
-
-            except Exception as e:
-                err_str = str(e)
-                app.logger.error(f"Background URL import failed for job {job_id}: {e}")
-    
-                if 'Failed to scrape URL: 402 Client Error:' in err_str:
-                    set_error(job_id, "Website prevents scraping, print to PDF and upload as a file.")
-                else:
-                    set_error(job_id, err_str)
- 
-        threading.Thread(target=run, daemon=True).start()
-    
+        enqueue_url_import(job_id, user_id, url)
+
         return jsonify({"job_id": job_id}), 202
     
         # scraped_text = scrape_url(url)
@@ -287,6 +489,10 @@ def add_from_url():
         #     "title": recipe_data.get('title', 'Untitled')
         # })
 
+    except QueueFull as e:
+        current_app.logger.warning(f"URL import rejected: {e}")
+        return _queue_full_response()
+
     except HTTPError as http_err:
             status_code = http_err.response.status_code
             if status_code == 402:
@@ -1,11 +1,38 @@
 # app/tasks.py
+"""
+RQ background tasks for recipe imports.
+
+Request handlers enqueue work here instead of spawning a thread per
+request. The worker dyno (worker.py, see Procfile) runs a pool of
+RQ_WORKER_CONCURRENCY workers that pick the jobs up, so in-flight imports
+survive a web restart and the number of concurrent imports is bounded.
+
+Progress is still reported through app/jobs.py (create_job / set_result /
+set_error), so GET /api/jobs/<job_id> works exactly as before.
+
+The enqueue_* functions raise QueueFull once QUEUE_MAX_DEPTH jobs are
+waiting. Upload bodies over UPLOAD_INLINE_MAX are staged in S3 rather
+than pickled into the job's arguments in Redis, which also holds the
+queue and the job records; without S3_BUCKET (local development) they
+still go inline.
+
+Usage:
+    job_id = create_job()
+    enqueue_upload(job_id, user_id, filename, data)     # raises QueueFull when saturated
+    enqueue_s3_upload(job_id, user_id, filename, key)   # file already in S3 (see utils/s3_uploads.py)
+    enqueue_url_import(job_id, user_id, url)
+"""
+
 import os
-import uuid
-from rq import Queue
+
 from redis import Redis
-from app.utils.parser import extract_text_from_image, extract_text_from_pdf, parse_from_file, parse_recipe_text
-from app.models import Recipe, db  # Adjust to your actual DB models/session
-from flask import current_app
+from rq import Queue
+
+from .jobs import set_progress, set_result, set_error
+from .utils.parser import extract_text_from_image, extract_text_from_pdf, parse_recipe_text, scrape_page
+from .utils.s3_uploads import (UploadNotFound, UploadTooLarge, delete_upload, direct_uploads_enabled,
+                               fetch_upload, stage_upload)
+from .utils.uploads import read_source, spooled
 
 # Connect to Redis using Heroku-provided URL
 # Use REDIS_URL if set, fallback to REDIS_TLS_URL (for safety during transition)
@@ -13,54 +40,164 @@ redis_url = os.environ.get('REDIS_URL') or os.environ.get('REDIS_TLS_URL')
 if not redis_url:
     raise RuntimeError("No Redis URL found in config vars — check heroku config")
 
-redis_conn = Redis.from_url(redis_url)
-
-# Test ping (add this in app init or a debug route)
-try:
-    redis_conn.ping()
-    current_app.logger.info("Redis connection successful")
-except Exception as e:
-    current_app.logger.error(f"Redis ping failed: {e}")
-    raise  # or handle gracefully
+# Heroku's rediss:// certificates are self-signed; plain redis:// rejects TLS options outright
+_tls = {"ssl_cert_reqs": None} if redis_url.startswith("rediss://") else {}
+redis_conn = Redis.from_url(redis_url, **_tls)
 queue = Queue(connection=redis_conn, default_timeout=300)  # 5 min timeout per job
 
-def process_recipe_upload(user_id: int, file_path: str, filename: str):
-    """Background task: extract text, parse, save to DB, clean up file"""
+# Refuse new imports once this many are waiting; the client gets a 503
+QUEUE_MAX_DEPTH = int(os.environ.get('RQ_MAX_QUEUE_DEPTH', 50))
+# Seconds a rejected client is told to wait before retrying
+RETRY_AFTER = int(os.environ.get('RQ_RETRY_AFTER', 15))
+# Uploads bigger than this (bytes) are staged in S3 instead of going into Redis with the job
+UPLOAD_INLINE_MAX = int(os.environ.get('RQ_UPLOAD_INLINE_MAX', 256 * 1024))
+
+
+class QueueFull(Exception):
+    """The import queue is at QUEUE_MAX_DEPTH; try again later."""
+
+
+def _enqueue(fn, job_id: str, args: tuple):
+    """
+    Enqueue fn(*args) unless the queue is full. The job is pushed first and
+    its position read back, so concurrent requests can't all pass a depth
+    check and overshoot together: one that lands past QUEUE_MAX_DEPTH is
+    taken off again, the job record the route created is marked failed (so
+    it doesn't sit "pending" until its TTL), and QueueFull raised.
+    """
+    job = queue.enqueue(fn, args=args, job_id=job_id, result_ttl=0)
+    position = job.get_position()
+    if position is not None and position >= QUEUE_MAX_DEPTH:
+        job.delete()
+        set_error(job_id, "Import queue is full; please try again shortly")
+        raise QueueFull(f"Import queue is full ({position} jobs waiting)")
+    return job
+
+
+def enqueue_upload(job_id: str, user_id, filename: str, data: bytes):
+    """Queue an uploaded file for text extraction, parsing and saving."""
+    if len(data) > UPLOAD_INLINE_MAX and direct_uploads_enabled():
+        key = stage_upload(user_id, filename, data)
+        try:
+            return enqueue_s3_upload(job_id, user_id, filename, key)
+        except QueueFull:
+            delete_upload(key)
+            raise
+    return _enqueue(process_recipe_upload, job_id, (job_id, user_id, filename, data))
+
+
+def enqueue_s3_upload(job_id: str, user_id, filename: str, key: str):
+    """Queue a file the client uploaded straight to S3; only the object key goes through Redis."""
+    return _enqueue(process_s3_upload, job_id, (job_id, user_id, filename, key))
+
+
+def enqueue_url_import(job_id: str, user_id, url: str):
+    """Queue a URL for scraping, parsing and saving."""
+    return _enqueue(process_url_import, job_id, (job_id, user_id, url))
+
+
+_app = None
+
+
+def _get_app():
+    """The worker's Flask app, created once per worker process (needed for the DB session)."""
+    global _app
+    if _app is None:
+        from . import create_app
+        _app = create_app()
+    return _app
+
+
+def _save(app, job_id, recipe_data, user_id):
+    # Imported here so the web process can import this module before the app exists
+    from .utils.database import save_recipe
+
+    with app.app_context():
+        recipe_id = save_recipe(recipe_data, user_id=user_id)
+    set_result(job_id, {
+        "recipe_id": recipe_id,
+        "title": recipe_data.get("title", "Untitled"),
+    })
+
+
+def _extract_text(filename: str, source) -> str:
+    """Text of an uploaded file, given as its bytes or a local path"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.txt':
+        return read_source(source).decode('utf-8', errors='replace')
+    if ext in {'.jpg', '.jpeg', '.png'}:
+        return extract_text_from_image(source, filename)
+    return extract_text_from_pdf(source, filename)
+
+
+def _import_file(app, job_id: str, user_id, filename: str, source):
+    text = _extract_text(filename, source)
+    recipe_data = parse_recipe_text(text, recipe_source=filename, is_file=True,
+                                    on_progress=lambda partial: set_progress(job_id, partial))
+    _save(app, job_id, recipe_data, user_id)
+
+
+def process_recipe_upload(job_id: str, user_id, filename: str, data: bytes):
+    """Background task: extract text, parse, save to DB"""
+    app = _get_app()
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        if ext == '.pdf':
+            # Small PDFs are read from the bytes that came over Redis; large ones go to a
+            # temp file (removed on exit) so the process pool can open it
+            with spooled(data, suffix=ext) as source:
+                _import_file(app, job_id, user_id, filename, source)
+        else:
+            _import_file(app, job_id, user_id, filename, data)
+
+    except Exception as e:
+        app.logger.error(f"Background upload failed for job {job_id}: {e}")
+        set_error(job_id, str(e))
+
+
+def process_s3_upload(job_id: str, user_id, filename: str, key: str):
+    """Background task: stream the object from S3, then extract, parse, save to DB"""
+    app = _get_app()
     try:
-        ext = os.path.splitext(filename)[1].lower()
-
-        if ext in {'.jpg', '.jpeg', '.png'}:
-            text = extract_text_from_image(file_path)
-        elif ext == '.pdf':
-            text = extract_text_from_pdf(file_path, filename)
-        else:  # .txt or others
-            text = parse_from_file(file_path, filename)
-
-        recipe_data = parse_recipe_text(text, recipe_source=filename, is_file=True)
-
-        # Save to DB (adjust to your save_recipe logic)
-        recipe = Recipe(
-            user_id=user_id,
-            title=recipe_data.get('title', 'Untitled'),
-            # ... map other fields: ingredients, steps, etc. ...
-            raw_text=text,          # optional
-            status='completed',
-            source=filename
-        )
-        db.session.add(recipe)
-        db.session.commit()
-
-        current_app.logger.info(f"Background job completed for recipe {recipe.id} by user {user_id}")
+        with fetch_upload(key, suffix=os.path.splitext(key)[1],
+                          max_bytes=app.config['MAX_CONTENT_LENGTH']) as source:
+            _import_file(app, job_id, user_id, filename, source)
 
+    except UploadNotFound:
+        set_error(job_id, "Uploaded file not found; it may have expired")
+    except UploadTooLarge:
+        set_error(job_id, "Uploaded file is too large")
     except Exception as e:
-        current_app.logger.error(f"Background job failed for user {user_id}: {str(e)}")
-        # Optional: update a status field to 'failed' if you add one
-        db.session.rollback()
+        app.logger.error(f"Background S3 upload failed for job {job_id}: {e}")
+        set_error(job_id, str(e))
 
     finally:
-        # Clean up file even on failure
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as cleanup_err:
-                current_app.logger.warning(f"Cleanup failed: {cleanup_err}")
\ No newline at end of file
+        delete_upload(key)
+
+
+def process_url_import(job_id: str, user_id, url: str):
+    """Background task: scrape, parse (unless the page has structured data), save to DB"""
+    app = _get_app()
+    try:
+        page = scrape_page(url)
+        if page.get("structured"):
+            # schema.org Recipe on the page — no need to ask the LLM
+            app.logger.info(f"Using structured recipe data for job {job_id}")
+            recipe_data = {**page["structured"], "recipe_source": url, "is_url": 0}
+        else:
+            scraped_text = page["text"]
+            if not scraped_text.strip():
+                raise Exception("Could not extract text from URL")
+            recipe_data = parse_recipe_text(scraped_text, recipe_source=url, is_file=False,
+                                            on_progress=lambda partial: set_progress(job_id, partial))
+
+        _save(app, job_id, recipe_data, user_id)
+
+    except Exception as e:
+        err_str = str(e)
+        app.logger.error(f"Background URL import failed for job {job_id}: {e}")
+
+        if 'Failed to scrape URL: 402 Client Error:' in err_str:
+            set_error(job_id, "Website prevents scraping, print to PDF and upload as a file.")
+        else:
+            set_error(job_id, err_str)
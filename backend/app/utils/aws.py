@@ -0,0 +1,52 @@
+# app/utils/aws.py
+"""
+Shared boto3 clients (S3, Textract) and AWS settings.
+
+Retries are handled by resilience.py, so botocore's own retry loop is
+turned off. AWS_ENDPOINT_URL points the clients at a local stand-in
+(moto, MinIO, stub servers).
+
+Usage:
+    from .aws import s3, textract, S3_BUCKET
+"""
+
+import os
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+# AWS Credentials
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_DEFAULT_REGION = os.getenv("AWS_DEFAULT_REGION")
+S3_BUCKET = os.getenv("S3_BUCKET")
+
+AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
+# Seconds before a Textract call is hedged with a second request; off by default
+# because Textract bills the duplicate page too
+TEXTRACT_HEDGE_AFTER = float(os.getenv("TEXTRACT_HEDGE_AFTER", 0))
+
+aws_config = BotoConfig(connect_timeout=5, read_timeout=60, retries={'max_attempts': 1, 'mode': 'standard'})
+# Presigned URLs need SigV4; local stand-ins (MinIO, moto) only do path-style bucket addressing
+s3_config = aws_config.merge(BotoConfig(
+    signature_version="s3v4",
+    s3={'addressing_style': "path" if AWS_ENDPOINT_URL else "auto"},
+))
+
+# Initialize AWS clients
+s3 = boto3.client(
+    "s3",
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_DEFAULT_REGION,
+    endpoint_url=AWS_ENDPOINT_URL,
+    config=s3_config
+)
+textract = boto3.client(
+    "textract",
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_DEFAULT_REGION,
+    endpoint_url=AWS_ENDPOINT_URL,
+    config=aws_config
+)
@@ -1,14 +1,22 @@
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import and_, delete, insert, or_, select, update
 from sqlalchemy.orm import sessionmaker, relationship
 from ..extensions import db
+from ..recipe_cache import recipe_cache
 from ..models.recipe import Recipe
 from ..models.ingredient import Ingredient
 from ..models.direction import Direction
 from ..models.comment import Comment
+from collections import defaultdict
 from datetime import datetime
+import base64
+import json
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # # Database setup
 # DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///recipes.db')
 
@@ -23,88 +31,264 @@ import os
 # def get_session():
 #     return Session()
 
+# Child tables: model and value columns with the defaults used when a field is missing
+_CHILDREN = {
+    "ingredients": (Ingredient, {"ingredient": "", "quantity": "", "unit": ""}),
+    "directions": (Direction, {"step_number": 0, "instruction": ""}),
+    "comments": (Comment, {"comments": ""}),
+}
+
+
+def _comment_items(value):
+    """Comments arrive as a string (older parser output) or a list of strings / {"comments": ...}"""
+    if isinstance(value, str):
+        return [{"comments": value}] if value else []
+    return [item if isinstance(item, dict) else {"comments": item} for item in value or [] if item]
+
+
+def _child_values(kind, items):
+    """Column values for each child row, in display order"""
+    _, columns = _CHILDREN[kind]
+    return [{column: item.get(column, default) for column, default in columns.items()} for item in items]
+
+
+def _bulk_insert(kind, recipe_id, values):
+    """One batched INSERT for all of a recipe's new child rows (multi-row VALUES via executemany)"""
+    if values:
+        model, _ = _CHILDREN[kind]
+        db.session.execute(insert(model), [{"recipe_id": recipe_id, **row} for row in values])
+
+
 def save_recipe(recipe_data, user_id):
     print("Inside save_recipe function")
     """Save a parsed recipe to the database"""
     try:
         print("Inside save_recipe try function")
-        # Create recipe
-        recipe = Recipe(
-            title=recipe_data['title'],
-            user_id=user_id,
-            course=recipe_data.get('course', 'Uncategorized'),
-            cuisine=recipe_data.get('cuisine', 'Unknown'),
-            prep_time=recipe_data.get('prep_time', 'Unknown'),
-            cook_time=recipe_data.get('cook_time', 'Unknown'),
-            servings=recipe_data.get('servings', 'Unknown'),
-            total_time=recipe_data.get('total_time', 'Unknown'),
-            primary_ingredient=recipe_data.get('primary_ingredient', 'Unknown'),
-            is_url=recipe_data.get('is_url', 0),
-            recipe_source=recipe_data.get('recipe_source')
-        )
-        db.session.add(recipe)
-        db.session.flush()  # Get recipe.id
-
-        # Add ingredients
-        for ing in recipe_data.get('ingredients', []):
-            ingredient = Ingredient(
-                recipe_id=recipe.id,
-                ingredient=ing.get('ingredient', ''),
-                quantity=ing.get('quantity', ''),
-                unit=ing.get('unit', '')
-            )
-            db.session.add(ingredient)
-        
-        # Add directions
-        for dir_data in recipe_data.get('directions', []):
-            direction = Direction(
-                recipe_id=recipe.id,
-                step_number=dir_data.get('step_number', 0),
-                instruction=dir_data.get('instruction', '')
-            )
-            db.session.add(direction)
-
-        # Add comments
-            comments = Comment(
-                recipe_id=recipe.id,
-                comments=recipe_data.get('comments', '')
-            )
-            if recipe_data.get('comments'):
-                db.session.add(comments)
+        # Create recipe; RETURNING gives us the id without a separate flush
+        recipe_id = db.session.execute(
+            insert(Recipe).values(
+                title=recipe_data['title'],
+                user_id=user_id,
+                course=recipe_data.get('course', 'Uncategorized'),
+                cuisine=recipe_data.get('cuisine', 'Unknown'),
+                prep_time=recipe_data.get('prep_time', 'Unknown'),
+                cook_time=recipe_data.get('cook_time', 'Unknown'),
+                servings=recipe_data.get('servings', 'Unknown'),
+                total_time=recipe_data.get('total_time', 'Unknown'),
+                primary_ingredient=recipe_data.get('primary_ingredient', 'Unknown'),
+                is_url=recipe_data.get('is_url', 0),
+                recipe_source=recipe_data.get('recipe_source')
+            ).returning(Recipe.id)
+        ).scalar_one()
+
+        # Add ingredients, directions and comments: one statement per table
+        _bulk_insert("ingredients", recipe_id, _child_values("ingredients", recipe_data.get('ingredients', [])))
+        _bulk_insert("directions", recipe_id, _child_values("directions", recipe_data.get('directions', [])))
+        _bulk_insert("comments", recipe_id, _child_values("comments", _comment_items(recipe_data.get('comments'))))
 
         db.session.commit()
+        recipe_cache.invalidate(user_id)
         print("Exiting save_recipe function")
-        return recipe.id
+        return recipe_id
     except Exception as e:
         db.session.rollback()
         print(f"Error saving recipe: {e}")
         raise e
 
 
-def get_all_recipes(user_id):
+# Projections accepted by serialize_recipe() and the listing functions
+FULL = "full"
+SUMMARY = "summary"
+PROJECTIONS = (FULL, SUMMARY)
+# What a list view needs; "full" adds the rest of the columns plus ingredients, directions and comments
+SUMMARY_FIELDS = ("id", "title", "course", "cuisine", "prep_time", "cook_time", "total_time")
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that wasn't produced by encode_cursor()."""
+
+
+def encode_cursor(created_at, recipe_id):
+    """Opaque keyset cursor pointing just past (created_at, recipe_id)"""
+    raw = json.dumps([_iso(created_at), recipe_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, recipe_id) from encode_cursor(); raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, recipe_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(recipe_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def _select_recipes(user_id, fields):
+    """SELECT of the user's recipes, newest first, with just the columns `fields` needs"""
+    table = Recipe.__table__
+    if fields == SUMMARY:
+        # created_at is always selected: the keyset cursor is built from it
+        columns = [table.c[name] for name in SUMMARY_FIELDS] + [table.c.created_at]
+    else:
+        columns = [table]
+    return (
+        select(*columns)
+        .where(Recipe.user_id == user_id)
+        .order_by(Recipe.created_at.desc(), Recipe.id.desc())
+    )
+
+
+def _serialize_rows(recipe_rows, fields):
+    if fields == SUMMARY:
+        return [_serialize_row(row, None, fields) for row in recipe_rows]
+    children = _load_children([row["id"] for row in recipe_rows])
+    return [_serialize_row(row, children, fields) for row in recipe_rows]
+
+
+def get_all_recipes(user_id, fields=FULL):
     """Get all recipes with their ingredients and directions"""
     print("Inside get_all_recipes function")
     # user_id_= int(user_id)
     try:
-        recipe_data = Recipe.query.filter_by(user_id=user_id).order_by(Recipe.created_at.desc())
-        if recipe_data is not None:
-            result = []
-            for recipe in recipe_data:
-                recipe_dict = serialize_recipe(recipe)
-                result.append(recipe_dict)
-            return result
-        else:
-            return recipe_data
+        # One query for the recipes plus one per child table, however many recipes there are
+        recipe_rows = db.session.execute(_select_recipes(user_id, fields)).mappings().all()
+        return _serialize_rows(recipe_rows, fields)
 
     except Exception as e:
         print(f"Error getting recipe: {e}")
         raise e
 
 
+# Rows fetched from the server-side cursor (and child rows loaded) per round trip in iter_recipes
+STREAM_BATCH = 200
+
+
+def iter_recipes(user_id, fields=FULL, batch_size=STREAM_BATCH):
+    """
+    Yield the user's serialized recipes one at a time, newest first, reading
+    them from a server-side cursor in batches of `batch_size` so memory stays
+    flat however many recipes there are.
+    """
+    logger.debug("Inside iter_recipes function")
+    result = db.session.execute(
+        _select_recipes(user_id, fields).execution_options(yield_per=batch_size)
+    ).mappings()
+    for batch in result.partitions():
+        yield from _serialize_rows(batch, fields)
+
+
+def get_recipes_page(user_id, limit, cursor=None, fields=FULL):
+    """
+    One page of a user's recipes, newest first, using keyset pagination on
+    (created_at, id). Returns (recipes, next_cursor); next_cursor is None on
+    the last page. Raises InvalidCursor for a malformed cursor.
+    """
+    logger.debug("Inside get_recipes_page function")
+    query = _select_recipes(user_id, fields)
+    if cursor:
+        created_at, recipe_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Recipe.created_at < created_at,
+            and_(Recipe.created_at == created_at, Recipe.id < recipe_id),
+        ))
+    try:
+        # Fetch one extra row to learn whether there is another page
+        recipe_rows = db.session.execute(query.limit(limit + 1)).mappings().all()
+        next_cursor = None
+        if len(recipe_rows) > limit:
+            recipe_rows = recipe_rows[:limit]
+            last = recipe_rows[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return _serialize_rows(recipe_rows, fields), next_cursor
+
+    except Exception as e:
+        logger.exception("Error getting recipes page")
+        raise e
+
+
+def get_recipes_by_ids(recipe_ids, fields=FULL):
+    """Serialized recipes for `recipe_ids`, in the order given (ids that don't exist are skipped)"""
+    if not recipe_ids:
+        return []
+    table = Recipe.__table__
+    columns = [table.c[name] for name in SUMMARY_FIELDS] if fields == SUMMARY else [table]
+    rows = db.session.execute(select(*columns).where(Recipe.id.in_(recipe_ids))).mappings().all()
+    by_id = {row["id"]: row for row in rows}
+    return _serialize_rows([by_id[i] for i in recipe_ids if i in by_id], fields)
+
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+_IN_CHUNK = 500
+
+
+def _child_queries(ids):
+    """The ingredient, direction and comment SELECTs for a batch of recipe ids, each in display order"""
+    return {
+        "ingredients": select(Ingredient.recipe_id, Ingredient.ingredient, Ingredient.quantity, Ingredient.unit)
+        .where(Ingredient.recipe_id.in_(ids))
+        .order_by(Ingredient.recipe_id, Ingredient.id),
+        "directions": select(Direction.recipe_id, Direction.step_number, Direction.instruction)
+        .where(Direction.recipe_id.in_(ids))
+        .order_by(Direction.recipe_id, Direction.step_number),
+        "comments": select(Comment.recipe_id, Comment.comments)
+        .where(Comment.recipe_id.in_(ids))
+        .order_by(Comment.recipe_id, Comment.id),
+    }
+
+
+def _load_children(recipe_ids):
+    """
+    Fetch ingredients, directions and comments for many recipes at once.
+    Returns {"ingredients": {recipe_id: [...]}, "directions": {...}, "comments": {...}}
+    with each list already in display order.
+    """
+    children = {"ingredients": defaultdict(list), "directions": defaultdict(list), "comments": defaultdict(list)}
+    for start in range(0, len(recipe_ids), _IN_CHUNK):
+        queries = _child_queries(recipe_ids[start:start + _IN_CHUNK])
+
+        for recipe_id, ingredient, quantity, unit in db.session.execute(queries["ingredients"]):
+            children["ingredients"][recipe_id].append({"ingredient": ingredient, "quantity": quantity, "unit": unit})
+
+        for recipe_id, step_number, instruction in db.session.execute(queries["directions"]):
+            children["directions"][recipe_id].append({"step_number": step_number, "instruction": instruction})
+
+        for recipe_id, comments in db.session.execute(queries["comments"]):
+            children["comments"][recipe_id].append({"comments": comments})
+    return children
+
+
+def _serialize_row(row, children, fields=FULL):
+    """serialize_recipe() for a plain recipes-table row plus children from _load_children()"""
+    if fields == SUMMARY:
+        return {name: row[name] for name in SUMMARY_FIELDS}
+    recipe_id = row["id"]
+    return {
+        "id": recipe_id,
+        "title": row["title"],
+        "course": row["course"],
+        "cuisine": row["cuisine"],
+        "prep_time": row["prep_time"],
+        "cook_time": row["cook_time"],
+        "total_time": row["total_time"],
+        "servings": row["servings"],
+        "primary_ingredient": row["primary_ingredient"],
+        "is_url": row["is_url"],
+        "recipe_source": row["recipe_source"],
+        # Left as a datetime; the app's JSON provider writes it as ISO 8601
+        "created_at": row["created_at"],
+        "ingredients": children["ingredients"].get(recipe_id, []),
+        "directions": children["directions"].get(recipe_id, []),
+        "comments": children["comments"].get(recipe_id, []),
+    }
+
+
 def get_recipe_by_id(recipe_id, user_id):
     """Get a recipe by ID"""
     print("Inside get_recipe_by_id function")
     recipe_data = Recipe.query.filter_by(id=recipe_id, user_id=user_id).first()      
+    if recipe_data is None:
+        return None
 
     result = []
     try:
@@ -114,6 +298,37 @@ def get_recipe_by_id(recipe_id, user_id):
         print(f"Error getting recipe: {e}")
         raise e
 
+def _existing_children(kind, recipe_id):
+    """(id, values) for a recipe's current child rows, in display order"""
+    model, columns = _CHILDREN[kind]
+    order = [model.step_number, model.id] if kind == "directions" else [model.id]
+    rows = db.session.execute(
+        select(model.id, *[getattr(model, column) for column in columns])
+        .where(model.recipe_id == recipe_id)
+        .order_by(*order)
+    ).mappings().all()
+    return [(row["id"], {column: row[column] for column in columns}) for row in rows]
+
+
+def _sync_children(kind, recipe_id, values):
+    """
+    Make a recipe's `kind` rows equal to `values`, touching only what changed:
+    rows are matched by position, changed ones are updated, extras on either
+    side are deleted or inserted. Each step is one batched statement.
+    """
+    model, _ = _CHILDREN[kind]
+    existing = _existing_children(kind, recipe_id)
+    changed = [{"id": row_id, **new} for (row_id, old), new in zip(existing, values) if old != new]
+    removed = [row_id for row_id, _ in existing[len(values):]]
+
+    if changed:
+        db.session.execute(update(model), changed)
+    if removed:
+        db.session.execute(delete(model).where(model.id.in_(removed)))
+    _bulk_insert(kind, recipe_id, values[len(existing):])
+    return len(changed), len(removed), max(len(values) - len(existing), 0)
+
+
 def update_recipe_by_id(recipe_id, user_id, data):
     print("Inside update_recipe function")
     try:
@@ -121,6 +336,7 @@ def update_recipe_by_id(recipe_id, user_id, data):
         if not recipe:
             return None
         print("Inside update_recipe try function")
+        # Only columns whose value actually changes end up in the UPDATE
         recipe.title = data.get("title", recipe.title)
         recipe.course = data.get("course", recipe.course)
         recipe.cuisine = data.get("cuisine", recipe.cuisine)
@@ -131,84 +347,56 @@ def update_recipe_by_id(recipe_id, user_id, data):
         recipe.primary_ingredient = data.get("primary_ingredient", recipe.primary_ingredient)
         recipe.recipe_source = data.get("recipe_source", recipe.recipe_source)
         recipe.is_url = data.get("is_url", recipe.is_url)
-        print("Before db.session.add")
-        # Remove old ingredients and directions
-        db.session.query(Ingredient).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
-        db.session.query(Direction).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
-        db.session.query(Comment).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
-        print("Before db.session.commit")
-        # --- Ingredients ---
-        if "ingredients" in data:
-            print("Inside update_recipe ingredients function")
-            # Add new ingredients
-            for ing_data in data["ingredients"]:
-                new_ing = Ingredient(
-                    recipe_id=recipe.id,
-                    ingredient=ing_data.get("ingredient"),
-                    quantity=ing_data.get("quantity"),
-                    unit=ing_data.get("unit")
-                )
-                db.session.add(new_ing)
-
-        # --- Directions ---
-        if "directions" in data:
-            print("Inside update_recipe directions function")
-            # Add new directions
-            for dir_data in data["directions"]:
-                new_dir = Direction(
-                    recipe_id=recipe.id,
-                    step_number=dir_data.get("step_number"),
-                    instruction=dir_data.get("instruction")
-                )
-                db.session.add(new_dir)
-
-        # --- Comments ---
-        if "comments" in data:
-            print("Inside update_recipe comments function")
-           # Add new comments
-            for comment_data in data["comments"]:
-                new_comment = Comment(
-                    recipe_id=recipe.id,
-                    comments=comment_data.get("comments")
-                )
-                db.session.add(new_comment)
+        db.session.flush()
+
+        # --- Ingredients / Directions / Comments ---
+        # A list that isn't in the request is left as it is
+        for kind in _CHILDREN:
+            if kind in data:
+                items = _comment_items(data[kind]) if kind == "comments" else data[kind] or []
+                updated, removed, added = _sync_children(kind, recipe.id, _child_values(kind, items))
+                logger.debug("update_recipe %s: %d updated, %d removed, %d added", kind, updated, removed, added)
 
         db.session.commit()
-        recipe_dict = serialize_recipe(recipe)
-        return recipe_dict 
+        recipe_cache.invalidate(user_id)
+        return get_recipes_by_ids([recipe.id])[0]
     except:
         db.session.rollback()
         raise
 
 
-
-
-def delete_recipe(recipe_id):
-    session = get_session()
+def delete_recipe(recipe_id, user_id):
+    """Delete one of the user's recipes (children cascade); False if it doesn't exist"""
+    print("Inside delete_recipe function")
     try:
-        recipe = session.query(Recipe).filter_by(id=recipe_id).first()
+        recipe = Recipe.query.filter_by(id=recipe_id, user_id=user_id).first()
         if not recipe:
             return False
 
-        session.delete(recipe)
-        session.commit()
+        db.session.delete(recipe)
+        db.session.commit()
+        recipe_cache.invalidate(user_id)
         return True
     except:
-        session.rollback()
+        db.session.rollback()
         raise
-    finally:
-        session.close()
 
 
-def serialize_recipe(recipe):
-    # print("Inside serialize_recipe function")
-
+def _iso(created_at):
+    """created_at as an ISO string (it can come back from the DB as a datetime or a string)"""
     # Safely convert created_at 
-    created_at = recipe.created_at 
     if isinstance(created_at, str): 
         try: 
             created_at = datetime.fromisoformat(created_at) 
         except ValueError: created_at = None
+    return created_at.isoformat() if created_at else None
+
+
+def serialize_recipe(recipe, fields=FULL):
+    """Recipe as a dict; fields=SUMMARY gives just SUMMARY_FIELDS and skips the child rows"""
+    # print("Inside serialize_recipe function")
+    if fields == SUMMARY:
+        return {name: getattr(recipe, name) for name in SUMMARY_FIELDS}
 
     return {
         "id": recipe.id,
@@ -222,15 +410,15 @@ def serialize_recipe(recipe):
         "primary_ingredient": recipe.primary_ingredient,
         "is_url": recipe.is_url,
         "recipe_source": recipe.recipe_source,
-        "created_at": created_at.isoformat() if created_at else None,
+        "created_at": recipe.created_at,
         "ingredients": [
             {"ingredient": i.ingredient, "quantity": i.quantity, "unit": i.unit}
             for i in getattr(recipe, "ingredients", [])
         ],
-        "directions": sorted(
-            [{"step_number": d.step_number, "instruction": d.instruction}
-             for d in getattr(recipe, "directions", [])],
-            key=lambda x: x["step_number"]
-        ),
+        # The relationship loads directions already ordered by step_number
+        "directions": [
+            {"step_number": d.step_number, "instruction": d.instruction}
+            for d in getattr(recipe, "directions", [])
+        ],
         "comments": [{"comments": c.comments} for c in getattr(recipe, "comments", [])]
     }
\ No newline at end of file
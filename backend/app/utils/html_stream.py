@@ -0,0 +1,246 @@
+# app/utils/html_stream.py
+"""
+Streaming, early-terminating HTML extraction for scrape_url.
+
+Instead of downloading the whole page and building a BeautifulSoup tree,
+the response is read in chunks and fed to an event-based parser
+(html.parser.HTMLParser, stdlib). Unwanted subtrees (scripts, nav, ads in
+<aside>, ...) are skipped as they stream past without being materialised.
+
+JSON-LD blocks and microdata Recipe properties are captured on the way
+through so the structured-data fast path (structured.py) still works.
+Blogs often put the JSON-LD Recipe after a long article, so once enough
+visible text has been collected further text is discarded but reading
+continues until a Recipe has been found (JSON-LD or microdata), another
+LD_LOOKAHEAD_CHARS have gone by without one, or the download cap is hit.
+
+Without a charset in Content-Type the first chunk is prescanned for a
+<meta charset> declaration, as browsers do, before falling back to UTF-8.
+
+Usage:
+    page = extract_streaming(response, max_chars=15000, max_bytes=5_000_000)
+    page.text, page.ld_blocks, page.microdata
+"""
+
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+
+from .structured import microdata_item
+
+logger = logging.getLogger(__name__)
+
+# Same elements the BeautifulSoup path decomposes, plus a few that never hold recipe text
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript', 'svg', 'template', 'iframe'}
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+
+CHUNK_SIZE = 16 * 1024
+
+# How far to keep reading for a Recipe once the text budget is full
+LD_LOOKAHEAD_CHARS = 512 * 1024
+
+# Bytes searched for a <meta charset> when Content-Type doesn't name one
+META_PRESCAN_BYTES = 1024
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w-]+)', re.I)
+
+# A JSON-LD block that declares a Recipe somewhere (possibly inside @graph)
+RECIPE_LD_RE = re.compile(r'"@type"\s*:\s*(?:\[[^\]]*)?"Recipe"')
+
+
+class _PageParser(HTMLParser):
+    """Collects visible text, JSON-LD blocks and microdata Recipe properties"""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.chunks = []
+        self.char_count = 0
+        self.ld_blocks = []
+        self.microdata = []
+
+        self._skip = []        # open SKIP_TAGS elements
+        self._ld = None        # text of the JSON-LD script being read
+        self._open = []        # open elements: (tag, itemprop capture or None, scope or None)
+        self._scopes = []      # open itemscopes: {"recipe": bool, "props": {...}}
+        self._pending = []     # pieces of the current text node
+        self._pending_chars = 0
+        self._fed = 0          # characters fed so far
+        self._full_at = None   # value of _fed when the text budget filled up
+
+    def feed(self, data):
+        super().feed(data)
+        self._fed += len(data)
+        if self._full_at is None and self.text_full:
+            self._full_at = self._fed
+
+    @property
+    def text_full(self) -> bool:
+        return self.char_count + self._pending_chars >= self.max_chars
+
+    @property
+    def found_recipe(self) -> bool:
+        return bool(self.microdata) or any(RECIPE_LD_RE.search(block) for block in self.ld_blocks)
+
+    @property
+    def done(self) -> bool:
+        if self._full_at is None:
+            return False
+        # Keep going while inside a Recipe so its properties aren't cut off
+        if any(s['recipe'] for s in self._scopes):
+            return False
+        return self.found_recipe or self._fed - self._full_at >= LD_LOOKAHEAD_CHARS
+
+    def _capturing(self) -> bool:
+        return any(capture is not None for _, capture, _ in self._open)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        attrs = dict(attrs)
+
+        if tag == 'script' and 'ld+json' in (attrs.get('type') or '').lower():
+            self._ld = []
+        if self._skip or tag in SKIP_TAGS:
+            if tag not in VOID_TAGS:
+                self._skip.append(tag)
+            return
+
+        owner = self._scopes[-1] if self._scopes else None
+        capture = None
+        if 'itemprop' in attrs and owner is not None and owner['recipe']:
+            props = (attrs['itemprop'] or '').split()
+            value = next((attrs[a] for a in ('content', 'datetime', 'href', 'src') if attrs.get(a)), None)
+            if value is not None:
+                for prop in props:
+                    owner['props'].setdefault(prop, []).append(value)
+            elif tag not in VOID_TAGS:
+                capture = {"owner": owner, "props": props, "text": []}
+
+        scope = None
+        if 'itemscope' in attrs:
+            itemtype = attrs.get('itemtype') or ''
+            scope = {"recipe": bool(re.search(r'schema\.org/Recipe/?$', itemtype, re.I)), "props": {}}
+            self._scopes.append(scope)
+
+        if tag not in VOID_TAGS:
+            self._open.append((tag, capture, scope))
+        elif scope is not None:
+            self._close_scope(scope)
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if self._skip:
+            if tag == 'script' and self._ld is not None:
+                self.ld_blocks.append(''.join(self._ld))
+                self._ld = None
+            if tag in self._skip:
+                # Also drops anything left open inside the skipped subtree
+                del self._skip[len(self._skip) - 1 - self._skip[::-1].index(tag):]
+            return
+
+        names = [name for name, _, _ in self._open]
+        if tag not in names:
+            return
+        index = len(names) - 1 - names[::-1].index(tag)
+        while len(self._open) > index:
+            _, capture, scope = self._open.pop()
+            if capture is not None:
+                value = '\n'.join(capture['text'])
+                for prop in capture['props']:
+                    capture['owner']['props'].setdefault(prop, []).append(value)
+            if scope is not None:
+                self._close_scope(scope)
+
+    def handle_data(self, data):
+        if self._skip:
+            if self._ld is not None:
+                self._ld.append(data)
+            return
+        if self.char_count >= self.max_chars and not self._capturing():
+            return  # past the text cap; only structured data is still wanted
+        # A text node can arrive in pieces when it spans two chunks
+        self._pending.append(data)
+        self._pending_chars += len(data)
+
+    def flush(self):
+        """Emit the text node collected since the last tag"""
+        text = ''.join(self._pending).strip()
+        self._pending = []
+        self._pending_chars = 0
+        if not text:
+            return
+        if self.char_count < self.max_chars:
+            self.chunks.append(text)
+            self.char_count += len(text) + 1
+        for _, capture, _ in self._open:
+            if capture is not None:
+                capture['text'].append(text)
+
+    def _close_scope(self, scope):
+        if scope in self._scopes:
+            self._scopes.remove(scope)
+        if scope['recipe']:
+            self.microdata.append(microdata_item(scope['props']))
+
+
+class StreamedPage:
+    def __init__(self, text: str, ld_blocks: list, microdata: list, bytes_read: int, truncated: bool):
+        self.text = text
+        self.ld_blocks = ld_blocks
+        self.microdata = microdata
+        self.bytes_read = bytes_read
+        self.truncated = truncated
+
+
+def _charset(response, head: bytes = b'') -> str:
+    """Content-Type's charset, else a <meta charset> in the first bytes, else UTF-8"""
+    candidates = [re.search(r'charset=([\w-]+)', response.headers.get('Content-Type', ''), re.I),
+                  META_CHARSET_RE.search(head[:META_PRESCAN_BYTES])]
+    for match in candidates:
+        if not match:
+            continue
+        name = match.group(1)
+        try:
+            return codecs.lookup(name.decode('ascii') if isinstance(name, bytes) else name).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def extract_streaming(response, max_chars: int, max_bytes: int) -> StreamedPage:
+    """
+    Parse a `requests` response opened with stream=True, stopping once
+    `max_chars` of visible text have been seen and either a Recipe has been
+    found in the structured data or LD_LOOKAHEAD_CHARS more have gone by,
+    or `max_bytes` have been downloaded.
+    """
+    parser = _PageParser(max_chars)
+    decoder = None
+    bytes_read = 0
+    truncated = False
+
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if not chunk:
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(_charset(response, chunk))(errors='replace')
+        bytes_read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done:
+            truncated = True
+            break
+        if bytes_read >= max_bytes:
+            logger.info("Download cap of %d bytes reached, stopping", max_bytes)
+            truncated = True
+            break
+    else:
+        if decoder is not None:
+            parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    parser.flush()
+
+    text = '\n'.join(parser.chunks)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return StreamedPage(text[:max_chars], parser.ld_blocks, parser.microdata, bytes_read, truncated)
@@ -0,0 +1,177 @@
+# app/utils/image_prep.py
+"""
+Image preprocessing before OCR.
+
+Phone photos arrive as 3-12 MB, 12+ megapixel JPEGs, often rotated via
+EXIF and with a lot of table around the recipe card. Vision only looks at
+the image after scaling it to fit 2048x2048 with the short side at 768 px,
+so everything past that is upload time and encode/decode work for nothing.
+
+    1. JPEGs are decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8
+       while decoding (luma only), so a 12 MP photo never exists in memory
+       at full size
+    2. EXIF orientation is applied
+    3. grayscale + autocontrast
+    4. crop to the text: the bright paper region, then the ink on it (with
+       a margin), when that removes a worthwhile part of the frame
+    5. resize to the output bounds and re-encode as JPEG, lowering the
+       quality until it fits IMAGE_MAX_BYTES
+
+Images PIL can't open are passed through untouched.
+
+prepare_image runs inline (one photo per import isn't worth a trip to the
+process pool), but load_for_ocr is used by the Tesseract pool workers (see
+process_pool.py), so this module must stay cheap to import.
+
+Usage:
+    data, mime_type = prepare_image(raw_bytes)           # for Vision
+    image = load_for_ocr(raw_bytes, max_side=3500)       # PIL image for Tesseract
+"""
+
+import io
+import logging
+import os
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Output bounds for Vision; the defaults are what gpt-4o-mini downsamples to anyway
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 2048))
+IMAGE_MAX_SHORT_SIDE = int(os.getenv("IMAGE_MAX_SHORT_SIDE", 768))
+# Re-encoded images are kept under this many bytes
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 1024 * 1024))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+# Set IMAGE_CROP=0 to keep the whole frame
+IMAGE_CROP = os.getenv("IMAGE_CROP", "1") != "0"
+
+# Pixels brighter than this (after autocontrast) count as paper, darker than INK_THRESHOLD as ink
+PAPER_THRESHOLD = 190
+INK_THRESHOLD = 110
+# Rows/columns less than this share paper are outside the page/card
+PAPER_MIN_SHARE = 0.30
+# Rows/columns with less than this share of ink pixels are treated as background
+INK_MIN_SHARE = 0.01
+# Margin kept around the text region, as a share of the image size
+CROP_MARGIN = 0.03
+# Only crop when it removes at least this share of the area, and never below this share
+CROP_MIN_SAVING = 0.10
+CROP_MIN_KEEP = 0.20
+# Side of the thumbnail the text region is searched on
+CROP_PROBE_SIDE = 400
+
+
+def _scale(size, max_side, max_short_side=None) -> float:
+    """Scale factor (<= 1) that fits `size` inside the bounds, whatever its orientation"""
+    long_side, short_side = max(size), min(size)
+    scale = min(1.0, max_side / long_side)
+    if max_short_side:
+        scale = min(scale, max_short_side / short_side)
+    return scale
+
+
+def _load(data: bytes, max_side: int, max_short_side=None):
+    """Decode (JPEG in draft mode), apply EXIF orientation, convert to grayscale"""
+    image = Image.open(io.BytesIO(data))
+    # Ask for twice the output size so cropping still leaves enough pixels
+    scale = min(1.0, 2 * _scale(image.size, max_side, max_short_side))
+    image.draft("L", (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    image = ImageOps.exif_transpose(image)
+    return ImageOps.autocontrast(image.convert("L"), cutoff=1)
+
+
+def _bounds(profile: list, share: float):
+    """First and last index whose ink share reaches `share`, or None"""
+    hits = [i for i, value in enumerate(profile) if value >= share]
+    return (hits[0], hits[-1] + 1) if hits else None
+
+
+def _profiles(mask):
+    """Share of set pixels in each row and each column of a 0/255 mask"""
+    # Box-resizing to a single column/row averages each row/column
+    rows = [value / 255 for value in mask.resize((1, mask.height), Image.Resampling.BOX).getdata()]
+    cols = [value / 255 for value in mask.resize((mask.width, 1), Image.Resampling.BOX).getdata()]
+    return rows, cols
+
+
+def _region(mask, share: float):
+    rows, cols = _profiles(mask)
+    ys, xs = _bounds(rows, share), _bounds(cols, share)
+    if ys is None or xs is None:
+        return None
+    return xs[0], ys[0], xs[1], ys[1]
+
+
+def text_region(image):
+    """
+    Bounding box (left, top, right, bottom) of the text in a grayscale
+    image, or None. First the paper (rows/columns that are mostly bright,
+    which leaves out a textured table around a card), then the ink on it.
+    """
+    probe = image.copy()
+    probe.thumbnail((CROP_PROBE_SIDE, CROP_PROBE_SIDE))
+    paper = _region(probe.point(lambda p: 255 if p > PAPER_THRESHOLD else 0), PAPER_MIN_SHARE)
+    if paper is None:
+        paper = (0, 0, probe.width, probe.height)
+    ink = _region(probe.crop(paper).point(lambda p: 255 if p < INK_THRESHOLD else 0), INK_MIN_SHARE)
+    if ink is None:
+        return None
+
+    sx, sy = image.width / probe.width, image.height / probe.height
+    mx, my = CROP_MARGIN * image.width, CROP_MARGIN * image.height
+    left, top = paper[0] + ink[0], paper[1] + ink[1]
+    right, bottom = paper[0] + ink[2], paper[1] + ink[3]
+    return (
+        max(0, int(left * sx - mx)), max(0, int(top * sy - my)),
+        min(image.width, int(right * sx + mx)), min(image.height, int(bottom * sy + my)),
+    )
+
+
+def crop_to_text(image):
+    box = text_region(image)
+    if box is None:
+        return image
+    kept = (box[2] - box[0]) * (box[3] - box[1]) / (image.width * image.height)
+    if kept > 1 - CROP_MIN_SAVING or kept < CROP_MIN_KEEP:
+        return image
+    return image.crop(box)
+
+
+def _resize(image, max_side: int, max_short_side=None):
+    scale = _scale(image.size, max_side, max_short_side)
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.Resampling.LANCZOS)
+    return image
+
+
+def _encode(image, max_bytes: int) -> bytes:
+    quality = IMAGE_JPEG_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= max_bytes:
+            return buffer.getvalue()
+        if quality > 55:
+            quality -= 10
+        else:
+            image = image.resize((max(1, image.width * 4 // 5), max(1, image.height * 4 // 5)),
+                                 Image.Resampling.LANCZOS)
+
+
+def load_for_ocr(data: bytes, max_side: int, max_short_side=None):
+    """Steps 1-4 plus the resize; returns a grayscale PIL image"""
+    image = _load(data, max_side, max_short_side)
+    if IMAGE_CROP:
+        image = crop_to_text(image)
+    return _resize(image, max_side, max_short_side)
+
+
+def prepare_image(data: bytes, mime_type: str = "image/jpeg"):
+    """(bytes, mime type) ready for Vision; unreadable images come back as they were"""
+    try:
+        image = load_for_ocr(data, IMAGE_MAX_SIDE, IMAGE_MAX_SHORT_SIDE)
+        return _encode(image, IMAGE_MAX_BYTES), "image/jpeg"
+    except Exception as e:
+        logger.warning("Image preprocessing failed (%s); sending the original", e)
+        return data, mime_type
@@ -0,0 +1,355 @@
+# app/utils/llm.py
+"""
+Asyncio-based gateway for every OpenAI call.
+
+Each process keeps one AsyncOpenAI client (and its pooled HTTP
+connections) on a dedicated event-loop thread. Every request is scheduled
+through a limiter before it goes out:
+    - at most LLM_MAX_CONCURRENCY requests in flight
+    - at most OPENAI_RPM requests and OPENAI_TPM tokens per minute
+Requests over the limit wait their turn (up to LLM_QUEUE_TIMEOUT seconds)
+instead of going out and coming back as 429s.
+
+The whole call (queue wait, retries and the last attempt) has one deadline:
+LLM_CALL_TIMEOUT seconds, cut down to what the RQ job has left, so a slow
+call fails with LLMTimeout instead of the job being killed mid-import.
+
+When REDIS_URL is set the limits are shared by every worker process and
+dyno (a Redis semaphore plus per-minute counters); otherwise, or while
+Redis is unreachable, they are enforced per process.
+
+Transient failures are retried, and the circuit breaker consulted, by
+resilience.acall while the request holds its slot.
+
+Usage:
+    response = chat_completion(model="gpt-4o-mini", messages=[...], max_tokens=2000)
+    for delta in stream_chat_completion(model="gpt-4o-mini", messages=[...]):
+        ...
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+import redis
+import redis.asyncio as aioredis
+from openai import AsyncOpenAI
+
+from .resilience import acall, job_time_left
+
+logger = logging.getLogger(__name__)
+
+# Defaults match OpenAI usage tier 1 for gpt-4o-mini
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM", 500))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM", 200000))
+# Give up on a request that has waited this long (seconds) for a slot
+QUEUE_TIMEOUT = int(os.getenv("LLM_QUEUE_TIMEOUT", 120))
+# Most seconds a call may take end to end; under the 300s RQ timeout
+CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", 240))
+# Seconds of the RQ job's time budget kept back for saving the recipe afterwards
+JOB_RESERVE = 15
+# A concurrency slot held longer than this (seconds) is assumed to belong to a dead process
+LEASE_SECONDS = 600
+# Seconds before a slow completion is hedged with a duplicate request; off by
+# default because a hedge is billed like any other request
+HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))
+# Rough token cost charged for each image in a vision request
+IMAGE_TOKENS = 1000
+
+# Take a concurrency slot if fewer than ARGV[3] unexpired leases are held
+_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, tonumber(ARGV[1]) - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+return 1
+"""
+
+_BUDGET_SCRIPT = """
+local requests = tonumber(redis.call('GET', KEYS[1]) or '0')
+local tokens = tonumber(redis.call('GET', KEYS[2]) or '0')
+if requests + 1 > tonumber(ARGV[1]) then return 0 end
+if tokens > 0 and tokens + tonumber(ARGV[3]) > tonumber(ARGV[2]) then return 0 end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('INCRBY', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[2], 120)
+return 1
+"""
+
+
+class LLMBusy(Exception):
+    """No capacity freed up within LLM_QUEUE_TIMEOUT."""
+
+
+class LLMTimeout(Exception):
+    """The call didn't finish before its deadline (LLM_CALL_TIMEOUT or the RQ job's remaining time)."""
+
+
+def call_deadline() -> float:
+    """time.monotonic() by which a call starting now must be done"""
+    budget = CALL_TIMEOUT
+    time_left = job_time_left()
+    if time_left is not None:
+        budget = min(budget, time_left - JOB_RESERVE)
+    return time.monotonic() + max(budget, 0)
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Prompt tokens (~4 chars each, fixed cost per image) plus the completion allowance."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for part in content or []:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                else:
+                    images += 1
+    return chars // 4 + images * IMAGE_TOKENS + (max_tokens or 0)
+
+
+class _TokenBucket:
+    """Continuously refilling budget of `per_minute` units; waiters are served in order."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self, amount: int, deadline: float) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                wait = (amount - self.level) / self.rate
+                if now + wait > deadline:
+                    raise LLMBusy("OpenAI rate budget exhausted")
+                await asyncio.sleep(wait)
+
+    def refund(self, amount: int) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _LocalLimiter:
+    """Per-process limits, used when Redis isn't available."""
+
+    def __init__(self):
+        self._slots = asyncio.Semaphore(MAX_CONCURRENCY)
+        self._requests = _TokenBucket(REQUESTS_PER_MINUTE)
+        self._tokens = _TokenBucket(TOKENS_PER_MINUTE)
+
+    async def acquire(self, tokens: int, deadline: float):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise LLMBusy("Too many OpenAI requests in flight")
+        try:
+            await self._requests.take(1, deadline)
+            await self._tokens.take(tokens, deadline)
+        except BaseException:
+            self._slots.release()
+            raise
+        return None
+
+    async def release(self, lease) -> None:
+        self._slots.release()
+
+    async def refund(self, lease, tokens: int) -> None:
+        self._tokens.refund(tokens)
+
+
+class _RedisLimiter:
+    """
+    Limits shared by every process: a leased Redis semaphore plus per-minute
+    counters, each checked and taken in one Lua script. The lease is
+    (slot id, minute charged), so a refund goes back to that minute's counter.
+    """
+
+    SLOTS_KEY = "llm:slots"
+
+    def __init__(self, client):
+        self.redis = client
+        self._slot = client.register_script(_SLOT_SCRIPT)
+        self._budget = client.register_script(_BUDGET_SCRIPT)
+
+    async def acquire(self, tokens: int, deadline: float):
+        slot = str(uuid.uuid4())
+        while True:
+            taken = await self._slot(keys=[self.SLOTS_KEY], args=[time.time(), LEASE_SECONDS, MAX_CONCURRENCY, slot])
+            if taken:
+                break
+            if time.monotonic() > deadline:
+                raise LLMBusy("Too many OpenAI requests in flight")
+            await asyncio.sleep(0.2 + random.random() * 0.3)
+
+        try:
+            while True:
+                minute = int(time.time() // 60)
+                allowed = await self._budget(
+                    keys=[f"llm:rpm:{minute}", f"llm:tpm:{minute}"],
+                    args=[REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, tokens],
+                )
+                if allowed:
+                    return slot, minute
+                wait = 60 - time.time() % 60 + random.random()
+                if time.monotonic() + wait > deadline:
+                    raise LLMBusy("OpenAI rate budget exhausted")
+                await asyncio.sleep(wait)
+        except BaseException:
+            await self.redis.zrem(self.SLOTS_KEY, slot)
+            raise
+
+    async def release(self, lease) -> None:
+        slot, _ = lease
+        await self.redis.zrem(self.SLOTS_KEY, slot)
+
+    async def refund(self, lease, tokens: int) -> None:
+        _, minute = lease
+        await self.redis.decrby(f"llm:tpm:{minute}", tokens)
+
+
+class _Gateway:
+    """Owns the event-loop thread, the AsyncOpenAI client and the limiters for one process."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self.thread.start()
+        self.client = None
+        self.local = None
+        self.shared = None
+
+    async def _setup(self):
+        if self.client is None:
+            # Retries live in resilience.acall; OPENAI_BASE_URL is honoured for local stubs
+            self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=120)
+            self.local = _LocalLimiter()
+            url = os.environ.get("REDIS_URL")
+            if url:
+                tls = {"ssl_cert_reqs": None} if url.startswith("rediss://") else {}
+                self.shared = _RedisLimiter(aioredis.from_url(url, decode_responses=True, **tls))
+
+    async def _acquire(self, tokens: int, deadline: float):
+        if self.shared is not None:
+            try:
+                return self.shared, await self.shared.acquire(tokens, deadline)
+            except redis.RedisError as e:
+                logger.warning("LLM limiter: Redis unavailable (%s), limiting per process", e)
+        return self.local, await self.local.acquire(tokens, deadline)
+
+    @contextlib.asynccontextmanager
+    async def _scheduled(self, kwargs, deadline: float):
+        """Hold a concurrency slot and rate budget for one request; yields a dict to report usage into."""
+        await self._setup()
+        estimate = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        limiter, lease = await self._acquire(estimate, min(deadline, time.monotonic() + QUEUE_TIMEOUT))
+        used = {"total_tokens": None}
+        try:
+            yield used
+        finally:
+            try:
+                await limiter.release(lease)
+            except redis.RedisError:
+                pass  # the lease expires on its own
+
+        if used["total_tokens"] is not None and used["total_tokens"] < estimate:
+            try:
+                await limiter.refund(lease, estimate - used["total_tokens"])
+            except redis.RedisError:
+                pass
+
+    @contextlib.asynccontextmanager
+    async def _deadline(self, deadline: float):
+        """Cancel whatever is still running at `deadline` (the loop clock is time.monotonic())"""
+        try:
+            async with asyncio.timeout_at(deadline):
+                yield
+        except TimeoutError:
+            raise LLMTimeout("OpenAI call did not finish in time")
+
+    async def chat_completion(self, deadline: float, **kwargs):
+        async with self._deadline(deadline), self._scheduled(kwargs, deadline) as used:
+            response = await acall("openai", self.client.chat.completions.create,
+                                   hedge_after=HEDGE_AFTER, deadline=deadline, **kwargs)
+            if getattr(response, "usage", None) is not None:
+                used["total_tokens"] = response.usage.total_tokens
+        return response
+
+    async def stream_chat_completion(self, sink, deadline: float, **kwargs):
+        """Stream a completion, passing each text delta to `sink` as it arrives."""
+        async with self._deadline(deadline), self._scheduled(kwargs, deadline) as used:
+            # Only opening the stream is retried; a stream that breaks midway fails the call
+            stream = await acall("openai", self.client.chat.completions.create, deadline=deadline,
+                                 stream=True, stream_options={"include_usage": True}, **kwargs)
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    used["total_tokens"] = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    sink(chunk.choices[0].delta.content)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def _get_gateway() -> _Gateway:
+    # A gateway inherited across fork (a forking RQ worker, the WorkerPool
+    # spawning workers) has no running loop thread, so each process builds its own.
+    global _gateway
+    if _gateway is None or _gateway.pid != os.getpid():
+        with _gateway_lock:
+            if _gateway is None or _gateway.pid != os.getpid():
+                _gateway = _Gateway()
+    return _gateway
+
+
+def chat_completion(**kwargs):
+    """
+    Blocking wrapper around AsyncOpenAI().chat.completions.create(**kwargs),
+    scheduled through the shared concurrency and rate limits.
+    Raises LLMBusy if no capacity frees up within LLM_QUEUE_TIMEOUT, and
+    LLMTimeout if the whole call outlasts call_deadline().
+    """
+    gateway = _get_gateway()
+    # Worked out on the calling thread: the RQ job isn't visible from the loop thread
+    return gateway.run(gateway.chat_completion(call_deadline(), **kwargs))
+
+
+def stream_chat_completion(**kwargs):
+    """
+    Like chat_completion(), but streams: yields the completion's text deltas
+    as they arrive. Errors are raised from the generator once the stream ends.
+    """
+    gateway = _get_gateway()
+    deltas = queue.Queue()
+    finished = object()
+    future = asyncio.run_coroutine_threadsafe(
+        gateway.stream_chat_completion(deltas.put, call_deadline(), **kwargs), gateway.loop)
+    future.add_done_callback(lambda _: deltas.put(finished))
+    while True:
+        delta = deltas.get()
+        if delta is finished:
+            break
+        yield delta
+    future.result()
@@ -0,0 +1,66 @@
+# app/utils/local_ocr.py
+"""
+Tesseract OCR, run inside the shared process pool (see process_pool.py)
+for multi-page scans and inline for a single image or page.
+
+Kept apart from ocr.py so pool workers only import PIL, PyMuPDF and
+pytesseract, not the AWS/OpenAI clients.
+
+Usage:
+    text, confidence = tesseract_image(image_bytes)      # confidence 0-100
+    text, confidence = tesseract_pdf_page(page_pdf_bytes)
+"""
+
+import os
+import shutil
+
+from PIL import Image
+
+from .image_prep import load_for_ocr
+
+try:
+    import pytesseract
+except ImportError:  # optional; OCR then always goes to the remote services
+    pytesseract = None
+
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+# Resolution scanned PDF pages are rendered at before OCR
+TESSERACT_DPI = int(os.getenv("TESSERACT_DPI", 300))
+# Photos are scaled down to this long side; Tesseract wants ~30 px high capitals, not 12 MP
+TESSERACT_MAX_SIDE = int(os.getenv("TESSERACT_MAX_SIDE", 3500))
+
+
+def tesseract_available() -> bool:
+    return pytesseract is not None and shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+
+def _ocr(image):
+    """(text, mean word confidence) for a PIL image; lines rebuilt from Tesseract's word boxes"""
+    data = pytesseract.image_to_data(image, lang=TESSERACT_LANG, output_type=pytesseract.Output.DICT)
+    lines = {}
+    weighted, letters = 0.0, 0
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        confidence = float(data['conf'][i])
+        if not word or confidence < 0:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+        weighted += confidence * len(word)
+        letters += len(word)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    return text, (weighted / letters if letters else 0.0)
+
+
+def tesseract_image(image_bytes: bytes):
+    # Same draft decode / rotation / contrast / crop as the Vision path, at a higher resolution
+    return _ocr(load_for_ocr(image_bytes, TESSERACT_MAX_SIDE))
+
+
+def tesseract_pdf_page(page_pdf: bytes):
+    import fitz  # PyMuPDF; only needed in pool workers that render pages
+
+    with fitz.open(stream=page_pdf, filetype="pdf") as doc:
+        pixmap = doc[0].get_pixmap(dpi=TESSERACT_DPI, colorspace=fitz.csGRAY)
+        image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    return _ocr(image)
@@ -0,0 +1,319 @@
+# app/utils/ocr.py
+"""
+OCR backends and the policy that picks between them.
+
+    - TesseractBackend: local, runs in the shared process pool, no network
+    - TextractBackend:  AWS Textract (scanned PDF pages). A few pages are
+                        sent inline (Bytes) one request per page, in
+                        parallel; scans with TEXTRACT_ASYNC_MIN_PAGES or
+                        more pages left are staged in S3 under a content
+                        hash and run as one StartDocumentTextDetection job
+    - VisionBackend:    OpenAI gpt-4o-mini vision (photos), sent downscaled
+                        and cleaned up by image_prep.py
+
+Every backend returns an OcrResult with the text and, where the engine
+reports one, a 0-100 confidence.
+
+OCR_BACKEND chooses the policy:
+    auto   (default) try Tesseract first and keep its text when the mean
+           word confidence is at least OCR_LOCAL_MIN_CONFIDENCE and enough
+           text came back; otherwise use the remote service
+    local  Tesseract only
+    remote Textract / Vision only (the previous behaviour)
+When the tesseract binary isn't installed "auto" behaves like "remote".
+
+Usage:
+    result = ocr_image(image_bytes, "image/jpeg")
+    texts = ocr_pdf_pages({2: page_pdf, 5: page_pdf})   # {page index: OcrResult}
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .aws import S3_BUCKET, TEXTRACT_HEDGE_AFTER, s3, textract
+from .image_prep import prepare_image
+from .llm import chat_completion
+from .local_ocr import tesseract_available, tesseract_image, tesseract_pdf_page
+from .pdf_extract import combine_pdfs
+from .process_pool import get_process_pool, run_inline
+from .resilience import call, job_time_left
+
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+# Local results below this mean word confidence (0-100) are redone remotely
+OCR_LOCAL_MIN_CONFIDENCE = float(os.getenv("OCR_LOCAL_MIN_CONFIDENCE", 80))
+# ...as are results with fewer characters than this (a recipe page has far more)
+OCR_LOCAL_MIN_CHARS = int(os.getenv("OCR_LOCAL_MIN_CHARS", 40))
+# Remote OCR calls made concurrently
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", 4))
+# Scans with at least this many pages for Textract use the async multi-page API (needs S3_BUCKET)
+TEXTRACT_ASYNC_MIN_PAGES = int(os.getenv("TEXTRACT_ASYNC_MIN_PAGES", 4))
+# Most seconds to wait for an async Textract job
+TEXTRACT_ASYNC_TIMEOUT = float(os.getenv("TEXTRACT_ASYNC_TIMEOUT", 180))
+# Seconds of the RQ job's time budget kept back for parsing the text once OCR is done;
+# the wait above is shortened so the job isn't killed mid-import
+TEXTRACT_JOB_RESERVE = float(os.getenv("TEXTRACT_JOB_RESERVE", 90))
+# Polling interval for async jobs grows from the first value to the second (seconds)
+TEXTRACT_POLL_INTERVAL = (1.0, 5.0)
+TEXTRACT_KEY_PREFIX = "textract"
+
+VISION_PROMPT = ("Extract all text from this recipe image. Include the recipe title, all ingredients with "
+                 "measurements, and all cooking directions. Return the raw text exactly as it appears.")
+
+logger = logging.getLogger(__name__)
+
+_remote_pool = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix="ocr")
+
+
+class OcrResult:
+    def __init__(self, text: str, confidence: float | None, engine: str):
+        self.text = text
+        self.confidence = confidence
+        self.engine = engine
+
+
+class TextractTimeout(Exception):
+    """An async Textract job didn't finish within the time the import had left."""
+
+
+class OcrBackend:
+    """Interface: OCR one image or one single-page PDF."""
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def ocr_image(self, data: bytes, mime_type: str) -> OcrResult:
+        raise NotImplementedError
+
+    def ocr_pdf_page(self, page_pdf: bytes) -> OcrResult:
+        raise NotImplementedError
+
+
+class TesseractBackend(OcrBackend):
+    name = "tesseract"
+
+    def available(self) -> bool:
+        return tesseract_available()
+
+    def submit_image(self, data: bytes):
+        # A lone image gains nothing from the pool
+        return run_inline(tesseract_image, data)
+
+    def submit_pdf_page(self, page_pdf: bytes, inline: bool = False):
+        if inline:
+            return run_inline(tesseract_pdf_page, page_pdf)
+        return get_process_pool().submit(tesseract_pdf_page, page_pdf)
+
+    def ocr_image(self, data: bytes, mime_type: str) -> OcrResult:
+        return OcrResult(*self.submit_image(data).result(), self.name)
+
+    def ocr_pdf_page(self, page_pdf: bytes) -> OcrResult:
+        return OcrResult(*self.submit_pdf_page(page_pdf).result(), self.name)
+
+
+class TextractBackend(OcrBackend):
+    name = "textract"
+
+    @staticmethod
+    def _lines(blocks) -> dict:
+        """{page number: [LINE blocks]}; synchronous responses have no Page field (always page 1)"""
+        pages = {}
+        for block in blocks:
+            if block["BlockType"] == "LINE":
+                pages.setdefault(block.get("Page", 1), []).append(block)
+        return pages
+
+    def _result(self, lines: list) -> OcrResult:
+        confidence = sum(b.get("Confidence", 0) for b in lines) / len(lines) if lines else None
+        return OcrResult("\n".join(b["Text"] for b in lines), confidence, self.name)
+
+    def _detect(self, document: bytes) -> OcrResult:
+        response = call(
+            "textract", textract.detect_document_text,
+            Document={'Bytes': document},
+            hedge_after=TEXTRACT_HEDGE_AFTER
+        )
+        return self._result(self._lines(response["Blocks"]).get(1, []))
+
+    def ocr_image(self, data: bytes, mime_type: str) -> OcrResult:
+        return self._detect(data)
+
+    def ocr_pdf_page(self, page_pdf: bytes) -> OcrResult:
+        return self._detect(page_pdf)
+
+    def async_available(self) -> bool:
+        return bool(S3_BUCKET)
+
+    def ocr_document(self, document: bytes, page_count: int) -> list:
+        """
+        OCR a multi-page PDF with one async job; returns an OcrResult per page.
+
+        The object key and the job's ClientRequestToken are both the
+        document's sha256, so concurrent imports of the same scan share one
+        object and one Textract job instead of overwriting each other.
+        """
+        digest = hashlib.sha256(document).hexdigest()
+        key = f"{TEXTRACT_KEY_PREFIX}/{digest}.pdf"
+        call("s3", s3.put_object, Bucket=S3_BUCKET, Key=key, Body=document, ContentType="application/pdf")
+        try:
+            job_id = call(
+                "textract", textract.start_document_text_detection,
+                DocumentLocation={'S3Object': {'Bucket': S3_BUCKET, 'Name': key}},
+                ClientRequestToken=digest[:64],
+            )["JobId"]
+            blocks = self._job_blocks(job_id)
+        finally:
+            try:
+                call("s3", s3.delete_object, Bucket=S3_BUCKET, Key=key)
+            except Exception as e:
+                logger.warning("Failed to delete Textract staging object %s: %s", key, e)
+
+        pages = self._lines(blocks)
+        return [self._result(pages.get(number, [])) for number in range(1, page_count + 1)]
+
+    @staticmethod
+    def _wait_budget() -> float:
+        """TEXTRACT_ASYNC_TIMEOUT, cut down to what the RQ job has left after TEXTRACT_JOB_RESERVE"""
+        time_left = job_time_left()
+        if time_left is None:
+            return TEXTRACT_ASYNC_TIMEOUT
+        return max(min(TEXTRACT_ASYNC_TIMEOUT, time_left - TEXTRACT_JOB_RESERVE), 0)
+
+    def _job_blocks(self, job_id: str) -> list:
+        """Wait for the job, then collect the Blocks of every result page (NextToken)"""
+        budget = self._wait_budget()
+        deadline = time.monotonic() + budget
+        delay, max_delay = TEXTRACT_POLL_INTERVAL
+        while True:
+            response = call("textract", textract.get_document_text_detection, JobId=job_id, MaxResults=1000)
+            status = response["JobStatus"]
+            if status in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+                break
+            if status == "FAILED":
+                raise Exception(f"Textract job {job_id} failed: {response.get('StatusMessage')}")
+            if time.monotonic() + delay > deadline:
+                raise TextractTimeout(f"Textract job {job_id} still {status} after {budget:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 1.5, max_delay)
+
+        if status == "PARTIAL_SUCCESS":
+            logger.warning("Textract job %s partially succeeded: %s", job_id, response.get('Warnings'))
+        blocks = list(response["Blocks"])
+        while response.get("NextToken"):
+            response = call("textract", textract.get_document_text_detection,
+                            JobId=job_id, MaxResults=1000, NextToken=response["NextToken"])
+            blocks.extend(response["Blocks"])
+        return blocks
+
+
+class VisionBackend(OcrBackend):
+    name = "vision"
+
+    def ocr_image(self, data: bytes, mime_type: str) -> OcrResult:
+        original_size = len(data)
+        data, mime_type = prepare_image(data, mime_type)
+        logger.debug("Image preprocessed: %d -> %d bytes", original_size, len(data))
+        image_data = base64.b64encode(data).decode('utf-8')
+        response = chat_completion(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": VISION_PROMPT},
+                        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_data}"}},
+                    ]
+                }
+            ],
+            max_tokens=2000
+        )
+        return OcrResult(response.choices[0].message.content, None, self.name)
+
+
+local = TesseractBackend()
+remote_image = VisionBackend()
+remote_pdf = TextractBackend()
+
+
+def _use_local() -> bool:
+    if OCR_BACKEND == "remote":
+        return False
+    if local.available():
+        return True
+    if OCR_BACKEND == "local":
+        raise Exception("OCR_BACKEND=local but tesseract is not installed")
+    return False
+
+
+def good_enough(result: OcrResult) -> bool:
+    """Routing policy: is a local result trustworthy enough to skip the remote service?"""
+    if OCR_BACKEND == "local":
+        return True
+    return (result.confidence or 0) >= OCR_LOCAL_MIN_CONFIDENCE and len(result.text.strip()) >= OCR_LOCAL_MIN_CHARS
+
+
+def _local_or_none(future, what: str):
+    try:
+        result = OcrResult(*future.result(), local.name)
+    except Exception as e:
+        if OCR_BACKEND == "local":
+            raise
+        logger.info("Local OCR failed for %s (%s); using remote OCR", what, e)
+        return None
+    if good_enough(result):
+        return result
+    logger.info("Local OCR confidence %.0f for %s; using remote OCR", result.confidence or 0, what)
+    return None
+
+
+def ocr_image(data: bytes, mime_type: str) -> OcrResult:
+    """OCR a photo: Tesseract when it's confident, otherwise Vision."""
+    if _use_local():
+        result = _local_or_none(local.submit_image(data), "image")
+        if result is not None:
+            return result
+    return remote_image.ocr_image(data, mime_type)
+
+
+def ocr_pdf_pages(page_pdfs: dict) -> dict:
+    """
+    OCR single-page PDFs ({page index: bytes}). Every page goes to Tesseract
+    in parallel first (when enabled); the pages it isn't confident about go
+    to Textract, as one async job when there are enough of them, otherwise
+    inline and concurrently. Returns {page index: OcrResult}.
+
+    Pages go inline only when the async job couldn't start or FAILED; a job
+    that ran out of time raises, since redoing the scan page by page would
+    only run into the RQ job timeout.
+    """
+    results = {}
+    pending = dict(page_pdfs)
+    if _use_local():
+        inline = len(pending) == 1
+        futures = {index: local.submit_pdf_page(page, inline) for index, page in pending.items()}
+        for index, future in futures.items():
+            result = _local_or_none(future, f"page {index + 1}")
+            if result is not None:
+                results[index] = result
+                del pending[index]
+
+    if len(pending) >= TEXTRACT_ASYNC_MIN_PAGES and remote_pdf.async_available():
+        indexes = sorted(pending)
+        try:
+            pages = remote_pdf.ocr_document(combine_pdfs([pending[i] for i in indexes]), len(indexes))
+            results.update(zip(indexes, pages))
+            return results
+        except TextractTimeout as e:
+            raise Exception(f"Timed out waiting for OCR of the scanned pages: {str(e)}")
+        except Exception as e:
+            logger.warning("Async Textract failed (%s); falling back to page-by-page OCR", e)
+
+    remote = {index: _remote_pool.submit(remote_pdf.ocr_pdf_page, page) for index, page in pending.items()}
+    for index, future in remote.items():
+        results[index] = future.result()
+    return results
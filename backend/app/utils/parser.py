@@ -1,20 +1,24 @@
 import requests
 from bs4 import BeautifulSoup
 import openai
+import logging
 import os
 import json
 import re
-import base64
 from PyPDF2 import PdfReader
-from PIL import Image
-import io
-import boto3
-
-# AWS Credentials
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_DEFAULT_REGION = os.getenv("AWS_DEFAULT_REGION")
-S3_BUCKET = os.getenv("S3_BUCKET")
+import hashlib
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from ..cache import Cache
+from .structured import collect_structured_data, find_structured_recipe
+from .html_stream import extract_streaming
+from .pdf_extract import extract_pdf_text, single_page_pdf
+from .uploads import content_hash, is_buffer, open_source, read_source
+from .llm import chat_completion, stream_chat_completion
+from .partial_json import parse_partial
+from . import ocr
+
+logger = logging.getLogger(__name__)
 
 # OpenAI API KEY
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -24,134 +28,353 @@ if not openai.api_key:
 else:
     print(f"OPENAI_API_KEY found: ...{openai.api_key[-10:]}")  # Print first 10 chars for verification
 
-# Initialize AWS clients
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_DEFAULT_REGION
+# Bump whenever the parse prompt or model changes so cached parses from the
+# old prompt are no longer served.
+PROMPT_VERSION = "2025-12-30.1"
+
+# Stream parse responses when the caller wants progress updates (set LLM_STREAMING=0 to disable)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") != "0"
+# Minimum seconds between progress updates while streaming
+PROGRESS_INTERVAL = 0.5
+
+# Parsed recipes keyed by parse_cache_key(text); see app/cache.py
+parse_cache = Cache(
+    "parse",
+    ttl=int(os.getenv("PARSE_CACHE_TTL", 7 * 24 * 3600)),  # 1 week
+    max_entries=int(os.getenv("PARSE_CACHE_MAX_ENTRIES", 512)),
 )
-textract = boto3.client(
-    "textract",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_DEFAULT_REGION
+
+# Scraped pages keyed by a hash of the canonical URL. Entries keep the
+# validators (ETag / Last-Modified) so stale pages can be revalidated.
+scrape_cache = Cache(
+    "scrape",
+    ttl=int(os.getenv("SCRAPE_CACHE_TTL", 7 * 24 * 3600)),  # 1 week
+    max_entries=int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", 256)),
 )
+# How long a page is served without revalidating when the site doesn't say
+SCRAPE_FRESH_SECONDS = int(os.getenv("SCRAPE_FRESH_SECONDS", 15 * 60))
+# Upper bound on a site-provided max-age
+SCRAPE_MAX_FRESH_SECONDS = 24 * 3600
+
+# Visible text handed to the LLM is capped at this many characters
+SCRAPE_MAX_CHARS = 15000
+# Never download more than this from a page (bytes)
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", 5 * 1024 * 1024))
+# Stream pages through the event-based parser (html_stream.py) and stop early;
+# set SCRAPE_STREAMING=0 to fall back to a full BeautifulSoup parse.
+SCRAPE_STREAMING = os.getenv("SCRAPE_STREAMING", "1") != "0"
+
+# Query parameters that never change the page content
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'utm_source', 'utm_medium',
+                   'utm_campaign', 'utm_term', 'utm_content'}
+
+# Extracted text of uploaded PDFs and images keyed by extract_cache_key(bytes), so the
+# same file uploaded again (a retry, or another user) skips Textract / Vision entirely
+extract_cache = Cache(
+    "extract",
+    ttl=int(os.getenv("EXTRACT_CACHE_TTL", 30 * 24 * 3600)),  # 30 days
+    max_entries=int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", 256)),
+)
+# Bump whenever text extraction or OCR changes so stale extractions are no longer served
+EXTRACT_VERSION = "2026-10-18.1"
+# Texts longer than this (characters) aren't cached
+EXTRACT_CACHE_MAX_CHARS = int(os.getenv("EXTRACT_CACHE_MAX_CHARS", 200_000))
+
+
+def canonicalize_url(url):
+    """Normalize a URL so trivially different links to the same page share a cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in TRACKING_PARAMS)
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def _freshness(response):
+    """Seconds a fetched page may be reused without revalidating, or None if it must not be stored"""
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = re.search(r'max-age=(\d+)', cache_control)
+    if match:
+        return min(int(match.group(1)), SCRAPE_MAX_FRESH_SECONDS)
+    return SCRAPE_FRESH_SECONDS
+
+
+def _extract_page(content):
+    """Turn a downloaded HTML page into the cache entry for it"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Grab any schema.org Recipe before the <script> tags are stripped
+    ld_blocks, microdata = collect_structured_data(soup)
+    structured = find_structured_recipe(ld_blocks, microdata)
+
+    # Remove unwanted elements
+    for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+        element.decompose()
+
+    # Get text content
+    text = soup.get_text(separator='\n', strip=True)
+    # print(f"Scraped text: {text}")  # Debugging line
+
+    # Clean up excessive whitespace
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+
+    return {
+        "text": text[:SCRAPE_MAX_CHARS],  # Limit to 15k chars to avoid token limits
+        "structured": structured,
+    }
+
+
+def _extract_page_streaming(response):
+    """Same as _extract_page, but reads the response incrementally and stops once enough text is in"""
+    page = extract_streaming(response, max_chars=SCRAPE_MAX_CHARS, max_bytes=SCRAPE_MAX_BYTES)
+    logger.debug("Streamed %d bytes (stopped early: %s)", page.bytes_read, page.truncated)
+    return {
+        "text": page.text,
+        "structured": find_structured_recipe(page.ld_blocks, page.microdata),
+    }
+
+
+def _read_capped(response):
+    """Read a streamed response body, refusing to go past SCRAPE_MAX_BYTES"""
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= SCRAPE_MAX_BYTES:
+            logger.info("Download cap of %d bytes reached, stopping", SCRAPE_MAX_BYTES)
+            break
+    return b''.join(chunks)[:SCRAPE_MAX_BYTES]
+
+
+def _fetch_page(url):
+    """
+    Fetch and extract a page, going through the scrape cache.
+    Fresh entries are returned without touching the network; stale ones are
+    revalidated with If-None-Match / If-Modified-Since.
+    """
+    cache_key = hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
+    entry = scrape_cache.get(cache_key)
+    if entry and time.time() - entry['fetched_at'] < entry['max_age']:
+        logger.debug("Scrape cache hit (fresh)")
+        return entry
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+        max_age = _freshness(response)
+
+        if entry and response.status_code == 304:
+            logger.debug("Scrape cache hit (revalidated)")
+            entry['fetched_at'] = time.time()
+            entry['max_age'] = max_age or 0
+            scrape_cache.set(cache_key, entry)
+            return entry
 
-def scrape_url(url):
+        response.raise_for_status()
+        if SCRAPE_STREAMING:
+            page = _extract_page_streaming(response)
+        else:
+            page = _extract_page(_read_capped(response))
+
+    if max_age is not None:
+        scrape_cache.set(cache_key, {
+            **page,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'max_age': max_age,
+        })
+    return page
+
+
+def scrape_page(url):
     print("Scraping URL...")
-    """Scrape recipe content from a URL"""
+    """
+    Scrape a URL. Returns {"text": <visible text>, "structured": <recipe dict or None>}
+    where "structured" is the page's schema.org Recipe already mapped for save_recipe.
+    """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove unwanted elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-            element.decompose()
-        
-        # Get text content
-        text = soup.get_text(separator='\n', strip=True)
-        # print(f"Scraped text: {text}")  # Debugging line
-        
-        # Clean up excessive whitespace
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        return text[:15000]  # Limit to 15k chars to avoid token limits
+        return _fetch_page(url)
     except Exception as e:
         raise Exception(f"Failed to scrape URL: {str(e)}")
 
-def extract_text_from_pdf(file_path, filename):
+
+def scrape_url(url):
+    """Scrape recipe content from a URL"""
+    return scrape_page(url)['text']
+
+def extract_cache_key(source):
+    """Cache key for an uploaded file's text: sha256 of its bytes plus the extraction version"""
+    return f"{EXTRACT_VERSION}:{content_hash(source)}"
+
+
+def cache_extraction(cache_key, text):
+    # Empty results are worth retrying; very long ones would crowd out everything else
+    if text and text.strip() and len(text) <= EXTRACT_CACHE_MAX_CHARS:
+        extract_cache.set(cache_key, text)
+
+
+def ocr_pdf_pages(source, page_indexes):
+    """
+    OCR just the given pages: each is split out as a one-page PDF and handed
+    to the OCR router (local Tesseract and/or Textract, see ocr.py).
+    `source` is a path or the PDF's bytes. Returns {page index: text}.
+    """
+    reader = PdfReader(open_source(source))
+    results = ocr.ocr_pdf_pages({index: single_page_pdf(reader, index) for index in page_indexes})
+    engines = sorted({result.engine for result in results.values()})
+    logger.info("OCR'd %d pages with %s", len(results), ', '.join(engines) or 'nothing')
+    return {index: result.text for index, result in results.items()}
+
+
+def _extract_pdf(source):
+    # One pass over the pages; scans are recognised from the first few pages
+    extracted = extract_pdf_text(source)
+    if extracted.kind == "text":
+        print("Text-based PDF detected")
+        return extracted.text
+
+    # Only the pages without a text layer are OCR'd; text pages are kept as extracted
+    ocr_pages = extracted.ocr_pages
+    logger.info("%s PDF detected — running OCR on %d of %d pages",
+                extracted.kind.capitalize(), len(ocr_pages), extracted.page_count)
+    extracted.merge_ocr(ocr_pdf_pages(source, ocr_pages))
+    return extracted.text
+
+
+def extract_text_from_pdf(source, filename):
     print("Initializing PDF text extraction...")
-    """Extract text from PDF file"""
+    """Extract text from a PDF, given as a path or its bytes, reusing the text of an identical earlier upload"""
     try:
-        # Check if PDF has embedded text
-        # pdf_path = Path(pdf_path)
-        reader = PdfReader(file_path)        
-        if any(page.extract_text() for page in reader.pages):
-            print("Text-based PDF detected")
-            # reader = PdfReader(file_path)
-            # print("read pdf")
-            # print(f"Number of pages: {len(reader.pages)}")
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-                # print(f"Extracted text from PDF: {text}")  # Debugging line
-            return text
+        cache_key = extract_cache_key(source)
+        text = extract_cache.get(cache_key)
+        if text is None:
+            text = _extract_pdf(source)
+            cache_extraction(cache_key, text)
         else:
-            print("Scanned PDF detected — running Textract OCR")
-            # print(f"Uploading {file_path} to S3...")
-            # print(f"S3 bucket: {S3_BUCKET}")
-            # print(f"File name: {filename}")
-            # Upload PDF to S3
-            s3.upload_file(str(file_path), S3_BUCKET, filename)
-
-            # Call Textract
-            response = textract.detect_document_text(
-                Document={'S3Object': {'Bucket': S3_BUCKET, 'Name': filename}}
-            )
-
-            # Delete PDF from S3 after processing
-            s3.delete_object(Bucket=S3_BUCKET, Key=filename)
-            # Combine lines of text
-            lines = [block["Text"] for block in response["Blocks"] if block["BlockType"] == "LINE"]
-            # print(f"Extracted text from Textract: {lines}")  # Debugging line
-            return "\n".join(lines)
+            logger.debug("Extraction cache hit")
+        return text
     except Exception as e:
         print(f"Error extracting text from PDF: {str(e)}")
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
-def extract_text_from_image(file_path):
+def extract_text_from_image(source, filename=None):
     print("Initializing image text extraction...")
-    """Extract text from image using OpenAI Vision API"""
+    """Extract text from an image, given as a path or its bytes (local Tesseract when confident, else OpenAI Vision)"""
     try:
-        # Read and encode image
-        with open(file_path, 'rb') as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
-        
+        image_data = read_source(source)
+        cache_key = extract_cache_key(image_data)
+        text = extract_cache.get(cache_key)
+        if text is not None:
+            logger.debug("Extraction cache hit")
+            return text
+
         # Determine image type
-        image_extension = os.path.splitext(file_path)[1].lower()
+        name = filename or ('' if is_buffer(source) else str(source))
+        image_extension = os.path.splitext(name)[1].lower()
         mime_type = {
             '.jpg': 'image/jpeg',
             '.jpeg': 'image/jpeg',
             '.png': 'image/png'
         }.get(image_extension, 'image/jpeg')
-        
-        # Use OpenAI Vision to extract text
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Extract all text from this recipe image. Include the recipe title, all ingredients with measurements, and all cooking directions. Return the raw text exactly as it appears."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=2000
-        )
-        # print(f"OpenAI Vision response: {response}")  # Debugging line
-        return response.choices[0].message.content
-        
+
+        result = ocr.ocr_image(image_data, mime_type)
+        logger.info("Image OCR by %s (confidence: %s)", result.engine, result.confidence)
+        cache_extraction(cache_key, result.text)
+        return result.text
+
     except Exception as e:
         raise Exception(f"Failed to extract text from image: {str(e)}")
 
 
-def parse_recipe_text(text, recipe_source=None, is_file=True):
+def parse_cache_key(text):
+    """Cache key for a parse: hash of the whitespace-normalized text plus the prompt version"""
+    normalized = re.sub(r'\s+', ' ', text or '').strip()
+    digest = hashlib.sha256(f"{PROMPT_VERSION}\n{normalized}".encode('utf-8')).hexdigest()
+    return digest
+
+
+def parse_recipe_text(text, recipe_source=None, is_file=True, on_progress=None):
     print("Parsing recipe text...")  # Debugging line
+    """
+    Parse recipe text into structured format, reusing a cached parse of the same text when there is one.
+    If on_progress is given the LLM response is streamed and on_progress({"title", "ingredients",
+    "directions"}) is called with whatever has been parsed so far.
+    """
+    cache_key = parse_cache_key(text)
+    recipe_data = parse_cache.get(cache_key)
+    if recipe_data is None:
+        recipe_data = _parse_with_llm(text, on_progress)
+        parse_cache.set(cache_key, recipe_data)
+    else:
+        logger.debug("Parse cache hit")
+    # The in-process cache tier holds this very dict; the fields below are per import
+    recipe_data = dict(recipe_data)
+
+    # Add source URL if provided
+    if recipe_source:
+        recipe_data['recipe_source'] = recipe_source
+
+    # Add source type (file or URL)
+    if is_file:
+        recipe_data['is_url'] = 1
+    else:
+        recipe_data['is_url'] = 0
+
+    return recipe_data
+
+
+def _progress_snapshot(partial):
+    """The parts of a partially streamed recipe worth showing: title and the fully written ingredients/directions"""
+    return {
+        "title": partial.get("title"),
+        "ingredients": [i for i in partial.get("ingredients", []) if isinstance(i, dict) and "unit" in i],
+        "directions": [d for d in partial.get("directions", []) if isinstance(d, dict) and "instruction" in d],
+    }
+
+
+def _stream_completion(request, on_progress):
+    """
+    Run the completion as a stream, calling on_progress(snapshot) whenever
+    more of the recipe has arrived. Returns the full response text.
+    """
+    chunks = []
+    last = None
+    last_published = 0.0
+    for delta in stream_chat_completion(**request):
+        chunks.append(delta)
+        # Only re-parse when a value may have just completed
+        if not any(c in delta for c in ',]}'):
+            continue
+        partial = parse_partial(''.join(chunks))
+        if not partial:
+            continue
+        snapshot = _progress_snapshot(partial)
+        if snapshot != last and time.monotonic() - last_published >= PROGRESS_INTERVAL:
+            on_progress(snapshot)
+            last, last_published = snapshot, time.monotonic()
+    return ''.join(chunks)
+
+
+def _parse_with_llm(text, on_progress=None):
     """Use OpenAI to parse recipe text into structured format"""
     try:
         prompt = f"""Extract recipe information from the following text and return ONLY valid JSON with this exact structure
@@ -364,7 +587,7 @@ def parse_recipe_text(text, recipe_source=None, is_file=True):
         # """
 
         print("Prompt complete")  # Debugging line
-        response = openai.chat.completions.create(
+        request = dict(
             model="gpt-4o-mini",  # Fast and accurate - or use "gpt-4o" for best results
             messages=[
                 {"role": "system", "content": "You are a precise recipe parser. Extract ALL ingredients without skipping any. Return only valid JSON."},
@@ -373,8 +596,12 @@ def parse_recipe_text(text, recipe_source=None, is_file=True):
             temperature=0.1,  # Lower temperature = more consistent
             max_tokens=3000
         )
-        print("OpenAI response")  # Debugging line
-        content = response.choices[0].message.content.strip()
+        if on_progress is not None and LLM_STREAMING:
+            content = _stream_completion(request, on_progress).strip()
+        else:
+            response = chat_completion(**request)
+            print("OpenAI response")  # Debugging line
+            content = response.choices[0].message.content.strip()
         print("OpenAI content")  # Debugging line
         # Remove markdown code blocks if present
         content = re.sub(r'^```json\s*|\s*```$', '', content, flags=re.MULTILINE)
@@ -382,18 +609,6 @@ def parse_recipe_text(text, recipe_source=None, is_file=True):
         
         # Parse JSON
         recipe_data = json.loads(content)
-        
-        # Add source URL if provided
-        if recipe_source:
-            recipe_data['recipe_source'] = recipe_source
-
-        # Add source type (file or URL)
-        if is_file:
-            recipe_data['is_url'] = 1
-        else:
-            recipe_data['is_url'] = 0
-
-        
         return recipe_data
         
     except json.JSONDecodeError as e:
@@ -0,0 +1,64 @@
+# app/utils/partial_json.py
+"""
+Incremental parsing of a JSON document that is still being streamed.
+
+parse_partial() takes the text received so far and returns the largest
+prefix of it that is complete, closed off into valid JSON. Values are
+only included once they are complete (a string, number or list item is
+kept once the next ',' or closing bracket has arrived), so callers never
+see a half-written title or ingredient.
+
+Usage:
+    buffer += delta
+    partial = parse_partial(buffer)   # dict, or None if nothing is complete yet
+"""
+
+import json
+
+
+def parse_partial(buffer: str):
+    """Best-effort parse of an incomplete JSON object; None if no complete prefix exists yet."""
+    start = buffer.find('{')
+    if start < 0:
+        return None
+
+    stack = []
+    in_string = False
+    escaped = False
+    cut = None           # end of the longest prefix that only lacks closing brackets
+    cut_stack = None
+
+    for i in range(start, len(buffer)):
+        char = buffer[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            cut, cut_stack = i + 1, list(stack)
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            cut, cut_stack = i + 1, list(stack)
+            if not stack:
+                break
+        elif char == ',':
+            cut, cut_stack = i, list(stack)
+
+    if cut is None:
+        return None
+    candidate = buffer[start:cut] + ''.join(reversed(cut_stack))
+    try:
+        value = json.loads(candidate)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,125 @@
+# app/utils/pdf_extract.py
+"""
+Single-pass, page-wise PDF text extraction.
+
+The first SAMPLE_PAGES pages are read in-process to classify the document:
+if none of them has a text layer it's treated as a scan and the rest of
+the file isn't parsed at all (it all goes to OCR). Otherwise the remaining
+pages are extracted, split into contiguous ranges across the shared process
+pool when there are enough of them to be worth it, and every page's text
+is kept separately so pages without a text layer can be OCR'd on their
+own ("mixed" documents, e.g. a typed recipe with a scanned card glued in).
+
+`source` is a path or the PDF's bytes (see uploads.py).
+
+Usage:
+    result = extract_pdf_text(source)
+    result.kind         # "text" | "scanned" | "mixed"
+    result.ocr_pages    # 0-based indexes of pages with no usable text layer
+    result.text         # text of the pages that have it, in page order
+    result.merge_ocr({2: "..."})   # fill in OCR'd pages; .text then covers the whole document
+"""
+
+import io
+import os
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from .process_pool import EXTRACT_WORKERS, map_in_pool
+from .uploads import is_buffer, open_source
+
+# Pages read up front to decide text vs. scanned
+SAMPLE_PAGES = 3
+# Fewer characters than this on a page = no real text layer (scans often carry a stray page number)
+MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", 20))
+# Below this many remaining pages, process start-up costs more than it saves
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 12))
+
+
+def has_text(page_text) -> bool:
+    return len((page_text or '').strip()) >= MIN_PAGE_CHARS
+
+
+class PdfText:
+    def __init__(self, pages: list, page_count: int):
+        # pages[i] is the text of page i, or None if it was never extracted (scanned documents)
+        self.pages = pages
+        self.page_count = page_count
+
+    @property
+    def ocr_pages(self) -> list:
+        return [i for i, page in enumerate(self.pages) if not has_text(page)]
+
+    @property
+    def kind(self) -> str:
+        missing = len(self.ocr_pages)
+        if missing == 0:
+            return "text"
+        if missing == self.page_count:
+            return "scanned"
+        return "mixed"
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page for page in self.pages if page and page.strip())
+
+    def merge_ocr(self, ocr_text: dict) -> None:
+        """Put OCR results ({page index: text}) in place of the pages that had no text layer"""
+        for index, text in ocr_text.items():
+            self.pages[index] = text
+
+
+def _extract_range(source, start: int, stop: int) -> list:
+    """Text of pages [start, stop); runs in a pool worker, so it opens its own reader"""
+    reader = PdfReader(open_source(source))
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+def _ranges(start: int, stop: int, parts: int) -> list:
+    size = -(-(stop - start) // parts)
+    return [(i, min(i + size, stop)) for i in range(start, stop, size)]
+
+
+def extract_pdf_text(source) -> PdfText:
+    """Extract every page's text in one pass; see the module docstring."""
+    reader = PdfReader(open_source(source))
+    page_count = len(reader.pages)
+    sample = [reader.pages[i].extract_text() or '' for i in range(min(SAMPLE_PAGES, page_count))]
+
+    if not any(has_text(page) for page in sample):
+        # Looks like a scan: don't bother parsing the rest
+        return PdfText([None] * page_count, page_count)
+
+    rest = page_count - len(sample)
+    if rest >= PARALLEL_MIN_PAGES and EXTRACT_WORKERS > 1:
+        # Buffers are pickled to each worker; large uploads arrive as temp file paths instead
+        if not is_buffer(source):
+            source = str(source)
+        elif isinstance(source, memoryview):
+            source = source.tobytes()  # memoryviews can't be pickled
+        chunks = map_in_pool(_extract_range,
+                             [(source, a, b) for a, b in _ranges(len(sample), page_count, EXTRACT_WORKERS)])
+        pages = sample + [page for chunk in chunks for page in chunk]
+    else:
+        pages = sample + [reader.pages[i].extract_text() or '' for i in range(len(sample), page_count)]
+    return PdfText(pages, page_count)
+
+
+def single_page_pdf(reader: PdfReader, index: int) -> bytes:
+    """Page `index` of `reader` as a standalone one-page PDF (what Textract's sync API accepts inline)"""
+    writer = PdfWriter()
+    writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def combine_pdfs(documents: list) -> bytes:
+    """Concatenate PDFs (bytes) into one, in order"""
+    writer = PdfWriter()
+    for document in documents:
+        for page in PdfReader(io.BytesIO(document)).pages:
+            writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
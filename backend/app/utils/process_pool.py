@@ -0,0 +1,67 @@
+# app/utils/process_pool.py
+"""
+Shared process pool for CPU-bound extraction work (PDF text, OCR, image
+preprocessing) that would otherwise hold the GIL for seconds.
+
+The pool is created lazily, once per process, and only pays off for
+batches: worker.py runs non-forking SimpleWorkers so it survives from one
+job to the next, but a single item (one photo, a one-page scan) is still
+cheaper to run inline than to pickle across. run_inline gives such calls
+the same Future interface. A pool inherited across fork (a forking RQ
+worker) is discarded and rebuilt (same pid check as the LLM gateway).
+Children are started with the "forkserver" method: forking a process
+that already runs threads (the LLM gateway's event loop, boto3's pools)
+can deadlock, and forkserver children come from a clean single-threaded
+server instead.
+
+Functions submitted here must be module-level so they can be pickled.
+
+Usage:
+    results = map_in_pool(extract_pages, [(path, 0, 10), (path, 10, 20)])
+    future = run_inline(prepare_image, data) if single else get_process_pool().submit(prepare_image, data)
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Worker processes per pool; extraction is CPU-bound so there's no point exceeding the core count
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(
+                    max_workers=EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def run_inline(fn, *args) -> Future:
+    """fn(*args) run in this process, as an already finished Future"""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def map_in_pool(fn, arg_tuples) -> list:
+    """[fn(*args) for args in arg_tuples], run across the pool; results in input order"""
+    arg_tuples = list(arg_tuples)
+    if len(arg_tuples) <= 1 or EXTRACT_WORKERS <= 1:
+        return [fn(*args) for args in arg_tuples]
+    pool = get_process_pool()
+    futures = [pool.submit(fn, *args) for args in arg_tuples]
+    return [future.result() for future in futures]
@@ -0,0 +1,99 @@
+# app/utils/query_plans.py
+"""
+EXPLAIN-based guard for the hot queries in app/utils/database.py.
+
+Each query in hot_queries() is the same SELECT the app runs (built by the
+same helpers), so a change that drops an index or rewrites a query so it
+can't use one shows up here as a sequential scan.
+
+    - Postgres: EXPLAIN (FORMAT JSON) with enable_seqscan off, so the
+      planner only falls back to a Seq Scan when no index can serve the
+      query (on a small dev database it would otherwise always seq scan)
+    - SQLite: EXPLAIN QUERY PLAN; a "SCAN <table>" step that isn't reading
+      an index is a full table scan
+
+Run it with `flask --app "app:create_app" check-query-plans` (exits 1 on a
+regression), e.g. in CI after `flask db upgrade`.
+
+Usage:
+    problems = check_query_plans()   # [] when every hot query uses an index
+"""
+
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from ..extensions import db
+from ..models.recipe import Recipe
+from .database import FULL, SUMMARY, _child_queries, _select_recipes
+
+# Tables a hot query must never read in full
+INDEXED_TABLES = ('recipes', 'ingredients', 'directions', 'comments')
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?! USING (?:COVERING )?INDEX)')
+
+
+def hot_queries(user_id=1, recipe_ids=(1, 2, 3)):
+    """{name: SELECT} for every query on a request's hot path"""
+    queries = {
+        "list recipes": _select_recipes(user_id, FULL),
+        "list recipes page": _select_recipes(user_id, SUMMARY).limit(26),
+        "recipe by id": Recipe.query.filter_by(id=recipe_ids[0], user_id=user_id).limit(1).statement,
+    }
+    for name, query in _child_queries(list(recipe_ids)).items():
+        queries[f"load {name}"] = query
+    return queries
+
+
+def _sql(query, dialect):
+    return str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _postgres_seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in INDEXED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_postgres_seq_scans(child))
+    return found
+
+
+def explain(query):
+    """(plan text, tables read with a full scan) for `query` on the current database"""
+    session = db.session
+    dialect = session.get_bind().dialect
+    sql = _sql(query, dialect)
+    if dialect.name == 'postgresql':
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+        session.rollback()
+        return plan, _postgres_seq_scans(plan)
+    if dialect.name == 'sqlite':
+        details = [row[3] for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        scans = [m.group(1) for m in map(SQLITE_SCAN_RE.match, details) if m and m.group(1) in INDEXED_TABLES]
+        return '\n'.join(details), scans
+    raise Exception(f"Failed to explain query: unsupported database {dialect.name}")
+
+
+def check_query_plans():
+    """[(query name, scanned tables, plan)] for every hot query that does a sequential scan"""
+    problems = []
+    for name, query in hot_queries().items():
+        plan, scans = explain(query)
+        if scans:
+            problems.append((name, scans, plan))
+    return problems
+
+
+@click.command("check-query-plans")
+@with_appcontext
+def check_query_plans_command():
+    """Fail if a hot query would read recipes or their child tables with a sequential scan."""
+    problems = check_query_plans()
+    for name, scans, plan in problems:
+        click.echo(f"FAIL {name}: sequential scan on {', '.join(scans)}\n{plan}\n")
+    if problems:
+        raise SystemExit(1)
+    click.echo(f"OK: {len(hot_queries())} hot queries all use an index")
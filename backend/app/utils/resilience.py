@@ -0,0 +1,299 @@
+# app/utils/resilience.py
+"""
+Retries, circuit breakers and hedged requests for external dependencies
+(OpenAI, S3, Textract).
+
+    - Transient failures (timeouts, connection errors, 429, 5xx, AWS
+      throttling) are retried with full-jitter exponential backoff; a
+      Retry-After header from the server is honoured when it is longer.
+    - Each dependency has a circuit breaker. After CIRCUIT_FAILURE_THRESHOLD
+      consecutive transient failures it opens and calls fail immediately
+      with CircuitOpen for CIRCUIT_RESET_SECONDS, instead of tying up a
+      worker until the RQ job timeout. One trial call is then let through.
+    - Idempotent calls can be hedged: if the first attempt hasn't answered
+      after `hedge_after` seconds a second one is started and whichever
+      finishes first wins.
+
+Endpoints come from OPENAI_BASE_URL / AWS_ENDPOINT_URL, so all of this can
+be exercised against local stub servers.
+
+Work running inside an RQ job is killed outright at the job timeout, so
+long waits should be sized from job_time_left() rather than a fixed value.
+
+Usage:
+    result = call("textract", textract.detect_document_text, Document=..., hedge_after=5)
+    response = await acall("openai", client.chat.completions.create, deadline=deadline, **kwargs)
+    budget = job_time_left()    # seconds until the current RQ job is killed, None outside a job
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+import openai
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+from rq import get_current_job
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 4))
+BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))
+MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 20))
+# Stop retrying once a call has been going this long (seconds); well under the 300s RQ timeout
+RETRY_BUDGET = float(os.getenv("RETRY_BUDGET", 120))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+AWS_THROTTLING_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'SlowDown',
+    'RequestLimitExceeded', 'ProvisionedThroughputExceeded', 'LimitExceededException',
+    'InternalServerError', 'ServiceUnavailable',
+}
+
+
+class CircuitOpen(Exception):
+    """The dependency's circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed)."""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen unless a call may go through right now."""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_in_flight):
+                raise CircuitOpen(f"{self.name} is unavailable (circuit open), failing fast")
+            if state == "half-open":
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit for %s opened after %d failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(dependency: str) -> CircuitBreaker:
+    """The process-wide circuit breaker for `dependency`."""
+    with _breakers_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(dependency)
+        return _breakers[dependency]
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for failures worth retrying: timeouts, dropped connections, throttling, 5xx."""
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS
+    if isinstance(exc, (BotoConnectionError, ReadTimeoutError)):
+        return True
+    if isinstance(exc, ClientError):
+        status = exc.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return exc.response.get('Error', {}).get('Code') in AWS_THROTTLING_CODES or status >= 500
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Seconds the server asked us to wait (Retry-After header), if any."""
+    headers = None
+    if isinstance(exc, openai.APIStatusError):
+        headers = exc.response.headers
+    elif isinstance(exc, ClientError):
+        headers = exc.response.get('ResponseMetadata', {}).get('HTTPHeaders')
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: BaseException | None = None) -> float:
+    """Full-jitter exponential backoff for `attempt` (1-based), stretched to any Retry-After."""
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** (attempt - 1))))
+    server_delay = retry_after(exc) if exc is not None else None
+    if server_delay is not None:
+        delay = max(delay, min(server_delay, MAX_DELAY * 3))
+    return delay
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def _hedged(fn, args, kwargs, hedge_after):
+    """Run fn; if it's still going after `hedge_after` seconds start a second copy. First to finish wins."""
+    first = _hedge_pool.submit(fn, *args, **kwargs)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    logger.info("Hedging slow call to %s", getattr(fn, '__name__', fn))
+    pending = {first, _hedge_pool.submit(fn, *args, **kwargs)}
+    error = None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        # A loser still queued behind a busy pool never starts; one already running finishes unobserved
+        for future in pending:
+            future.cancel()
+
+
+def _out_of_time(attempt: int, started: float, delay: float, deadline: float | None) -> bool:
+    """True once another retry after `delay` seconds would go past MAX_ATTEMPTS, RETRY_BUDGET or `deadline`"""
+    now = time.monotonic()
+    if attempt >= MAX_ATTEMPTS or now - started + delay > RETRY_BUDGET:
+        return True
+    return deadline is not None and now + delay > deadline
+
+
+def call(dependency: str, fn, *args, hedge_after: float | None = None, deadline: float | None = None, **kwargs):
+    """
+    Call fn(*args, **kwargs) behind `dependency`'s circuit breaker, retrying
+    transient failures. Only pass `hedge_after` for idempotent calls.
+    No retry is started that would end past `deadline` (a time.monotonic() value).
+    """
+    circuit = breaker(dependency)
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        circuit.before_call()
+        try:
+            if hedge_after:
+                result = _hedged(fn, args, kwargs, hedge_after)
+            else:
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                circuit.record_success()  # the dependency answered; the request was bad
+                raise
+            circuit.record_failure()
+            delay = backoff_delay(attempt, e)
+            if _out_of_time(attempt, started, delay, deadline):
+                raise
+            logger.warning("%s call failed (%s); retry %d/%d in %.1fs", dependency, e, attempt, MAX_ATTEMPTS - 1, delay)
+            time.sleep(delay)
+            continue
+        circuit.record_success()
+        return result
+
+
+async def _ahedged(coro_fn, args, kwargs, hedge_after):
+    first = asyncio.ensure_future(coro_fn(*args, **kwargs))
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+    pending = {first, asyncio.ensure_future(coro_fn(*args, **kwargs))}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def acall(dependency: str, coro_fn, *args, hedge_after: float | None = None, deadline: float | None = None,
+                **kwargs):
+    """Async version of call() for coroutine functions (e.g. AsyncOpenAI)."""
+    circuit = breaker(dependency)
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        circuit.before_call()
+        try:
+            if hedge_after:
+                result = await _ahedged(coro_fn, args, kwargs, hedge_after)
+            else:
+                result = await coro_fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                circuit.record_success()
+                raise
+            circuit.record_failure()
+            delay = backoff_delay(attempt, e)
+            if _out_of_time(attempt, started, delay, deadline):
+                raise
+            logger.warning("%s call failed (%s); retry %d/%d in %.1fs", dependency, e, attempt, MAX_ATTEMPTS - 1, delay)
+            await asyncio.sleep(delay)
+            continue
+        circuit.record_success()
+        return result
+
+
+def job_time_left() -> float | None:
+    """Seconds before the RQ job running this code hits its timeout; None outside a job (or without one)."""
+    job = get_current_job()
+    if job is None or not job.timeout or job.timeout < 0 or job.started_at is None:
+        return None
+    started_at = job.started_at
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=datetime.timezone.utc)
+    elapsed = (datetime.datetime.now(datetime.timezone.utc) - started_at).total_seconds()
+    return job.timeout - elapsed
+
+
+def circuit_states() -> dict:
+    """Current state of every breaker, for diagnostics."""
+    with _breakers_lock:
+        return {name: {"state": b.state, "failures": b.failures} for name, b in _breakers.items()}
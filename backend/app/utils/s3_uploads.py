@@ -0,0 +1,195 @@
+# app/utils/s3_uploads.py
+"""
+Direct-to-S3 uploads, so file bodies never pass through a web worker.
+
+    1. POST /api/recipes/upload-url   -> presigned PUT URL + object key
+    2. client PUTs the file straight to S3 (with the returned headers)
+    3. POST /api/recipes/upload/commit {key, filename}
+       -> the object is checked (exists, under MAX_CONTENT_LENGTH) and the
+          import is enqueued with the key instead of the bytes
+    4. the worker streams the object from S3 (fetch_upload) and deletes it
+       once the import has run
+
+Multipart uploads that arrive at the web route anyway are staged under
+the same prefix by stage_upload when they're too big to ride in the RQ
+job's arguments (see tasks.enqueue_upload), and take the same worker path.
+
+Keys are uploads/<user_id>/<random hex><ext>: unguessable, never reused,
+and a user can only commit keys under their own prefix. Objects whose
+commit never arrives should be cleaned up by a lifecycle rule on the
+uploads/ prefix.
+
+Everything goes through the shared s3 client (aws.py), so AWS_ENDPOINT_URL
+pointed at MinIO or a moto server exercises the whole flow locally.
+
+Usage:
+    upload = presign_upload(user_id, "card.jpg")      # {"url", "key", "method", "headers", "expires_in"}
+    key = stage_upload(user_id, "scan.pdf", data)      # body already in hand (web route)
+    check_upload(key, max_bytes)                       # size; raises UploadNotFound / UploadTooLarge
+    with fetch_upload(key, ".pdf", max_bytes) as source:   # bytes, or a temp file path when large
+        ...
+"""
+
+import logging
+import mimetypes
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from .aws import S3_BUCKET, s3
+from .resilience import call
+from .uploads import UPLOAD_SPOOL_MAX
+
+logger = logging.getLogger(__name__)
+
+# Seconds a presigned upload URL stays valid
+UPLOAD_URL_EXPIRES = int(os.getenv("UPLOAD_URL_EXPIRES", 15 * 60))
+UPLOAD_KEY_PREFIX = "uploads"
+# Read size when streaming an object into a temp file
+FETCH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadNotFound(Exception):
+    """No object under the committed key (never uploaded, or already processed)."""
+
+
+class UploadTooLarge(Exception):
+    """The uploaded object is over the size limit; it has been deleted."""
+
+
+def direct_uploads_enabled() -> bool:
+    return bool(S3_BUCKET)
+
+
+def _user_prefix(user_id) -> str:
+    return f"{UPLOAD_KEY_PREFIX}/{user_id}/"
+
+
+def owns_key(user_id, key: str) -> bool:
+    return key.startswith(_user_prefix(user_id)) and '..' not in key
+
+
+def _new_key(user_id, filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{_user_prefix(user_id)}{uuid.uuid4().hex}{ext}"
+
+
+def _content_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def presign_upload(user_id, filename: str) -> dict:
+    """A presigned PUT for a new object; the client must send `headers` with the body"""
+    key = _new_key(user_id, filename)
+    content_type = _content_type(filename)
+    url = s3.generate_presigned_url(
+        'put_object',
+        Params={'Bucket': S3_BUCKET, 'Key': key, 'ContentType': content_type},
+        ExpiresIn=UPLOAD_URL_EXPIRES,
+        HttpMethod='PUT',
+    )
+    return {
+        "url": url,
+        "key": key,
+        "method": "PUT",
+        "headers": {"Content-Type": content_type},
+        "expires_in": UPLOAD_URL_EXPIRES,
+    }
+
+
+def stage_upload(user_id, filename: str, data: bytes) -> str:
+    """Put an upload the web process already holds into S3; returns the key for fetch_upload"""
+    key = _new_key(user_id, filename)
+    call("s3", s3.put_object, Bucket=S3_BUCKET, Key=key, Body=data, ContentType=_content_type(filename))
+    return key
+
+
+def _is_missing(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+
+def check_upload(key: str, max_bytes: int | None) -> int:
+    """Size of the uploaded object; oversized objects are deleted (presigned PUTs can't cap the size)"""
+    try:
+        head = call("s3", s3.head_object, Bucket=S3_BUCKET, Key=key)
+    except ClientError as e:
+        if _is_missing(e):
+            raise UploadNotFound(key)
+        raise
+    size = head['ContentLength']
+    if max_bytes and size > max_bytes:
+        delete_upload(key)
+        raise UploadTooLarge(f"{size} bytes")
+    return size
+
+
+def delete_upload(key: str) -> None:
+    try:
+        call("s3", s3.delete_object, Bucket=S3_BUCKET, Key=key)
+    except Exception as e:
+        logger.warning("Failed to delete uploaded object %s: %s", key, e)
+
+
+def _read_capped(chunks, max_bytes: int | None, key: str):
+    """Yield the chunks, raising UploadTooLarge as soon as more than max_bytes have arrived"""
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise UploadTooLarge(f"{key} is over {max_bytes} bytes")
+        yield chunk
+
+
+@contextmanager
+def fetch_upload(key: str, suffix: str = "", max_bytes: int | None = None):
+    """
+    Stream the object down: small ones are yielded as bytes, larger than
+    UPLOAD_SPOOL_MAX are written chunk by chunk to a uniquely named temp
+    file whose path is yielded (and removed afterwards).
+
+    The presigned PUT stays valid after the commit, so the object may have
+    been replaced since check_upload: the size is checked again here, both
+    the declared ContentLength and the bytes actually read.
+    """
+    try:
+        response = call("s3", s3.get_object, Bucket=S3_BUCKET, Key=key)
+    except ClientError as e:
+        if _is_missing(e):
+            raise UploadNotFound(key)
+        raise
+    body = response['Body']
+    path = None
+    try:
+        if max_bytes and response['ContentLength'] > max_bytes:
+            raise UploadTooLarge(f"{key} is {response['ContentLength']} bytes")
+        chunks = _read_capped(body.iter_chunks(FETCH_CHUNK_SIZE), max_bytes, key)
+        if response['ContentLength'] <= UPLOAD_SPOOL_MAX:
+            source = b''.join(chunks)
+        else:
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                path = tmp.name
+                for chunk in chunks:
+                    tmp.write(chunk)
+            source = path
+    except BaseException:
+        _remove(path)
+        raise
+    finally:
+        body.close()
+
+    try:
+        yield source
+    finally:
+        _remove(path)
+
+
+def _remove(path) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning("Failed to remove fetched upload %s: %s", path, e)
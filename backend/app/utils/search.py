@@ -0,0 +1,235 @@
+# app/utils/search.py
+"""
+Full-text search and faceted filtering over a user's recipes.
+
+Every word of the query has to appear (as a prefix, after stemming) in the
+recipe's title, one of its ingredients or one of its directions:
+    - Postgres: to_tsvector/to_tsquery, served by the GIN expression
+      indexes from migration b7e4d2a91c05
+    - SQLite: the FTS5 tables from the same migration
+    - anything else, or SQLite without the FTS tables: ILIKE
+
+The text match runs in the database and returns a narrow row per matching
+recipe. Facet filters (course, cuisine, primary_ingredient, total time)
+and facet counts are then worked out in Python: the time columns are free
+text ("1 hour 10 mins") so they can't be compared in SQL, and a user's
+matching set is small. Only the requested page is fully loaded.
+
+Usage:
+    result = search_recipes(user_id, "garlic chicken", {"course": ["Dinner"]}, max_time=45, limit=20)
+    result["recipes"], result["total"], result["facets"], result["next_offset"]
+"""
+
+import logging
+import re
+from collections import Counter
+
+from sqlalchemy import Integer, func, literal_column, or_, select, text, union
+
+from ..extensions import db
+from ..models.direction import Direction
+from ..models.ingredient import Ingredient
+from ..models.recipe import Recipe
+from .database import FULL, get_recipes_by_ids
+from .structured import duration_minutes
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ('course', 'cuisine', 'primary_ingredient')
+# (bucket, from minutes inclusive, to minutes exclusive) for the total-time facet
+TIME_BUCKETS = [
+    ('under_15', 0, 15),
+    ('15_to_30', 15, 30),
+    ('30_to_60', 30, 60),
+    ('over_60', 60, None),
+]
+UNKNOWN = 'Unknown'
+MAX_TERMS = 8
+# Filler words dropped from every query. Not a copy of Postgres' english stopword list: there
+# each term's tsquery is checked with numnode() instead, and ignored when the dictionary empties it
+STOPWORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+             'of', 'on', 'or', 'the', 'to', 'with'}
+
+HOURS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:h|hrs?|hours?)\b', re.I)
+MINUTES_RE = re.compile(r'(\d+)\s*(?:m|mins?|minutes?)\b', re.I)
+
+_fts_available = {}
+
+
+def search_terms(q):
+    """Words to search for, lowercased; punctuation and stopwords dropped"""
+    words = [w.lower() for w in re.findall(r'[^\W_]+', q or '')]
+    return [w for w in words if w not in STOPWORDS][:MAX_TERMS]
+
+
+def time_minutes(value):
+    """'1 hour 10 mins' / '45' / 'PT20M' -> minutes as an int; None if it can't be read"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    if value.upper().startswith('P'):
+        minutes = duration_minutes(value)
+        return int(minutes) if minutes else None
+    hours = sum(float(h) for h in HOURS_RE.findall(value))
+    minutes = sum(int(m) for m in MINUTES_RE.findall(value))
+    if not hours and not minutes:
+        return None
+    return int(round(hours * 60 + minutes))
+
+
+def total_minutes(row):
+    """A recipe's total time in minutes, from total_time or else prep + cook"""
+    total = time_minutes(row['total_time'])
+    if total is not None:
+        return total
+    prep, cook = time_minutes(row['prep_time']), time_minutes(row['cook_time'])
+    if prep is None and cook is None:
+        return None
+    return (prep or 0) + (cook or 0)
+
+
+def _time_bucket(minutes):
+    if minutes is None:
+        return UNKNOWN
+    for name, low, high in TIME_BUCKETS:
+        if minutes >= low and (high is None or minutes < high):
+            return name
+    return UNKNOWN
+
+
+def _has_fts(session):
+    bind = session.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available:
+        found = session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('recipes_fts', 'ingredients_fts', 'directions_fts')"
+        )).scalar()
+        _fts_available[key] = found == 3
+        if not _fts_available[key]:
+            logger.warning("FTS5 search tables missing (run flask db upgrade); falling back to LIKE")
+    return _fts_available[key]
+
+
+def _postgres_tsquery(term):
+    return func.to_tsquery(literal_column("'english'"), f"{term}:*")
+
+
+def _postgres_matches(query):
+    """Recipe ids whose title, ingredients or directions match the tsquery (tsvector, GIN-indexed)"""
+
+    def matches(column):
+        # Same expression as the index in migration b7e4d2a91c05
+        vector = func.to_tsvector(literal_column("'english'"), func.coalesce(column, ''))
+        return vector.op('@@')(query)
+
+    return union(
+        select(Recipe.id).where(matches(Recipe.title)),
+        select(Ingredient.recipe_id).where(matches(Ingredient.ingredient)),
+        select(Direction.recipe_id).where(matches(Direction.instruction)),
+    )
+
+
+def _sqlite_matches(term, n):
+    """Recipe ids whose title, ingredients or directions contain `term` (FTS5)"""
+    param = f"term{n}"
+    return text(
+        f"SELECT rowid AS id FROM recipes_fts WHERE recipes_fts MATCH :{param} "
+        f"UNION SELECT i.recipe_id FROM ingredients_fts JOIN ingredients i ON i.id = ingredients_fts.rowid "
+        f"WHERE ingredients_fts MATCH :{param} "
+        f"UNION SELECT d.recipe_id FROM directions_fts JOIN directions d ON d.id = directions_fts.rowid "
+        f"WHERE directions_fts MATCH :{param}"
+    ).bindparams(**{param: f'"{term}"*'}).columns(id=Integer)
+
+
+def _like_matches(term):
+    pattern = f"%{term}%"
+    return union(
+        select(Recipe.id).where(Recipe.title.ilike(pattern)),
+        select(Ingredient.recipe_id).where(Ingredient.ingredient.ilike(pattern)),
+        select(Direction.recipe_id).where(Direction.instruction.ilike(pattern)),
+    )
+
+
+def _candidates(user_id, terms):
+    """Narrow rows for every recipe of the user's that matches all `terms`, newest first"""
+    session = db.session
+    dialect = session.get_bind().dialect.name
+    query = (
+        select(Recipe.id, Recipe.course, Recipe.cuisine, Recipe.primary_ingredient,
+               Recipe.prep_time, Recipe.cook_time, Recipe.total_time)
+        .where(Recipe.user_id == user_id)
+        .order_by(Recipe.created_at.desc(), Recipe.id.desc())
+    )
+    for n, term in enumerate(terms):
+        if dialect == 'postgresql':
+            # A stopword ("all", "over", ...) gives an empty tsquery, which matches nothing; skip the term
+            tsquery = _postgres_tsquery(term)
+            query = query.where(or_(func.numnode(tsquery) == 0, Recipe.id.in_(_postgres_matches(tsquery))))
+            continue
+        if dialect == 'sqlite' and _has_fts(session):
+            matches = _sqlite_matches(term, n)
+        else:
+            matches = _like_matches(term)
+        query = query.where(Recipe.id.in_(matches))
+    return session.execute(query).mappings().all()
+
+
+def _facet_value(row, field):
+    return row[field] or UNKNOWN
+
+
+def search_recipes(user_id, q='', filters=None, min_time=None, max_time=None,
+                   limit=25, offset=0, fields=FULL):
+    """
+    Search a user's recipes.
+
+    filters maps a FACET_FIELDS name to the values to allow (any of them;
+    case-insensitive, "Unknown" matches empty). min_time/max_time bound the
+    total time in minutes, inclusive; recipes with no readable time are left
+    out when either is given.
+
+    Returns {"total", "recipes", "facets", "next_offset"}. Each facet's
+    counts ignore that facet's own filter, so the other choices stay visible.
+    """
+    filters = {field: {v.lower() for v in values} for field, values in (filters or {}).items() if values}
+    try:
+        rows = _candidates(user_id, search_terms(q))
+    except Exception as e:
+        logger.error("Error searching recipes: %s", e)
+        raise Exception(f"Failed to search recipes: {str(e)}")
+
+    minutes = {row['id']: total_minutes(row) for row in rows}
+
+    def passes_time(row):
+        if min_time is None and max_time is None:
+            return True
+        value = minutes[row['id']]
+        if value is None:
+            return False
+        return (min_time is None or value >= min_time) and (max_time is None or value <= max_time)
+
+    def passes(row, skip=None):
+        for field, allowed in filters.items():
+            if field != skip and _facet_value(row, field).lower() not in allowed:
+                return False
+        return skip == 'time' or passes_time(row)
+
+    facets = {}
+    for field in FACET_FIELDS:
+        facets[field] = dict(Counter(_facet_value(row, field) for row in rows if passes(row, skip=field)).most_common())
+    time_counts = Counter(_time_bucket(minutes[row['id']]) for row in rows if passes(row, skip='time'))
+    facets['total_time'] = {name: time_counts.get(name, 0) for name, _, _ in TIME_BUCKETS}
+    facets['total_time'][UNKNOWN] = time_counts.get(UNKNOWN, 0)
+
+    matched = [row['id'] for row in rows if passes(row)]
+    page = matched[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(matched) else None
+    return {
+        "total": len(matched),
+        "recipes": get_recipes_by_ids(page, fields),
+        "facets": facets,
+        "next_offset": next_offset,
+    }
@@ -0,0 +1,334 @@
+# app/utils/structured.py
+"""
+Structured-data fast path for URL imports.
+
+Most recipe sites embed a schema.org Recipe, either as an
+<script type="application/ld+json"> block or as microdata
+(itemscope/itemprop attributes). When one is present we map it straight
+into the dict shape save_recipe() expects and skip the LLM entirely.
+
+Usage:
+    ld_blocks, microdata = collect_structured_data(soup)
+    recipe_data = find_structured_recipe(ld_blocks, microdata)   # None if absent
+"""
+
+import html
+import json
+import re
+
+# Mirrors the UNIT NORMALIZATION table in the parse prompt (parser.py).
+# Keep the two in sync.
+UNIT_ALIASES = {
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsp': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp',
+    'cup': 'cup', 'cups': 'cups',
+    'can': 'can', 'cans': 'cans',
+    'ounce': 'oz', 'ounces': 'oz', 'oz': 'oz', 'ozs': 'oz',
+    'pound': 'lb', 'pounds': 'lb', 'lb': 'lb', 'lbs': 'lb',
+    'gram': 'g', 'grams': 'g', 'g': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kg': 'kg',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml', 'ml': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l', 'l': 'l',
+    'pinch': 'pinch', 'pinches': 'pinch',
+    'dash': 'dash', 'dashes': 'dash',
+    'clove': 'clove', 'cloves': 'clove',
+}
+
+# schema.org Recipe properties that are always lists
+LIST_PROPS = ('recipeIngredient', 'ingredients', 'recipeInstructions')
+
+# Units that describe a container's size ("28 oz can") rather than a count
+SIZE_UNITS = {'oz', 'lb', 'g', 'kg', 'ml', 'l'}
+
+UNICODE_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅖': '2/5', '⅗': '3/5', '⅘': '4/5', '⅙': '1/6',
+    '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+
+# Allowed categories from the parse prompt, with the words sites commonly use for them
+COURSES = {
+    'Breakfast': ['breakfast', 'brunch'],
+    'Lunch': ['lunch', 'sandwich', 'salad', 'soup'],
+    'Dinner': ['dinner', 'main', 'entree', 'entrée', 'supper', 'side'],
+    'Dessert': ['dessert', 'cake', 'pie', 'cookie', 'sweet'],
+    'Appetizer': ['appetizer', 'starter', 'hors'],
+    'Snack': ['snack'],
+    'Beverage': ['beverage', 'drink', 'cocktail', 'smoothie'],
+    'Baking': ['baking', 'bread', 'baked'],
+}
+CUISINES = ['American', 'Italian', 'Mexican', 'Chinese', 'Indian', 'French', 'German', 'Japanese', 'Thai']
+PRIMARY_INGREDIENTS = {
+    'Beef': ['beef', 'steak', 'brisket', 'chuck', 'sirloin'],
+    'Chicken': ['chicken', 'turkey'],
+    'Pork': ['pork', 'bacon', 'ham', 'sausage', 'prosciutto'],
+    'Fish': ['fish', 'salmon', 'tuna', 'cod', 'shrimp', 'halibut', 'tilapia', 'scallop', 'crab'],
+    'Lamb': ['lamb'],
+    'Venison': ['venison', 'deer'],
+    'Bear': ['bear'],
+    'Moose': ['moose'],
+    'Pasta': ['pasta', 'spaghetti', 'penne', 'noodle', 'macaroni', 'lasagna', 'fettuccine'],
+    'Grains': ['rice', 'quinoa', 'oat', 'barley', 'flour', 'farro'],
+    'Dairy': ['cheese', 'milk', 'cream', 'yogurt', 'butter'],
+    'Vegetables': ['potato', 'tomato', 'carrot', 'broccoli', 'spinach', 'zucchini', 'squash',
+                   'mushroom', 'cauliflower', 'pepper', 'bean', 'lentil', 'cabbage', 'kale'],
+}
+
+QUANTITY_RE = re.compile(
+    r'^(?P<qty>(?:\d+\s+\d+/\d+|\d+(?:[./]\d+)?)(?:\s*(?:-|–|to)\s*(?:\d+\s+\d+/\d+|\d+(?:[./]\d+)?))?)\s*'
+)
+# Container size written without parentheses after the count: "1 8 oz can ..."
+BARE_SIZE_RE = re.compile(r'^(?P<size>\d+(?:[./]\d+)?\s*[A-Za-z]+)\.?\s+(?=cans?\b)')
+UNIT_RE = re.compile(r'^(?P<unit>[A-Za-z]+)\.?(?=\s|$|\()\s*')
+PAREN_RE = re.compile(r'^\((?P<size>[^)]*)\)\s*')
+DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?'
+    r'(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$',
+    re.IGNORECASE,
+)
+
+
+def _clean(value):
+    """Plain text from a schema.org string: entities decoded, tags stripped, whitespace collapsed"""
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        value = value.get('text') or value.get('name') or ''
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    text = html.unescape(str(value))
+    text = re.sub(r'<[^>]+>', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _is_recipe(node):
+    types = _as_list(node.get('@type'))
+    return any(isinstance(t, str) and t.rsplit('/', 1)[-1] == 'Recipe' for t in types)
+
+
+def _walk_ld(node):
+    """Yield every dict in a JSON-LD document (top-level lists, @graph, nested values)"""
+    if isinstance(node, list):
+        for item in node:
+            yield from _walk_ld(item)
+    elif isinstance(node, dict):
+        yield node
+        for value in node.values():
+            if isinstance(value, (list, dict)):
+                yield from _walk_ld(value)
+
+
+def normalize_unit(word):
+    """Map a unit word onto the prompt's unit table, or None if it isn't a unit"""
+    return UNIT_ALIASES.get(word.lower().rstrip('.'))
+
+
+def _normalize_size(size):
+    """'28 ounces each' -> '28 oz each'"""
+    return re.sub(
+        r'(?<=\d)[\s-]*([A-Za-z]+)\.?',
+        lambda m: ' ' + (normalize_unit(m.group(1)) or m.group(1)),
+        size.strip(),
+    )
+
+
+def parse_ingredient_line(line):
+    """
+    Split a free-text ingredient line into {ingredient, quantity, unit},
+    following the same unit and container rules the parse prompt enforces.
+    """
+    text = _clean(line)
+    for char, fraction in UNICODE_FRACTIONS.items():
+        text = re.sub(rf'(\d)?{char}', lambda m: f"{m.group(1)} {fraction}" if m.group(1) else fraction, text)
+    text = re.sub(r'(?<=\d)\s*-\s*(?=[A-Za-z])', ' ', text)  # "28-ounce" -> "28 ounce"
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    quantity, unit, size = '', '', None
+    match = QUANTITY_RE.match(text)
+    if match:
+        quantity = re.sub(r'\s*(?:–|to)\s*', '-', match.group('qty')).strip()
+        text = text[match.end():]
+
+    match = PAREN_RE.match(text) or BARE_SIZE_RE.match(text)
+    if match and quantity:
+        size = _normalize_size(match.group('size'))
+        text = text[match.end():]
+
+    match = UNIT_RE.match(text)
+    if match and normalize_unit(match.group('unit')):
+        unit = normalize_unit(match.group('unit'))
+        text = text[match.end():]
+
+        if unit in SIZE_UNITS and size is None:
+            # "28 oz can tomatoes" -> 28 oz of tomatoes
+            text = re.sub(r'^(?:cans?|jars?)\b\s*', '', text)
+        elif unit in ('can', 'cans'):
+            match = PAREN_RE.match(text)
+            if match:
+                size = _normalize_size(match.group('size'))
+                text = text[match.end():]
+
+    text = re.sub(r'^of\s+', '', text).strip(' ,')
+    if size:
+        text = f"{text} ({size})"
+    return {"ingredient": text, "quantity": quantity, "unit": unit}
+
+
+def duration_minutes(value):
+    """ISO 8601 duration ('PT1H30M') -> minutes as a string; '' if it can't be read"""
+    match = DURATION_RE.match(_clean(value))
+    if not match or not any(match.groupdict().values()):
+        return ''
+    parts = {k: float(v) if v else 0.0 for k, v in match.groupdict().items()}
+    minutes = parts['days'] * 1440 + parts['hours'] * 60 + parts['minutes'] + parts['seconds'] / 60
+    return str(int(round(minutes)))
+
+
+def _servings(value):
+    for item in _as_list(value):
+        match = re.search(r'\d+', _clean(item))
+        if match:
+            return match.group(0)
+    return _clean(value)
+
+
+def _course(value):
+    for category in _as_list(value):
+        words = _clean(category).lower()
+        for course, keywords in COURSES.items():
+            if any(k in words for k in keywords):
+                return course
+    return None
+
+
+def _cuisine(value):
+    for cuisine in _as_list(value):
+        words = _clean(cuisine).lower()
+        for name in CUISINES:
+            if name.lower() in words:
+                return name
+    return 'Other'
+
+
+def _primary_ingredient(title, ingredients):
+    # PRIMARY_INGREDIENTS is ordered proteins first, so "beef chili with beans" is Beef
+    words = ' '.join([title] + [i['ingredient'] for i in ingredients]).lower()
+    for name, keywords in PRIMARY_INGREDIENTS.items():
+        if any(re.search(rf'\b{k}(?:e?s)?\b', words) for k in keywords):
+            return name
+    return 'Other'
+
+
+def _instructions(value):
+    """Flatten recipeInstructions (text, list, HowToStep, HowToSection) into step strings"""
+    steps = []
+    for item in _as_list(value):
+        if isinstance(item, str):
+            steps.extend(s for s in (_clean(p) for p in re.split(r'\n+|<br\s*/?>|</p>', item, flags=re.I)) if s)
+        elif isinstance(item, dict):
+            if item.get('itemListElement'):
+                steps.extend(_instructions(item['itemListElement']))
+            else:
+                step = _clean(item.get('text') or item.get('name'))
+                if step:
+                    steps.append(step)
+    return steps
+
+
+def recipe_from_schema(node):
+    """
+    Map a schema.org Recipe object onto the save_recipe() dict shape.
+    Returns None if the node is missing a title, ingredients or directions,
+    in which case the caller should fall back to the LLM.
+    """
+    title = _clean(node.get('name') or node.get('headline'))
+    ingredients = [parse_ingredient_line(i)
+                   for i in _as_list(node.get('recipeIngredient') or node.get('ingredients'))
+                   if _clean(i)]
+    steps = _instructions(node.get('recipeInstructions'))
+    if not title or not ingredients or not steps:
+        return None
+
+    prep_time = duration_minutes(node.get('prepTime'))
+    cook_time = duration_minutes(node.get('cookTime'))
+    total_time = duration_minutes(node.get('totalTime'))
+    if not total_time and (prep_time or cook_time):
+        total_time = str(int(prep_time or 0) + int(cook_time or 0))
+
+    recipe_data = {
+        "title": title,
+        "cuisine": _cuisine(node.get('recipeCuisine')),
+        "prep_time": prep_time,
+        "cook_time": cook_time,
+        "total_time": total_time,
+        "servings": _servings(node.get('recipeYield')),
+        "primary_ingredient": _primary_ingredient(title, ingredients),
+        "ingredients": ingredients,
+        "directions": [{"step_number": n, "instruction": step} for n, step in enumerate(steps, start=1)],
+        "comments": [],
+    }
+    course = _course(node.get('recipeCategory'))
+    if course:
+        recipe_data['course'] = course
+    return recipe_data
+
+
+def _microdata_value(tag):
+    for attr in ('content', 'datetime', 'href', 'src'):
+        if tag.get(attr):
+            return tag[attr]
+    return tag.get_text(separator='\n', strip=True)
+
+
+def collect_structured_data(soup):
+    """
+    Pull the raw structured data out of a parsed page (before scripts are stripped).
+    Returns (ld_json_blocks, microdata_recipes) where microdata recipes are
+    dicts of itemprop -> value or list of values, in schema.org naming.
+    """
+    ld_blocks = [script.string or script.get_text()
+                 for script in soup.find_all('script', type=re.compile(r'ld\+json', re.I))]
+
+    microdata = []
+    for root in soup.find_all(attrs={'itemtype': re.compile(r'schema\.org/Recipe/?$', re.I)}):
+        item = {}
+        for tag in root.find_all(attrs={'itemprop': True}):
+            # Skip properties that belong to a nested item (e.g. the author's name)
+            owner = tag.find_parent(attrs={'itemscope': True})
+            if owner is not root:
+                continue
+            for prop in tag['itemprop'].split():
+                item.setdefault(prop, []).append(_microdata_value(tag))
+        microdata.append(microdata_item(item))
+    return ld_blocks, microdata
+
+
+def microdata_item(props):
+    """Collapse {itemprop: [values]} into schema.org shape (single values unwrapped, lists kept for list props)"""
+    return {k: v[0] if len(v) == 1 and k not in LIST_PROPS else v for k, v in props.items()}
+
+
+def find_structured_recipe(ld_blocks, microdata):
+    """First usable schema.org Recipe on the page, mapped for save_recipe(), or None"""
+    for block in ld_blocks:
+        try:
+            document = json.loads(block, strict=False)
+        except (TypeError, ValueError):
+            continue
+        for node in _walk_ld(document):
+            if _is_recipe(node):
+                recipe_data = recipe_from_schema(node)
+                if recipe_data:
+                    return recipe_data
+
+    for node in microdata:
+        recipe_data = recipe_from_schema(node)
+        if recipe_data:
+            return recipe_data
+    return None
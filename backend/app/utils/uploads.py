@@ -0,0 +1,80 @@
+# app/utils/uploads.py
+"""
+Uploaded file handling for the import pipeline.
+
+Web side: werkzeug parses the multipart body into SpooledTemporaryFiles
+(in memory up to 500 KB, an anonymous unique temp file past that) and,
+with MAX_CONTENT_LENGTH set, stops reading as soon as the body crosses
+the limit (chunked uploads without a Content-Length included) by raising
+RequestEntityTooLarge. The route reads the spooled file once into the
+bytes that are enqueued (staged in S3 first when they're large, see
+tasks.enqueue_upload); nothing is saved under UPLOAD_FOLDER.
+
+Worker side: the extractors take a `source` that is either a path or the
+bytes themselves. spooled() hands small uploads over as-is (PdfReader and
+PIL read them through io.BytesIO, which shares a bytes object's buffer
+instead of copying it) and writes large PDFs to a uniquely named temp
+file, removed afterwards, so page-range extraction in the process pool
+opens the file rather than pickling a copy of it to every worker.
+
+Usage:
+    with spooled(data, suffix=".pdf") as source:
+        text = extract_text_from_pdf(source, filename)
+    reader = PdfReader(open_source(source))
+    key = content_hash(source)
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# PDFs larger than this (bytes) are spooled to a temp file in the worker
+UPLOAD_SPOOL_MAX = int(os.getenv("UPLOAD_SPOOL_MAX", 1024 * 1024))
+
+
+def is_buffer(source) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def open_source(source):
+    """Something PdfReader / Image.open accept: a BytesIO over the buffer, or the path"""
+    return io.BytesIO(source) if is_buffer(source) else source
+
+
+def read_source(source) -> bytes:
+    if is_buffer(source):
+        return source
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def content_hash(source) -> str:
+    """sha256 hex digest of a buffer (hashed in place) or a file (read in chunks)"""
+    if is_buffer(source):
+        return hashlib.sha256(source).hexdigest()
+    with open(source, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+@contextmanager
+def spooled(data, suffix: str = "", spool_max: int = UPLOAD_SPOOL_MAX):
+    """Yield `data` itself when it's small, else the path of a temp file holding it"""
+    if len(data) <= spool_max:
+        yield data
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+    try:
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning("Failed to remove spooled upload %s: %s", path, e)
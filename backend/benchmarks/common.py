@@ -0,0 +1,90 @@
+# benchmarks/common.py
+"""
+Shared helpers for the scripts in benchmarks/.
+
+The benchmarks run against a throwaway in-memory SQLite database with the
+app's models, so they need no Redis, OpenAI or AWS configuration.
+
+Usage:
+    app = make_app()
+    with app.app_context():
+        seed_recipes(user_id=1, count=100)
+        with count_queries() as counter:
+            get_all_recipes(1)
+        print(counter.count)
+"""
+
+import contextlib
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event
+
+from app import models  # noqa: F401  (registers the tables)
+from app.extensions import db
+from app.models.comment import Comment
+from app.models.direction import Direction
+from app.models.ingredient import Ingredient
+from app.models.recipe import Recipe
+from app.models.user import User
+
+
+def make_app(database_url: str = "sqlite://") -> Flask:
+    """A bare Flask app with only the database wired up, tables created."""
+    app = Flask("benchmarks")
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_recipes(user_id: int, count: int, ingredients: int = 10, directions: int = 6, comments: int = 1):
+    """Insert `count` recipes (with children) for `user_id`, creating the user if needed."""
+    if db.session.get(User, user_id) is None:
+        db.session.add(User(id=user_id, username=f"bench{user_id}", email=f"bench{user_id}@example.com",
+                            first_name="Bench", last_name="Mark", password_hash="x"))
+    start = datetime(2025, 1, 1)
+    for n in range(count):
+        recipe = Recipe(user_id=user_id, title=f"Recipe {n}", course="Dinner", cuisine="Italian",
+                        prep_time="10 mins", cook_time="20 mins", total_time="30 mins", servings="4",
+                        primary_ingredient="Pasta", is_url=0, recipe_source="bench",
+                        created_at=start + timedelta(minutes=n))
+        recipe.ingredients = [Ingredient(ingredient=f"ingredient {i}", quantity="1", unit="cup")
+                              for i in range(ingredients)]
+        recipe.directions = [Direction(step_number=d + 1, instruction=f"Step {d + 1} of recipe {n}")
+                             for d in range(directions)]
+        recipe.comments = [Comment(comments=f"Comment {c}") for c in range(comments)]
+        db.session.add(recipe)
+    db.session.commit()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Count the SQL statements executed on db.engine inside the block."""
+    counter = QueryCounter()
+    event.listen(db.engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", counter)
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """Fastest of `repeat` runs of fn(), in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
@@ -0,0 +1,80 @@
+# benchmarks/image_prep.py
+"""
+Size and time of the image sent to Vision, raw upload versus prepare_image,
+for synthetic phone photos (a recipe card on a textured table, EXIF-rotated).
+
+"tiles" is the number of 512 px tiles Vision bills for after its own
+downscaling (fit 2048x2048, short side 768), so it tracks token cost.
+
+Usage (from backend/):
+    python -m benchmarks.image_prep
+    python -m benchmarks.image_prep --megapixels 3 12 48
+"""
+
+import argparse
+import base64
+import io
+import math
+import random
+
+from PIL import Image, ImageDraw
+
+from app.utils.image_prep import prepare_image
+
+from .common import best_of
+
+
+def make_photo(megapixels: float) -> bytes:
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = width * 3 // 4
+    rng = random.Random(megapixels)
+    photo = Image.effect_noise((width, height), 40).convert("RGB")
+    photo = Image.blend(photo, Image.new("RGB", (width, height), (150, 110, 80)), 0.6)
+
+    # A card covering ~40% of the frame with 30 lines of "text"
+    draw = ImageDraw.Draw(photo)
+    left, top, right, bottom = width // 5, height // 6, width * 4 // 5, height * 5 // 6
+    draw.rectangle((left, top, right, bottom), fill=(245, 242, 235))
+    line_height = (bottom - top) // 32
+    for line in range(30):
+        y = top + line_height * (line + 1)
+        x = left + line_height
+        while x < right - 3 * line_height:
+            word = rng.randint(2, 8) * line_height // 3
+            draw.rectangle((x, y, x + word, y + line_height // 2), fill=(30, 30, 30))
+            x += word + line_height // 2
+
+    # Stored sideways with EXIF orientation 6, as phones do
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    photo.transpose(Image.Transpose.ROTATE_90).save(buffer, format="JPEG", quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def vision_tiles(data: bytes) -> int:
+    width, height = Image.open(io.BytesIO(data)).size
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    return math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[3, 12, 48])
+    args = parser.parse_args()
+
+    print(f"{'MP':>4} | {'raw KB':>7} {'b64 KB':>7} {'tiles':>5} | {'prepared KB':>11} {'b64 KB':>7} "
+          f"{'tiles':>5} {'size':>10} {'ms':>6}")
+    for megapixels in args.megapixels:
+        raw = make_photo(megapixels)
+        prepared, _ = prepare_image(raw)
+        ms = best_of(lambda: prepare_image(raw), repeat=3)
+        size = "x".join(map(str, Image.open(io.BytesIO(prepared)).size))
+        print(f"{megapixels:>4.0f} | {len(raw) / 1024:>7.0f} {len(base64.b64encode(raw)) / 1024:>7.0f} "
+              f"{vision_tiles(raw):>5} | {len(prepared) / 1024:>11.0f} "
+              f"{len(base64.b64encode(prepared)) / 1024:>7.0f} {vision_tiles(prepared):>5} {size:>10} {ms:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/json_encoding.py
+"""
+Time to encode GET /api/recipes response bodies with each JSON provider,
+for synthetic users with 10/100/1000 recipes.
+
+"stdlib" is Flask's default provider (json.dumps, sorted keys, ASCII
+escaping, datetimes pre-converted with isoformat() as the serializers used
+to do); "orjson" is app.json_provider.OrjsonProvider with datetimes passed
+through as they come from the database.
+
+Usage (from backend/):
+    python -m benchmarks.json_encoding
+    python -m benchmarks.json_encoding --sizes 10 100 1000 5000
+"""
+
+import argparse
+import contextlib
+import io
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import OrjsonProvider, orjson
+from app.utils.database import get_all_recipes
+
+from .common import best_of, make_app, seed_recipes
+
+
+def with_iso_dates(recipes):
+    return [{**recipe, "created_at": recipe["created_at"].isoformat()} for recipe in recipes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    if orjson is None:
+        raise SystemExit("orjson is not installed (pip install orjson)")
+
+    app = make_app()
+    stdlib, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+    print(f"{'recipes':>8} | {'KB':>7} | {'stdlib ms':>9} | {'orjson ms':>9} | {'speedup':>7}")
+    with app.app_context():
+        for user_id, size in enumerate(args.sizes, start=1):
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_recipes(user_id, size)
+                recipes = get_all_recipes(user_id)
+
+            stdlib_ms = best_of(lambda: stdlib.dumps(with_iso_dates(recipes)))
+            fast_ms = best_of(lambda: fast.dumps(recipes))
+            assert fast.loads(fast.dumps(recipes)) == stdlib.loads(stdlib.dumps(with_iso_dates(recipes)))
+            size_kb = len(fast.dumps(recipes).encode()) / 1024
+            print(f"{size:>8} | {size_kb:>7.0f} | {stdlib_ms:>9.2f} | {fast_ms:>9.2f} | {stdlib_ms / fast_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
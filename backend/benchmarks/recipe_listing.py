@@ -0,0 +1,60 @@
+# benchmarks/recipe_listing.py
+"""
+Query count and latency of GET /api/recipes (get_all_recipes) versus the
+number of recipes a user has.
+
+"lazy" is the old implementation: load the Recipe rows, then let
+serialize_recipe() lazy-load ingredients, directions and comments one
+recipe at a time (1 + 3N queries). "batched" is get_all_recipes(), which
+loads the children for every recipe at once.
+
+Usage (from backend/):
+    python -m benchmarks.recipe_listing
+    python -m benchmarks.recipe_listing --sizes 10 100 1000
+"""
+
+import argparse
+import contextlib
+import io
+
+from app.extensions import db
+from app.models.recipe import Recipe
+from app.utils.database import get_all_recipes, serialize_recipe
+
+from .common import best_of, count_queries, make_app, seed_recipes
+
+
+def lazy_get_all_recipes(user_id):
+    recipes = Recipe.query.filter_by(user_id=user_id).order_by(Recipe.created_at.desc())
+    return [serialize_recipe(recipe) for recipe in recipes]
+
+
+def measure(fn, user_id):
+    db.session.expunge_all()  # start cold, like a fresh request
+    with count_queries() as counter:
+        result = fn(user_id)
+    # get_all_recipes() prints progress; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed = best_of(lambda: (db.session.expunge_all(), fn(user_id)))
+    return result, counter.count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 1000])
+    args = parser.parse_args()
+
+    app = make_app()
+    print(f"{'recipes':>8} | {'lazy queries':>12} {'lazy ms':>9} | {'batched queries':>15} {'batched ms':>10}")
+    with app.app_context():
+        for user_id, size in enumerate(args.sizes, start=1):
+            seed_recipes(user_id, size)
+            with contextlib.redirect_stdout(io.StringIO()):
+                lazy, lazy_queries, lazy_ms = measure(lazy_get_all_recipes, user_id)
+                batched, batched_queries, batched_ms = measure(get_all_recipes, user_id)
+            assert lazy == batched, "batched loader returned different JSON"
+            print(f"{size:>8} | {lazy_queries:>12} {lazy_ms:>9.1f} | {batched_queries:>15} {batched_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
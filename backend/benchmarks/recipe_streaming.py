@@ -0,0 +1,58 @@
+# benchmarks/recipe_streaming.py
+"""
+Peak Python memory while producing the GET /api/recipes body, buffered
+(get_all_recipes + one json dump) versus streamed (iter_recipes, encoded
+recipe by recipe as ?stream=1 does), and the gzip/Brotli sizes of the body.
+
+Usage (from backend/):
+    python -m benchmarks.recipe_streaming
+    python -m benchmarks.recipe_streaming --sizes 100 1000 3000
+"""
+
+import argparse
+import contextlib
+import io
+import tracemalloc
+
+from app.compression import brotli, compress
+from app.json_provider import make_json_provider
+from app.utils.database import get_all_recipes, iter_recipes
+
+from .common import make_app, seed_recipes
+
+
+def peak_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    args = parser.parse_args()
+
+    app = make_app()
+    app.json = make_json_provider(app)
+    dumps = app.json.dumps
+    print(f"{'recipes':>8} | {'body KB':>8} {'gzip KB':>8} {'br KB':>7} | {'buffered peak KB':>16} {'streamed peak KB':>16}")
+    with app.app_context():
+        for user_id, size in enumerate(args.sizes, start=1):
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_recipes(user_id, size)
+                body = dumps(get_all_recipes(user_id)).encode()
+
+                buffered = peak_kb(lambda: dumps(get_all_recipes(user_id)))
+                streamed = peak_kb(lambda: sum(len(dumps(r)) for r in iter_recipes(user_id)))
+
+            gzip_kb = len(compress(body, 'gzip')) / 1024
+            br_kb = len(compress(body, 'br')) / 1024 if brotli else float('nan')
+            print(f"{size:>8} | {len(body) / 1024:>8.0f} {gzip_kb:>8.0f} {br_kb:>7.0f} | "
+                  f"{buffered:>16.0f} {streamed:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
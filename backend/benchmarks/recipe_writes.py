@@ -0,0 +1,115 @@
+# benchmarks/recipe_writes.py
+"""
+Query count and latency of saving a recipe and of editing one ingredient,
+versus recipe size.
+
+"legacy" is the old implementation: one ORM object per child row on save,
+and delete-everything-then-re-add on update. "bulk" is save_recipe() /
+update_recipe_by_id(): batched INSERTs, and an update that only writes the
+rows that changed.
+
+On SQLite every statement is a function call; against Postgres each one is
+a network round trip, so the query count is the number to watch. The
+"edit 1" numbers include reading the recipe to build the PUT body (the same
+few queries on both sides).
+
+Usage (from backend/):
+    python -m benchmarks.recipe_writes
+    python -m benchmarks.recipe_writes --sizes 10 40 200
+"""
+
+import argparse
+import contextlib
+import io
+
+from app.extensions import db
+from app.models.comment import Comment
+from app.models.direction import Direction
+from app.models.ingredient import Ingredient
+from app.models.recipe import Recipe
+from app.utils.database import get_recipe_by_id, save_recipe, update_recipe_by_id
+
+from .common import best_of, count_queries, make_app, seed_recipes
+
+USER_ID = 1
+
+
+def recipe_data(size):
+    return {
+        "title": f"Big recipe ({size} ingredients)",
+        "ingredients": [{"ingredient": f"ingredient {n}", "quantity": "1", "unit": "cup"} for n in range(size)],
+        "directions": [{"step_number": n + 1, "instruction": f"Step {n + 1}"} for n in range(size // 2)],
+        "comments": [{"comments": "Family favourite"}],
+    }
+
+
+def legacy_save(data, user_id):
+    recipe = Recipe(title=data['title'], user_id=user_id)
+    db.session.add(recipe)
+    db.session.flush()
+    for ing in data['ingredients']:
+        db.session.add(Ingredient(recipe_id=recipe.id, **ing))
+    for step in data['directions']:
+        db.session.add(Direction(recipe_id=recipe.id, **step))
+    for comment in data['comments']:
+        db.session.add(Comment(recipe_id=recipe.id, **comment))
+    db.session.commit()
+    return recipe.id
+
+
+def legacy_update(recipe_id, user_id, data):
+    recipe = Recipe.query.filter_by(id=recipe_id, user_id=user_id).first()
+    recipe.title = data.get("title", recipe.title)
+    db.session.query(Ingredient).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
+    db.session.query(Direction).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
+    db.session.query(Comment).filter_by(recipe_id=recipe.id).delete(synchronize_session=False)
+    for ing in data["ingredients"]:
+        db.session.add(Ingredient(recipe_id=recipe.id, **ing))
+    for step in data["directions"]:
+        db.session.add(Direction(recipe_id=recipe.id, **step))
+    for comment in data["comments"]:
+        db.session.add(Comment(recipe_id=recipe.id, **comment))
+    db.session.commit()
+
+
+def edit_one_ingredient(recipe_id):
+    """The PUT body the frontend sends after changing one quantity"""
+    data = get_recipe_by_id(recipe_id, USER_ID)
+    data["ingredients"] = [dict(ing) for ing in data["ingredients"]]
+    middle = data["ingredients"][len(data["ingredients"]) // 2]
+    middle["quantity"] = "2" if middle["quantity"] != "2" else "3"
+    return data
+
+
+def measure(fn):
+    with count_queries() as counter:
+        fn()
+    return counter.count, best_of(fn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40, 200])
+    args = parser.parse_args()
+
+    app = make_app()
+    print(f"{'size':>5} | {'op':<8} | {'legacy queries':>14} {'legacy ms':>9} | {'bulk queries':>12} {'bulk ms':>8}")
+    with app.app_context(), contextlib.redirect_stdout(io.StringIO()) as quiet:
+        seed_recipes(USER_ID, 0)
+        lines = []
+        for size in args.sizes:
+            data = recipe_data(size)
+            save = (measure(lambda: legacy_save(data, USER_ID)), measure(lambda: save_recipe(data, USER_ID)))
+
+            legacy_id, bulk_id = legacy_save(data, USER_ID), save_recipe(data, USER_ID)
+            update = (
+                measure(lambda: legacy_update(legacy_id, USER_ID, edit_one_ingredient(legacy_id))),
+                measure(lambda: update_recipe_by_id(bulk_id, USER_ID, edit_one_ingredient(bulk_id))),
+            )
+            for op, ((lq, lms), (bq, bms)) in (("save", save), ("edit 1", update)):
+                lines.append(f"{size:>5} | {op:<8} | {lq:>14} {lms:>9.1f} | {bq:>12} {bms:>8.1f}")
+    print('\n'.join(lines))
+
+
+if __name__ == "__main__":
+    main()
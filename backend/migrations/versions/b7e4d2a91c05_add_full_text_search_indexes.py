@@ -0,0 +1,73 @@
+"""add full-text search indexes
+
+Revision ID: b7e4d2a91c05
+Revises: 73d7ac4ac2a0
+Create Date: 2026-01-12 10:41:07.218934
+
+Postgres: GIN indexes on to_tsvector('english', ...) of recipes.title,
+ingredients.ingredient and directions.instruction. The expressions must
+match the ones app/utils/search.py queries with, or the planner won't use
+the indexes.
+
+SQLite: FTS5 external-content tables over the same columns, kept in sync
+by triggers, for local development.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d2a91c05'
+down_revision = '73d7ac4ac2a0'
+branch_labels = None
+depends_on = None
+
+
+# (table, indexed column, index / FTS table name)
+SEARCHED_COLUMNS = [
+    ('recipes', 'title', 'recipes_fts'),
+    ('ingredients', 'ingredient', 'ingredients_fts'),
+    ('directions', 'instruction', 'directions_fts'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column, name in SEARCHED_COLUMNS:
+        if dialect == 'postgresql':
+            op.execute(
+                f"CREATE INDEX ix_{name} ON {table} "
+                f"USING gin (to_tsvector('english', coalesce({column}, '')))"
+            )
+        elif dialect == 'sqlite':
+            op.execute(
+                f"CREATE VIRTUAL TABLE {name} USING fts5("
+                f"{column}, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {name}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {name}(rowid, {column}) VALUES (new.id, new.{column}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {name}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {name}({name}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {name}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+                f"INSERT INTO {name}({name}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+                f"INSERT INTO {name}(rowid, {column}) VALUES (new.id, new.{column}); END"
+            )
+            # Index the rows that are already there
+            op.execute(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column, name in SEARCHED_COLUMNS:
+        if dialect == 'postgresql':
+            op.execute(f"DROP INDEX IF EXISTS ix_{name}")
+        elif dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {name}")
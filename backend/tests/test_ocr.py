@@ -0,0 +1,139 @@
+# tests/test_ocr.py
+"""
+The async Textract path (TextractBackend.ocr_document) and the fallback
+policy in ocr_pdf_pages, with the S3 and Textract clients stubbed by
+botocore's Stubber: NextToken pagination, the content-hash
+ClientRequestToken, falling back to inline OCR when the job fails, and
+not falling back when it runs out of time.
+
+Usage (from backend/):
+    python -m unittest tests.test_ocr
+"""
+
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+# ocr.py imports the AWS clients, which need a region
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import boto3  # noqa: E402
+from botocore.stub import ANY, Stubber  # noqa: E402
+
+from app.utils import ocr  # noqa: E402
+
+BUCKET = "recipes-test"
+PAGES = {index: f"%PDF page {index}".encode() for index in range(4)}
+DOCUMENT = b"".join(PAGES[index] for index in sorted(PAGES))
+DIGEST = hashlib.sha256(DOCUMENT).hexdigest()
+KEY = f"textract/{DIGEST}.pdf"
+
+
+def _line(text, page=None):
+    block = {"BlockType": "LINE", "Text": text, "Confidence": 90.0}
+    if page is not None:
+        block["Page"] = page
+    return block
+
+
+class TextractTest(unittest.TestCase):
+
+    def setUp(self):
+        credentials = {"region_name": "us-east-1", "aws_access_key_id": "testing", "aws_secret_access_key": "testing"}
+        self.s3 = Stubber(boto3.client("s3", **credentials))
+        self.textract = Stubber(boto3.client("textract", **credentials))
+        for name, value in (
+            ("s3", self.s3.client),
+            ("textract", self.textract.client),
+            ("S3_BUCKET", BUCKET),
+            ("OCR_BACKEND", "remote"),
+            ("TEXTRACT_POLL_INTERVAL", (0.01, 0.01)),
+            ("combine_pdfs", lambda pages: b"".join(pages)),
+            ("job_time_left", lambda: None),
+        ):
+            patcher = mock.patch.object(ocr, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.s3.activate()
+        self.textract.activate()
+
+    def tearDown(self):
+        self.s3.assert_no_pending_responses()
+        self.textract.assert_no_pending_responses()
+
+    def expect_staging(self):
+        self.s3.add_response("put_object", {}, {
+            "Bucket": BUCKET, "Key": KEY, "Body": DOCUMENT, "ContentType": "application/pdf",
+        })
+
+    def expect_start(self, job_id="job-1"):
+        self.textract.add_response("start_document_text_detection", {"JobId": job_id}, {
+            "DocumentLocation": {"S3Object": {"Bucket": BUCKET, "Name": KEY}},
+            "ClientRequestToken": DIGEST[:64],
+        })
+
+    def expect_get(self, response, next_token=None, job_id="job-1"):
+        params = {"JobId": job_id, "MaxResults": 1000}
+        if next_token:
+            params["NextToken"] = next_token
+        self.textract.add_response("get_document_text_detection", response, params)
+
+    def expect_cleanup(self):
+        self.s3.add_response("delete_object", {}, {"Bucket": BUCKET, "Key": KEY})
+
+    def test_async_job_follows_next_token(self):
+        self.expect_staging()
+        self.expect_start()
+        self.expect_get({"JobStatus": "IN_PROGRESS", "Blocks": []})
+        self.expect_get({"JobStatus": "SUCCEEDED", "NextToken": "t2",
+                         "Blocks": [_line("page 1", 1), _line("page 2", 2)]})
+        self.expect_get({"JobStatus": "SUCCEEDED", "Blocks": [_line("page 3", 3), _line("more page 1", 1)]},
+                        next_token="t2")
+        self.expect_cleanup()
+
+        results = ocr.ocr_pdf_pages(PAGES)
+
+        self.assertEqual({index: result.text for index, result in results.items()},
+                         {0: "page 1\nmore page 1", 1: "page 2", 2: "page 3", 3: ""})
+        self.assertEqual(results[0].engine, "textract")
+
+    def test_same_scan_reuses_key_and_request_token(self):
+        for _ in range(2):
+            self.expect_staging()
+            self.expect_start()
+            self.expect_get({"JobStatus": "SUCCEEDED", "Blocks": [_line("page 1", 1)]})
+            self.expect_cleanup()
+
+        for _ in range(2):
+            pages = ocr.remote_pdf.ocr_document(DOCUMENT, 1)
+            self.assertEqual(pages[0].text, "page 1")
+
+    def test_failed_job_falls_back_to_inline_ocr(self):
+        self.expect_staging()
+        self.expect_start()
+        self.expect_get({"JobStatus": "FAILED", "StatusMessage": "bad document", "Blocks": []})
+        self.expect_cleanup()
+        for _ in PAGES:
+            self.textract.add_response("detect_document_text", {"Blocks": [_line("inline")]},
+                                       {"Document": {"Bytes": ANY}})
+
+        results = ocr.ocr_pdf_pages(PAGES)
+
+        self.assertEqual([results[index].text for index in sorted(results)], ["inline"] * len(PAGES))
+
+    def test_timeout_does_not_fall_back(self):
+        self.expect_staging()
+        self.expect_start()
+        self.expect_get({"JobStatus": "IN_PROGRESS", "Blocks": []})
+        self.expect_cleanup()
+
+        # The RQ job only has the reserve left, so there is no time to wait
+        with mock.patch.object(ocr, "job_time_left", lambda: ocr.TEXTRACT_JOB_RESERVE):
+            with self.assertRaisesRegex(Exception, "Timed out waiting for OCR"):
+                ocr.ocr_pdf_pages(PAGES)
+        # No detect_document_text responses were queued, so any inline call would have failed
+
+
+if __name__ == "__main__":
+    unittest.main()
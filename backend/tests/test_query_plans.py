@@ -0,0 +1,58 @@
+# tests/test_query_plans.py
+"""
+Runs the query-plan guard (app/utils/query_plans.py) against a SQLite
+database built by the Alembic migrations, so an index that the models
+declare but no migration creates (or a query that stops using one) fails
+here rather than in production.
+
+Usage (from backend/):
+    python -m unittest tests.test_query_plans
+"""
+
+import os
+import tempfile
+import unittest
+
+# create_app() imports the RQ tasks and the AWS clients, which need these set
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from flask_migrate import upgrade  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.utils.query_plans import check_query_plans  # noqa: E402
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+class QueryPlansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(self.tmpdir.name, 'plans.db')}"
+        self.app = create_app()
+        self.context = self.app.app_context()
+        self.context.push()
+        upgrade(directory=MIGRATIONS)
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+        del os.environ["DATABASE_URL"]
+        self.tmpdir.cleanup()
+
+    def test_hot_queries_use_an_index(self):
+        problems = check_query_plans()
+        self.assertEqual(problems, [], "\n".join(f"{name}: {scans}\n{plan}" for name, scans, plan in problems))
+
+    def test_dropped_index_is_reported(self):
+        db.session.execute(text("DROP INDEX ix_ingredients_recipe_id_id"))
+        problems = check_query_plans()
+        self.assertIn("ingredients", [table for _, scans, _ in problems for table in scans])
+
+
+if __name__ == "__main__":
+    unittest.main()
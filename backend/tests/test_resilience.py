@@ -0,0 +1,231 @@
+# tests/test_resilience.py
+"""
+Circuit breakers, retries and hedging (app/utils/resilience.py). Time is
+injected: the module's `time` is swapped for a fake clock whose sleep()
+just advances it, so backoff, Retry-After and deadlines are checked
+without waiting.
+
+Usage (from backend/):
+    python -m unittest tests.test_resilience
+"""
+
+import datetime
+import threading
+import types
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from app.utils import resilience
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def throttled(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    return ClientError({"Error": {"Code": "ThrottlingException"},
+                        "ResponseMetadata": {"HTTPStatusCode": 400, "HTTPHeaders": headers}}, "DetectDocumentText")
+
+
+class FakeCalls:
+    """Raises the queued exceptions in order, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class ResilienceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for name, value in (("time", self.clock), ("_breakers", {})):
+            patcher = mock.patch.object(resilience, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class CircuitBreakerTest(ResilienceTestCase):
+
+    def test_opens_after_threshold_then_half_opens(self):
+        circuit = resilience.CircuitBreaker("dep", failure_threshold=2, reset_timeout=30)
+        circuit.record_failure()
+        self.assertEqual(circuit.state, "closed")
+        circuit.record_failure()
+        self.assertEqual(circuit.state, "open")
+        with self.assertRaises(resilience.CircuitOpen):
+            circuit.before_call()
+
+        self.clock.now += 30
+        self.assertEqual(circuit.state, "half-open")
+        circuit.before_call()  # the one trial call
+        with self.assertRaises(resilience.CircuitOpen):
+            circuit.before_call()
+
+    def test_trial_success_closes(self):
+        circuit = resilience.CircuitBreaker("dep", failure_threshold=1, reset_timeout=30)
+        circuit.record_failure()
+        self.clock.now += 30
+        circuit.before_call()
+        circuit.record_success()
+        self.assertEqual((circuit.state, circuit.failures), ("closed", 0))
+
+    def test_trial_failure_reopens(self):
+        circuit = resilience.CircuitBreaker("dep", failure_threshold=1, reset_timeout=30)
+        circuit.record_failure()
+        self.clock.now += 30
+        circuit.before_call()
+        circuit.record_failure()
+        self.assertEqual(circuit.state, "open")
+        self.clock.now += 29
+        self.assertEqual(circuit.state, "open")
+
+    def test_call_fails_fast_while_open(self):
+        fn = FakeCalls()
+        circuit = resilience.breaker("dep")
+        circuit.opened_at = self.clock.now
+        with self.assertRaises(resilience.CircuitOpen):
+            resilience.call("dep", fn)
+        self.assertEqual(fn.count, 0)
+
+
+class CallTest(ResilienceTestCase):
+
+    def test_retries_transient_failures(self):
+        fn = FakeCalls(throttled(), throttled())
+        self.assertEqual(resilience.call("dep", fn), "ok")
+        self.assertEqual((fn.count, len(self.clock.sleeps)), (3, 2))
+
+    def test_does_not_retry_client_errors(self):
+        error = ClientError({"Error": {"Code": "InvalidParameterException"},
+                             "ResponseMetadata": {"HTTPStatusCode": 400}}, "DetectDocumentText")
+        fn = FakeCalls(error)
+        with self.assertRaises(ClientError):
+            resilience.call("dep", fn)
+        self.assertEqual((fn.count, resilience.breaker("dep").failures), (1, 0))
+
+    def test_honours_retry_after(self):
+        fn = FakeCalls(throttled(retry_after=7))
+        self.assertEqual(resilience.call("dep", fn), "ok")
+        self.assertGreaterEqual(self.clock.sleeps[0], 7)
+
+    def test_retry_after_http_date(self):
+        when = datetime.datetime.fromtimestamp(self.clock.now + 12, datetime.timezone.utc)
+        error = throttled(retry_after=when.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+        self.assertAlmostEqual(resilience.retry_after(error), 12, delta=1)
+
+    def test_no_retry_past_deadline(self):
+        fn = FakeCalls(throttled(retry_after=7))
+        with self.assertRaises(ClientError):
+            resilience.call("dep", fn, deadline=self.clock.now + 5)
+        self.assertEqual((fn.count, self.clock.sleeps), (1, []))
+
+    def test_gives_up_after_max_attempts(self):
+        fn = FakeCalls(*[throttled() for _ in range(resilience.MAX_ATTEMPTS)])
+        with self.assertRaises(ClientError):
+            resilience.call("dep", fn)
+        self.assertEqual(fn.count, resilience.MAX_ATTEMPTS)
+
+
+class JobTimeLeftTest(ResilienceTestCase):
+
+    def test_outside_a_job(self):
+        with mock.patch.object(resilience, "get_current_job", lambda: None):
+            self.assertIsNone(resilience.job_time_left())
+
+    def test_inside_a_job(self):
+        started_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=100)
+        job = types.SimpleNamespace(timeout=300, started_at=started_at.replace(tzinfo=None))
+        with mock.patch.object(resilience, "get_current_job", lambda: job):
+            self.assertAlmostEqual(resilience.job_time_left(), 200, delta=5)
+
+
+class QueuedPool:
+    """Executor stand-in whose futures never run; the test settles them."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+class HedgeTest(unittest.TestCase):
+
+    def hedge_pool(self, pool):
+        patcher = mock.patch.object(resilience, "_hedge_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def setUp(self):
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+        self.hedge_pool(self.pool)
+
+    def test_fast_call_is_not_hedged(self):
+        calls = []
+        self.assertEqual(resilience._hedged(lambda: calls.append(None) or "first", (), {}, 5), "first")
+        self.assertEqual(len(calls), 1)
+
+    def test_second_copy_wins_when_first_is_slow(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def fn():
+            calls.append(None)
+            if len(calls) == 1:
+                release.wait(5)
+                return "first"
+            return "second"
+
+        self.assertEqual(resilience._hedged(fn, (), {}, 0.05), "second")
+
+    def test_first_error_does_not_hide_second_success(self):
+        calls = []
+
+        def fn():
+            calls.append(None)
+            if len(calls) == 1:
+                threading.Event().wait(0.1)
+                raise TimeoutError("slow and broken")
+            return "second"
+
+        self.assertEqual(resilience._hedged(fn, (), {}, 0.05), "second")
+
+    def test_loser_is_cancelled(self):
+        pool = self.hedge_pool(QueuedPool())
+        # The first attempt answers after the hedge has been queued
+        threading.Timer(0.2, lambda: pool.futures[0].set_result("first")).start()
+        self.assertEqual(resilience._hedged(lambda: None, (), {}, 0.05), "first")
+        first, hedge = pool.futures
+        self.assertTrue(hedge.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+# tests/test_s3_uploads.py
+"""
+Direct-to-S3 uploads (app/utils/s3_uploads.py and the upload-url / commit
+routes) against moto's in-memory S3: presign then PUT, commit of foreign
+and oversized keys, the size re-check when the worker fetches the object,
+and deletion once the import has run.
+
+Usage (from backend/):
+    python -m unittest tests.test_s3_uploads
+"""
+
+import os
+import unittest
+from unittest import mock
+
+# create_app() imports the RQ tasks and the AWS clients, which need these set
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+import boto3  # noqa: E402
+import requests  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from app import create_app, tasks  # noqa: E402
+from app.recipes import routes  # noqa: E402
+from app.utils import s3_uploads  # noqa: E402
+from app.utils.aws import s3_config  # noqa: E402
+
+BUCKET = "recipes-test"
+MAX_BYTES = 64 * 1024
+
+
+class S3UploadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aws = mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+        # The shared client was built at import time, before moto was listening
+        self.s3 = boto3.client("s3", region_name="us-east-1", config=s3_config,
+                               aws_access_key_id="testing", aws_secret_access_key="testing")
+        self.s3.create_bucket(Bucket=BUCKET)
+        for name, value in (("s3", self.s3), ("S3_BUCKET", BUCKET), ("UPLOAD_SPOOL_MAX", 1024)):
+            patcher = mock.patch.object(s3_uploads, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.app = create_app()
+        self.app.config["MAX_CONTENT_LENGTH"] = MAX_BYTES
+        with self.app.app_context():
+            self.headers = {"Authorization": f"Bearer {create_access_token(identity='7')}"}
+        self.client = self.app.test_client()
+
+        self.enqueued = []
+        for target, name, value in (
+            (routes, "create_job", lambda: "job-1"),
+            (routes, "enqueue_s3_upload", lambda *args: self.enqueued.append(args)),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def keys(self):
+        return [obj["Key"] for obj in self.s3.list_objects_v2(Bucket=BUCKET).get("Contents", [])]
+
+    def presign(self, filename="card.pdf"):
+        response = self.client.post("/api/recipes/upload-url", json={"filename": filename}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()
+
+    def put(self, upload, body):
+        response = requests.put(upload["url"], data=body, headers=upload["headers"])
+        self.assertEqual(response.status_code, 200)
+
+    def commit(self, key, filename=None):
+        return self.client.post("/api/recipes/upload/commit", json={"key": key, "filename": filename},
+                                headers=self.headers)
+
+    def test_presign_then_put_then_commit(self):
+        upload = self.presign()
+        self.assertTrue(upload["key"].startswith("uploads/7/") and upload["key"].endswith(".pdf"))
+        self.assertEqual(upload["headers"], {"Content-Type": "application/pdf"})
+
+        self.assertEqual(self.commit(upload["key"]).status_code, 404)  # not PUT yet
+        self.put(upload, b"%PDF-1.4 recipe")
+        self.assertEqual(self.keys(), [upload["key"]])
+
+        response = self.commit(upload["key"], "Grandma.pdf")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.enqueued, [("job-1", "7", "Grandma.pdf", upload["key"])])
+
+    def test_unsupported_extension_is_refused(self):
+        response = self.client.post("/api/recipes/upload-url", json={"filename": "x.exe"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_commit_of_another_users_key(self):
+        upload = self.presign()
+        self.put(upload, b"%PDF-1.4 recipe")
+        for key in (upload["key"].replace("/7/", "/8/"), "uploads/7/../8/x.pdf", "other/x.pdf"):
+            self.assertEqual(self.commit(key).status_code, 404, key)
+        self.assertEqual(self.enqueued, [])
+
+    def test_commit_of_oversized_object_deletes_it(self):
+        upload = self.presign("scan.jpg")
+        self.put(upload, b"x" * (MAX_BYTES + 1))
+        self.assertEqual(self.commit(upload["key"]).status_code, 413)
+        self.assertEqual(self.keys(), [])
+        self.assertEqual(self.enqueued, [])
+
+    def test_fetch_rechecks_the_size(self):
+        upload = self.presign()
+        self.put(upload, b"%PDF-1.4 recipe")
+        self.assertEqual(self.commit(upload["key"]).status_code, 202)
+        # The presigned URL still works after the commit
+        self.put(upload, b"x" * (MAX_BYTES + 1))
+        with self.assertRaises(s3_uploads.UploadTooLarge):
+            with s3_uploads.fetch_upload(upload["key"], ".pdf", MAX_BYTES):
+                pass
+
+    def test_read_cap_holds_when_content_length_is_wrong(self):
+        with self.assertRaises(s3_uploads.UploadTooLarge):
+            list(s3_uploads._read_capped([b"a" * 10] * 5, 25, "k"))
+
+    def test_fetch_spools_large_objects_to_a_temp_file(self):
+        upload = self.presign()
+        self.put(upload, b"y" * 4096)
+        with s3_uploads.fetch_upload(upload["key"], ".pdf", MAX_BYTES) as source:
+            self.assertIsInstance(source, str)
+            with open(source, "rb") as f:
+                self.assertEqual(f.read(), b"y" * 4096)
+        self.assertFalse(os.path.exists(source))
+
+    def test_object_is_deleted_after_processing(self):
+        imported, errors = [], []
+        with mock.patch.object(tasks, "_get_app", lambda: self.app), \
+                mock.patch.object(tasks, "_import_file", lambda app, job_id, user_id, filename, source:
+                                  imported.append(source)), \
+                mock.patch.object(tasks, "set_error", lambda job_id, error: errors.append(error)):
+            upload = self.presign()
+            self.put(upload, b"%PDF-1.4 recipe")
+            tasks.process_s3_upload("job-1", "7", "card.pdf", upload["key"])
+            self.assertEqual((imported, errors, self.keys()), ([b"%PDF-1.4 recipe"], [], []))
+
+            # Replaced with an oversized body after the commit: refused, and still deleted
+            upload = self.presign()
+            self.put(upload, b"x" * (MAX_BYTES + 1))
+            tasks.process_s3_upload("job-2", "7", "card.pdf", upload["key"])
+            self.assertEqual((len(imported), errors, self.keys()), (1, ["Uploaded file is too large"], []))
+
+            # Already processed
+            tasks.process_s3_upload("job-3", "7", "card.pdf", upload["key"])
+            self.assertEqual(errors[-1], "Uploaded file not found; it may have expired")
+
+
+if __name__ == "__main__":
+    unittest.main()
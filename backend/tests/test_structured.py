@@ -0,0 +1,54 @@
+# tests/test_structured.py
+"""
+Ingredient-line parsing for the structured-data fast path
+(app/utils/structured.py), which has to agree with the unit and container
+rules the parse prompt gives the LLM.
+
+Usage (from backend/):
+    python -m unittest tests.test_structured
+"""
+
+import unittest
+
+from app.utils.structured import duration_minutes, parse_ingredient_line
+
+
+class ParseIngredientLineTest(unittest.TestCase):
+
+    def assertParsed(self, line, ingredient, quantity, unit):
+        self.assertEqual(parse_ingredient_line(line), {"ingredient": ingredient, "quantity": quantity, "unit": unit})
+
+    def test_mixed_number(self):
+        self.assertParsed("1 1/2 cups flour", "flour", "1 1/2", "cups")
+        self.assertParsed("1 ½ tsp salt", "salt", "1 1/2", "tsp")
+
+    def test_count_then_bare_container_size(self):
+        # "1 8" is a count and a size, not a mixed number
+        self.assertParsed("1 8 oz can tomato paste", "tomato paste (8 oz)", "1", "can")
+        self.assertParsed("1 28-ounce can tomatoes", "tomatoes (28 oz)", "1", "can")
+
+    def test_parenthesised_container_size(self):
+        self.assertParsed("2 (28 ounce) cans tomatoes", "tomatoes (28 oz)", "2", "cans")
+        self.assertParsed("1 can (14 oz) beans", "beans (14 oz)", "1", "can")
+
+    def test_size_unit_drops_container(self):
+        self.assertParsed("28 oz can tomatoes", "tomatoes", "28", "oz")
+
+    def test_ranges(self):
+        self.assertParsed("2-3 cloves garlic", "garlic", "2-3", "clove")
+        self.assertParsed("1 to 2 cups water", "water", "1-2", "cups")
+
+    def test_no_unit(self):
+        self.assertParsed("3 eggs", "eggs", "3", "")
+
+
+class DurationMinutesTest(unittest.TestCase):
+
+    def test_iso_durations(self):
+        self.assertEqual(duration_minutes("PT1H30M"), "90")
+        self.assertEqual(duration_minutes("P1D"), "1440")
+        self.assertEqual(duration_minutes("soon"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+# worker.py
+"""
+Runs the RQ workers that process recipe imports (see app/tasks.py).
+
+RQ_WORKER_CONCURRENCY worker processes are started under one RQ
+WorkerPool, so a single worker dyno can run several imports at once
+without the web dyno spawning a thread per request.
+
+The workers are SimpleWorkers: jobs run in the worker process itself
+rather than in a work horse forked per job, so the extraction process
+pool, the LLM gateway (and its HTTP connections) and the Flask app are
+built once per worker and reused by every job.
+"""
+import os
+
+from dotenv import load_dotenv
+from rq import SimpleWorker
+from rq.worker_pool import WorkerPool
+
+load_dotenv()
+
+from app.tasks import queue, redis_conn  # noqa: E402  (needs the env loaded first)
+
+if __name__ == '__main__':
+    concurrency = int(os.environ.get('RQ_WORKER_CONCURRENCY', 2))
+    pool = WorkerPool([queue], connection=redis_conn, num_workers=concurrency, worker_class=SimpleWorker)
+    pool.start()